@@ -1,46 +1,215 @@
 from langchain.agents import create_agent
-from langchain_ollama import ChatOllama
 from langchain.agents.middleware import wrap_tool_call
 from langgraph.checkpoint.memory import InMemorySaver 
 from functools import partial
 
-from langchain.messages import ToolMessage,AIMessage,HumanMessage
+from langchain.messages import ToolMessage,AIMessage,HumanMessage,SystemMessage
 from langchain.messages import AIMessageChunk
 
+from llm_backends import make_chat_model
+from reasoning import ReasoningController
+from warmup import ModelWarmer
+from planner import (PLAN_INSTRUCTIONS, ANSWER_INSTRUCTIONS, UNPLANNED_TOOLS, PlanError, PlanExecutor,
+                     describe_tools, format_results, parse_plan)
+
 
 
 class Agent():
     
-    def __init__(self, model, tools, system_prompt):
-     
-        self.llm = ChatOllama(
-            model=model, 
-            temperature=0,
-            top_p=0.7,           # Nucleus sampling: lower = faster & more focused
-            top_k=40,            # Limit to top 40 tokens: reduces computation
-        )
+    def __init__(self, model, tools, system_prompt, prefetcher=None, mode="react", router=None,
+                 reasoning="on", reasoning_budget=None, warm_up=True, keep_alive=1800):
+        """
+        Args:
+            model: Ollama model name, or a ready chat model instance (see llm_backends.make_chat_model).
+            tools: The tools the agent can call.
+            system_prompt: The system prompt.
+            prefetcher: Optional Prefetcher starting likely read-only tool calls while the model is generating.
+            mode: "react" runs the usual tool-calling loop (one LLM call per tool call). "plan" asks the
+                model for the whole plan at once, runs it locally and makes one final call for the answer;
+                it falls back to the loop when the plan is invalid (counted in plan_stats['fallbacks']).
+                Sending tools (UNPLANNED_TOOLS) are only available to the loop.
+            router: Optional ModelRouter sending simple turns to a smaller model; `model` stays the
+                default for calls the router doesn't handle (e.g. planning).
+            reasoning: Thinking mode of the model: "on" (model default), "off", "fast" (no thinking for
+                simple turns) or "separate" (thinking kept out of the answer, see get_reasoning_token).
+            reasoning_budget: Maximum thinking tokens per model call; longer thinking is cut and the
+                call redone without it. Applies when thinking is kept separate ("fast", "separate").
+            warm_up: Whether to load the model and evaluate the system prompt in the background right
+                away, so the first turn doesn't pay for it (Ollama and OpenAI-compatible backends only).
+            keep_alive: Seconds Ollama keeps the model loaded after a call; while the session is in use,
+                the model is re-warmed before it would be unloaded.
+        """
+        if mode not in ("react", "plan"):
+            raise ValueError(f"mode must be 'react' or 'plan'. Got: {mode}")
+        self.llm = make_chat_model(model)
         self.tools = tools
+        self.system_prompt = system_prompt
+        self.mode = mode
+        self.plan_tools = [tool for tool in tools if tool.name not in UNPLANNED_TOOLS]
+        # Plan steps get the same error handling as tool calls in the loop
+        self.plan_executor = PlanExecutor(tools, cached_result=prefetcher.take if prefetcher is not None else None,
+                                          middleware=[self.handle_tool_errors])
+        self.plan_stats = {'plans': 0, 'fallbacks': 0}
+        # Optional Prefetcher: starts likely read-only tool calls while the model is generating
+        self.prefetcher = prefetcher
+        middleware = [self.handle_tool_errors, self._serialize_services()]
+        if prefetcher is not None:
+            middleware.append(prefetcher.middleware())
+        self.router = router
+        if router is not None:
+            middleware.append(router.middleware())
+        # Innermost, so it sees the model the router picked
+        self.reasoning = ReasoningController(reasoning, reasoning_budget)
+        middleware.append(self.reasoning.middleware())
         self.agent = create_agent(model=self.llm, 
                                   tools=tools, 
                                   system_prompt=system_prompt, 
                                   checkpointer=InMemorySaver(),
-                                  middleware=[self.handle_tool_errors])
+                                  middleware=middleware)
+        models = [self.llm] + ([model for _, model in router.tiers] if router is not None else [])
+        self.warmer = ModelWarmer(models, system_prompt, tools, keep_alive=keep_alive, heartbeat=warm_up)
+        if warm_up:
+            self.warmer.start()
+    
+    def _config(self, thread_id="1"):
+        # The warmer's timer measures the first token of every model call
+        return {"configurable": {"thread_id": thread_id}, "callbacks": [self.warmer.timer]}
+    
+    def close(self):
+        """Stops the background keep-alive of the model."""
+        self.warmer.close()
+    
+    def _serialize_services(self):
+        # Google API clients aren't thread-safe: concurrent sessions take turns on each service
+        @wrap_tool_call
+        def serialize_services(request, handler):
+            lock = self.plan_executor.service_lock(request.tool_call['name'])
+            if lock is None:
+                return handler(request)
+            with lock:
+                return handler(request)
+        return serialize_services
+        
+    def invoke(self, user_input, thread_id="1"):
+        """Runs a turn and returns the final state.
         
-    def invoke(self, user_input):
-        response = self.agent.invoke({"messages": [HumanMessage(content=user_input)]},
-                                     {"configurable": {"thread_id": "1"}})
+        Each thread_id is a separate conversation; turns of different threads may run concurrently
+        (without a prefetcher, whose guesses are per turn).
+        """
+        self.reasoning.start_turn()
+        if self.prefetcher is not None:
+            self.prefetcher.start(user_input)
+        try:
+            if self.mode == "plan":
+                response = self._invoke_plan(user_input, thread_id)
+            else:
+                response = self.agent.invoke({"messages": [HumanMessage(content=user_input)]},
+                                             self._config(thread_id))
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.finish()
         
         return response
     
-    def stream_invoke(self, user_input):
-        for token in self.agent.stream({"messages": [HumanMessage(content=user_input)]}, 
-                                        {"configurable": {"thread_id": "1"}}, 
-                                        stream_mode="messages"):
-            yield token
+    def stream_invoke(self, user_input, thread_id="1"):
+        self.reasoning.start_turn()
+        if self.prefetcher is not None:
+            self.prefetcher.start(user_input)
+        try:
+            if self.mode == "plan":
+                tokens = self._stream_plan(user_input, thread_id)
+            else:
+                tokens = self.agent.stream({"messages": [HumanMessage(content=user_input)]}, self._config(thread_id),
+                                           stream_mode="messages")
+            for token in tokens:
+                yield token
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.finish()
+    
+    # Plan-then-execute mode
+    
+    def _history(self, thread_id="1"):
+        """Returns the conversation so far, shared by both modes through the checkpointer."""
+        state = self.agent.get_state({"configurable": {"thread_id": thread_id}})
+        return list(state.values.get("messages", []))
+    
+    def _plan(self, user_input, history):
+        """Asks the model for the plan of the turn and runs it.
+        
+        Returns:
+            Tuple of (outcomes, answer): the executed steps, and the model's direct answer when
+            no tool was needed (None otherwise).
+        
+        Raises:
+            PlanError: If the plan is invalid.
+        """
+        planner_prompt = self.system_prompt + PLAN_INSTRUCTIONS + describe_tools(self.plan_tools)
+        messages = [SystemMessage(content=planner_prompt)] + history + [HumanMessage(content=user_input)]
+        reply = self.llm.invoke(messages, {"callbacks": [self.warmer.timer]},
+                                **self.reasoning.call_kwargs(self.llm, messages))
+        steps, answer = parse_plan(reply.content, {tool.name for tool in self.plan_tools})
+        self.plan_stats['plans'] += 1
+        return self.plan_executor.run(steps), answer
+    
+    def _answer_messages(self, user_input, history, outcomes):
+        results = format_results(outcomes) if outcomes else "(no tool calls were needed)"
+        return ([SystemMessage(content=self.system_prompt)] + history +
+                [HumanMessage(content=f"{user_input}\n\n{ANSWER_INSTRUCTIONS}{results}")])
+    
+    def _record_turn(self, user_input, answer, thread_id="1"):
+        # Store the turn like the tool loop does, so both modes see the same conversation
+        self.agent.update_state({"configurable": {"thread_id": thread_id}},
+                                {"messages": [HumanMessage(content=user_input), AIMessage(content=answer)]},
+                                as_node="model")
+    
+    def _stream_plan(self, user_input, thread_id):
+        history = self._history(thread_id)
+        try:
+            outcomes, answer = self._plan(user_input, history)
+        except PlanError:
+            self.plan_stats['fallbacks'] += 1
+            yield from self.agent.stream({"messages": [HumanMessage(content=user_input)]}, self._config(thread_id),
+                                         stream_mode="messages")
+            return
+        
+        metadata = {"langgraph_node": "plan_answer"}
+        if answer is not None:
+            yield AIMessageChunk(content=answer), metadata
+        else:
+            answer = ""
+            messages = self._answer_messages(user_input, history, outcomes)
+            for chunk in self.llm.stream(messages, {"callbacks": [self.warmer.timer]},
+                                         **self.reasoning.call_kwargs(self.llm, messages)):
+                answer += chunk.content
+                yield chunk, metadata
+        self._record_turn(user_input, answer, thread_id)
+    
+    def _invoke_plan(self, user_input, thread_id):
+        history = self._history(thread_id)
+        try:
+            outcomes, answer = self._plan(user_input, history)
+        except PlanError:
+            self.plan_stats['fallbacks'] += 1
+            return self.agent.invoke({"messages": [HumanMessage(content=user_input)]}, self._config(thread_id))
+        
+        if answer is None:
+            messages = self._answer_messages(user_input, history, outcomes)
+            answer = self.llm.invoke(messages, {"callbacks": [self.warmer.timer]},
+                                     **self.reasoning.call_kwargs(self.llm, messages)).content
+        self._record_turn(user_input, answer, thread_id)
+        tool_messages = [ToolMessage(content=outcome["result"], tool_call_id=outcome["id"], name=outcome["tool"])
+                         for outcome in outcomes]
+        return {"messages": history + [HumanMessage(content=user_input)] + tool_messages + [AIMessage(content=answer)]}
             
     def get_ai_message_token(self, token):
         if (isinstance(token[0], AIMessageChunk)):
             return token[0].content
+    
+    def get_reasoning_token(self, token):
+        """Returns the thinking text of a streamed chunk (only with reasoning kept separate), or None."""
+        if (isinstance(token[0], AIMessageChunk)):
+            return token[0].additional_kwargs.get('reasoning_content')
             
     def get_ai_message(self, response):
         
@@ -74,4 +243,5 @@ class Agent():
         except Exception as e:
             # Handle both dict and object formats for tool_call
             tool_call_id = request.tool_call.id if hasattr(request.tool_call, 'id') else request.tool_call['id']
-            return ToolMessage(content=f"An error occurred while executing the tool: {str(e)}", tool_call_id=tool_call_id)
\ No newline at end of file
+            return ToolMessage(content=f"An error occurred while executing the tool: {str(e)}", tool_call_id=tool_call_id,
+                               status="error")
\ No newline at end of file
@@ -1,6 +1,13 @@
 from agent import Agent
+from file_index import FileIndex
+from retrieval import DocumentIndex
+from llm_backends import close_http_clients, make_chat_model
+from prefetch import Prefetcher
+from routing import ModelRouter
 from tools import CalendarTools, MailTools, TimeTools, FileSystemTools
+from utils import get_file_path
 import os
+import sys
 
 
 
@@ -14,25 +21,113 @@ def load_system_prompt():
         print(f"Warning: system_prompt.txt not found at {prompt_file}")
         return "You are a helpful assistant called AI-Assitant that can manage calendar events, send emails, and handle file system operations."
 
+def load_chat_model(name):
+    """Chat model for a model name, on the backend configured in .env (Ollama by default)."""
+    return make_chat_model(name,
+                           backend=os.getenv("LLM_BACKEND", "ollama"),
+                           base_url=os.getenv("LLM_BASE_URL"),
+                           api_key=os.getenv("LLM_API_KEY"),
+                           timeout=float(os.getenv("LLM_TIMEOUT", "300")),
+                           max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "8")))
+
+def load_file_index():
+    """File index of the folders in FILE_INDEX_ROOTS (separated by os.pathsep), or None if unset."""
+    roots = [root for root in os.getenv("FILE_INDEX_ROOTS", "").split(os.pathsep) if root.strip()]
+    if not roots:
+        return None
+    file_index = FileIndex(get_file_path('file_index.db'), roots,
+                           poll_interval=float(os.getenv("FILE_INDEX_POLL_INTERVAL", "30")))
+    # Builds (or catches up) in the background; find_files answers from what is indexed so far
+    file_index.start()
+    return file_index
+
+def load_document_index():
+    """Document index of the folders in DOCUMENT_ROOTS (separated by os.pathsep), or None if unset."""
+    roots = [root for root in os.getenv("DOCUMENT_ROOTS", "").split(os.pathsep) if root.strip()]
+    if not roots:
+        return None
+    document_index = DocumentIndex(get_file_path('document_index'), roots,
+                                   refresh_interval=float(os.getenv("DOCUMENT_REFRESH_INTERVAL", "300")))
+    # Indexes new and changed documents in the background; search_documents answers from what is indexed so far
+    document_index.start()
+    return document_index
+
+def load_tools():
+    """Builds the calendar, mail, time and file system tools with the settings in .env.
+
+    Returns (tools, toolkits): the tools for the agent, and a dict of the objects behind them
+    ('calendar', 'mail', 'time', 'file_system', 'file_index', 'document_index') for close_tools.
+    """
+    # Local calendar mirror, disabled with CALENDAR_MIRROR=0 in .env
+    use_mirror = os.getenv("CALENDAR_MIRROR", "1") != "0"
+    file_index = load_file_index()
+    document_index = load_document_index()
+    toolkits = {
+        'calendar': CalendarTools(mirror_path=get_file_path('calendar_mirror.db') if use_mirror else None,
+                                  mirror_max_staleness=float(os.getenv("CALENDAR_MIRROR_MAX_STALENESS", "300"))),
+        'mail': MailTools(),
+        'time': TimeTools(),
+        'file_system': FileSystemTools(file_index=file_index, document_index=document_index),
+        'file_index': file_index,
+        'document_index': document_index,
+    }
+    tools = []
+    for name in ('calendar', 'mail', 'time', 'file_system'):
+        tools += toolkits[name].get_tools()
+    return tools, toolkits
+
+def close_tools(toolkits):
+    """Lets queued emails go out, then stops the file search workers and the background indexes."""
+    # Undelivered emails stay in the outbox for the next run
+    toolkits['mail'].close()
+    toolkits['file_system'].close()
+    for name in ('file_index', 'document_index'):
+        if toolkits[name] is not None:
+            toolkits[name].close()
+
+def print_reply(agent, user_input):
+    """Streams the agent's reply to the terminal. Separate thinking goes to stderr, dimmed."""
+    for token in agent.stream_invoke(user_input):
+        reasoning_token = agent.get_reasoning_token(token)
+        if reasoning_token:
+            print(f"\033[2m{reasoning_token}\033[0m", end='', file=sys.stderr, flush=True)
+        message_token = agent.get_ai_message_token(token)
+        if (message_token is not None):
+            print(message_token, end='', flush=True)
+    print("\n")
+
+
 if __name__ == "__main__":
     
-    calendar_tools = CalendarTools()
-    mail_tools  = MailTools()
-    time_tools = TimeTools()
-    file_system_tools = FileSystemTools()
+    tools, toolkits = load_tools()
     
     # Load system prompt from file
     system_prompt = load_system_prompt()
     
-    agent = Agent(model="qwen3:8b", 
-                  tools=calendar_tools.get_tools() + mail_tools.get_tools() + time_tools.get_tools() + file_system_tools.get_tools(),
-                  system_prompt=system_prompt)
+    # Speculative prefetch of likely calendar/inbox reads, disabled with PREFETCH=0 in .env
+    prefetcher = Prefetcher(tools) if os.getenv("PREFETCH", "1") != "0" else None
+    
+    # Model cascade: with SMALL_MODEL set in .env (e.g. qwen3:1.7b), simple turns use it and
+    # complex or uncertain ones use the large model
+    large_model = load_chat_model(os.getenv("MODEL", "qwen3:8b"))
+    small_model_name = os.getenv("SMALL_MODEL")
+    router = ModelRouter([("small", load_chat_model(small_model_name)), ("large", large_model)]) if small_model_name else None
+    
+    agent = Agent(model=large_model, 
+                  tools=tools,
+                  system_prompt=system_prompt,
+                  prefetcher=prefetcher,
+                  mode=os.getenv("AGENT_MODE", "react"),
+                  router=router,
+                  # Thinking mode: on, off, fast (no thinking for simple turns) or separate (thinking on stderr)
+                  reasoning=os.getenv("REASONING_MODE", "fast"),
+                  reasoning_budget=int(os.getenv("REASONING_BUDGET", "512")),
+                  # Load the model while the welcome message is shown, and keep it loaded while chatting
+                  warm_up=os.getenv("WARM_UP", "1") != "0",
+                  keep_alive=float(os.getenv("KEEP_ALIVE", "1800")))
     #Welcome message
     print("AI Assistant:")
-    for token in agent.stream_invoke("Hi ! Introduce yourself briefly. Specify i need to say 'bye' to end the chat."):
-        print(agent.get_ai_message_token(token), end='', flush=True)
-        
-    print("\n")
+    print_reply(agent, "Hi ! Introduce yourself briefly. Specify i need to say 'bye' to end the chat.")
     
     #Chat loop
     while True:
@@ -46,8 +141,30 @@ if __name__ == "__main__":
         print ("\n")
         print("AI-Assistant:")
         
-        for token in agent.stream_invoke(question):
-            message_token = agent.get_ai_message_token(token)
-            if (message_token is not None):
-                print(message_token, end='', flush=True)
-        print("\n")
\ No newline at end of file
+        print_reply(agent, question)
+
+    if prefetcher is not None:
+        stats = prefetcher.stats()
+        print(f"Prefetch: {stats['issued']} calls started, {stats['hits']} used "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['wasted']} wasted")
+        prefetcher.close()
+    
+    stats = agent.reasoning.stats()
+    print(f"Reasoning: {stats['reasoning_tokens']} thinking tokens ({stats['reasoning_seconds']:.1f}s) "
+          f"over {stats['model_calls']} model calls, {stats['budget_exceeded']} cut by the budget")
+    
+    agent.close()
+    stats = agent.warmer.stats()
+    print(f"First token: {stats['cold_first_token']:.2f}s avg over {stats['cold_calls']} cold calls, "
+          f"{stats['warm_first_token']:.2f}s over {stats['warm_calls']} warm calls")
+    
+    if agent.mode == "plan":
+        print(f"Planning: {agent.plan_stats['plans']} plans run, {agent.plan_stats['fallbacks']} fell back to the tool loop")
+    
+    if router is not None:
+        stats = router.stats()
+        tiers = ", ".join(f"{name}: {tier['calls']} calls, {tier['mean']:.1f}s avg" for name, tier in stats['tiers'].items())
+        print(f"Routing: {stats['escalation_rate']:.0%} escalated ({tiers})")
+    
+    close_tools(toolkits)
+    close_http_clients()
@@ -0,0 +1,209 @@
+"""Batch mode: runs the prompts of a JSONL file through the agent, without the chat loop.
+
+Each input line is a JSON object holding one request:
+
+    {"id": "r1", "prompt": "What's on my calendar tomorrow?"}
+    {"id": "r2", "turns": ["Show my latest emails", "Reply to the first one saying thanks"]}
+
+Every request gets its own conversation (its id is the agent's thread id) and
+requests run concurrently on a pool of workers. One result line per request is
+appended to the output file as soon as it finishes, so an interrupted run can
+be resumed: requests already answered in the output file are skipped.
+
+Usage:
+    python batch_runner.py prompts.jsonl results.jsonl [--workers 4] [--prompt-field prompt]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from langchain.messages import AIMessage, HumanMessage, ToolMessage
+
+from utils import percentile
+
+
+def read_requests(path, prompt_field="prompt"):
+    """Yields (request id, list of user turns) for each line of a JSONL file, reading it lazily.
+
+    The id is the line's "id" or "request_id", or its line number. The turns are the line's
+    "turns" list, or the single prompt in `prompt_field`. Blank and malformed lines are reported
+    and skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as error:
+                print(f"Skipping line {number} of {path}: {error}")
+                continue
+            request_id = str(request.get("id") or request.get("request_id") or f"line-{number}")
+            turns = request.get("turns") or ([request[prompt_field]] if request.get(prompt_field) else [])
+            if not turns:
+                print(f"Skipping request {request_id}: no '{prompt_field}' or 'turns'")
+                continue
+            yield request_id, [str(turn) for turn in turns]
+
+
+def completed_ids(output_path):
+    """Returns the ids of the requests already answered in an output file (failed ones are retried)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by the interruption
+            if result.get("status") == "ok":
+                done.add(result.get("id"))
+    return done
+
+
+def run_request(agent, request_id, turns):
+    """Runs the turns of one request in its own conversation and returns its result record."""
+    start = time.perf_counter()
+    answers, tools = [], []
+    try:
+        for turn in turns:
+            messages = agent.invoke(turn, thread_id=request_id)["messages"]
+            # The messages of this turn: everything after its user message
+            last_human = max(index for index, message in enumerate(messages) if isinstance(message, HumanMessage))
+            turn_messages = messages[last_human + 1:]
+            called = [call['name'] for message in turn_messages if isinstance(message, AIMessage)
+                      for call in message.tool_calls]
+            # Plan mode reports its steps as tool messages only
+            tools += called or [message.name for message in turn_messages
+                                if isinstance(message, ToolMessage) and message.name]
+            replies = [message for message in turn_messages if isinstance(message, AIMessage) and message.content]
+            answers.append(replies[-1].content if replies else "")
+        result = {"id": request_id, "status": "ok", "answer": answers[-1], "answers": answers}
+    except Exception as error:
+        result = {"id": request_id, "status": "error", "error": str(error), "answers": answers}
+    result.update(tools=tools, turns=len(turns), seconds=round(time.perf_counter() - start, 4),
+                  finished_at=datetime.now(timezone.utc).isoformat())
+    return result
+
+
+def run_batch(agent, input_path, output_path, workers=4, prompt_field="prompt", resume=True):
+    """Runs every request of `input_path` and appends the results to `output_path`.
+
+    Args:
+        agent: The Agent, shared by all workers (each request uses its own thread id).
+        input_path: JSONL file of requests, see read_requests.
+        output_path: JSONL file the results are appended to, one line per request.
+        workers: Number of requests running at once.
+        prompt_field: Field holding the prompt of single-turn requests.
+        resume: Skip the requests already answered in `output_path`.
+
+    Returns:
+        Summary dict: counts ('ok', 'error', 'skipped'), 'wall_seconds', 'throughput' (requests
+        per second) and the latency percentiles of the requests ('p50', 'p90', 'p95', 'p99', 'max').
+    """
+    done = completed_ids(output_path) if resume else set()
+    summary = {'ok': 0, 'error': 0, 'skipped': 0}
+    latencies = []
+    write_lock = threading.Lock()
+    # Bounds the requests read ahead of the workers, so large files are streamed
+    pending = threading.BoundedSemaphore(workers * 2)
+
+    if resume and os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            truncated = f.read(1) != b"\n"
+    else:
+        truncated = False
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        if truncated:
+            output.write("\n")
+
+        def work(request_id, turns):
+            try:
+                result = run_request(agent, request_id, turns)
+                with write_lock:
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    output.flush()
+                    summary[result["status"]] += 1
+                    latencies.append(result["seconds"])
+            finally:
+                pending.release()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+            seen = set()
+            for request_id, turns in read_requests(input_path, prompt_field):
+                if request_id in done or request_id in seen:
+                    summary['skipped'] += 1
+                    continue
+                seen.add(request_id)
+                pending.acquire()
+                executor.submit(work, request_id, turns)
+        wall = time.perf_counter() - start
+
+    processed = summary['ok'] + summary['error']
+    summary['wall_seconds'] = wall
+    summary['throughput'] = processed / wall if wall > 0 else 0.0
+    for q in (50, 90, 95, 99):
+        summary[f'p{q}'] = percentile(latencies, q)
+    summary['max'] = max(latencies, default=0.0)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{summary['ok']} ok, {summary['error']} failed, {summary['skipped']} skipped "
+          f"in {summary['wall_seconds']:.1f}s ({summary['throughput']:.2f} requests/s)")
+    print("Latency: " + ", ".join(f"{key} {summary[key]:.2f}s" for key in ('p50', 'p90', 'p95', 'p99', 'max')))
+
+
+def build_agent():
+    """Builds the agent like ai_chatbot.py does (same .env settings), minus the interactive-only parts.
+
+    Returns (agent, toolkits), the toolkits to be closed with ai_chatbot.close_tools.
+    """
+    from agent import Agent
+    from ai_chatbot import load_chat_model, load_system_prompt, load_tools
+    from routing import ModelRouter
+
+    tools, toolkits = load_tools()
+    large_model = load_chat_model(os.getenv("MODEL", "qwen3:8b"))
+    small_model_name = os.getenv("SMALL_MODEL")
+    router = ModelRouter([("small", load_chat_model(small_model_name)), ("large", large_model)]) \
+        if small_model_name else None
+    # No prefetcher: its guesses are per turn, and batch turns run concurrently
+    agent = Agent(model=large_model, tools=tools, system_prompt=load_system_prompt(),
+                  mode=os.getenv("AGENT_MODE", "react"), router=router,
+                  reasoning=os.getenv("REASONING_MODE", "fast"),
+                  reasoning_budget=int(os.getenv("REASONING_BUDGET", "512")))
+    return agent, toolkits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the prompts of a JSONL file through the agent.")
+    parser.add_argument("input", help="JSONL file of requests")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="requests running at once (default 4)")
+    parser.add_argument("--prompt-field", default="prompt", help="field holding each prompt (default 'prompt')")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of resuming")
+    args = parser.parse_args()
+
+    from ai_chatbot import close_tools
+    from llm_backends import close_http_clients
+
+    agent, toolkits = build_agent()
+    try:
+        summary = run_batch(agent, args.input, args.output, workers=args.workers,
+                            prompt_field=args.prompt_field, resume=not args.no_resume)
+    finally:
+        agent.close()
+        # Let queued emails go out and stop the file indexes before exiting
+        close_tools(toolkits)
+        close_http_clients()
+    print_summary(summary)
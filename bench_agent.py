@@ -0,0 +1,283 @@
+"""End-to-end benchmarks of the agent: the Agent loop, its middleware and the real tool wrappers.
+
+The model is a ScriptedChatModel replying with predefined tool calls, and the tools are
+the real CalendarTools and MailTools on top of in-process fake Google services, so
+nothing leaves the machine and what is measured is the agent's own cost:
+
+- per-turn overhead: wall time of typical turns with an instant model and instant services
+- tool dispatch: from the model's reply to the tool starting, and from the tool's result
+  back to the next model call; and the cost of the @tool wrapper around a direct call
+- memory growth: traced Python memory per turn over a long conversation
+
+Results are compared with a stored baseline recorded with the same settings; the exit
+status is 1 when a metric got worse than the baseline by more than the tolerance. Timings
+depend on the machine: record a new baseline where the benchmark runs with --save-baseline.
+
+Usage:
+    python bench_agent.py [--turns 200] [--service-latency 0.0] [--tolerance 0.5]
+    python bench_agent.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from statistics import median
+from unittest.mock import patch
+
+from langchain.tools import tool
+
+from agent import Agent
+from fakes import FakeCalendarService, FakeGmailService, ScriptedChatModel, tool_call
+from prefetch import Prefetcher
+from tools import CalendarTools, FileSystemTools, MailTools, TimeTools
+from utils import get_file_path, percentile
+
+BASELINE_PATH = get_file_path('bench_agent_baseline.json')
+
+# Metrics below this many units (ms or KB) apart are never reported as regressions: timer noise
+MIN_DIFFERENCE = {'ms': 0.5, 'KB': 4.0}
+
+# (name, user input, scripted model replies) of the turns a session cycles through
+SCENARIOS = [
+    ("chat", "Hi!", ["Hello! How can I help you today?"]),
+    ("events_on_date", "What's on my calendar on January 21?", [
+        tool_call("get_events_on_date", {"date": "2026-01-21"}),
+        "You have a standup at 10:00 and a design review at 15:00.",
+    ]),
+    ("latest_emails", "Show my latest 5 emails", [
+        tool_call("get_latest_emails", {"count": 5}),
+        "Here are your latest 5 emails: updates from Bob about the project.",
+    ]),
+    ("free_slots", "Am I free on the afternoon of January 21?", [
+        tool_call("find_free_slots", {"start_date": "2026-01-21", "end_date": "2026-01-21", "day_start": "12:00"}),
+        "You are free from 12:00 to 15:00 and after 16:00.",
+    ]),
+    ("add_event", "Add lunch with Alice on January 22 at noon", [
+        tool_call("add_event_to_calendar", {"event_name": "Lunch with Alice", "event_location": "Cafe",
+                                            "event_desc": "", "event_start_date": "2026-01-22T12:00:00",
+                                            "event_end_date": "2026-01-22T13:00:00"}),
+        "I added lunch with Alice on January 22 from 12:00 to 13:00.",
+    ]),
+    ("email_schedule", "Email Alice my schedule for January 21", [
+        tool_call("get_events_on_date", {"date": "2026-01-21"}, "call_events"),
+        tool_call("send_message", {"to": "alice@example.com", "subject": "Schedule",
+                                   "body": "Standup at 10:00, design review at 15:00."}),
+        "I emailed Alice your schedule for January 21.",
+    ]),
+]
+
+
+def make_services(latency):
+    events = [{'id': f"e{index}", 'etag': '"1"', 'summary': summary,
+               'start': {'dateTime': f"2026-01-{day}T{start}:00Z", 'timeZone': 'UTC'},
+               'end': {'dateTime': f"2026-01-{day}T{end}:00Z", 'timeZone': 'UTC'}}
+              for index, (day, start, end, summary) in enumerate(
+                  [(day, "10:00", "10:30", "Standup") for day in range(10, 31)] +
+                  [(21, "15:00", "16:00", "Design review")])]
+    messages = [("bob@example.com", f"Project update {index}") for index in range(50)]
+    return FakeCalendarService(events, latency), FakeGmailService(messages, latency)
+
+
+class Session:
+    """An agent wired like ai_chatbot.py's, on fake services, with a scripted model.
+
+    Adds an `echo` tool that timestamps its calls, to measure the dispatch around a tool.
+    """
+
+    def __init__(self, directory, service_latency=0.0):
+        os.environ.setdefault("EMAIL_ADDRESS", "me@example.com")
+        self.calendar, self.gmail = make_services(service_latency)
+        with patch.object(CalendarTools, 'get_calendar_service', return_value=self.calendar), \
+                patch.object(MailTools, 'get_mail_service', return_value=self.gmail):
+            self.calendar_tools = CalendarTools()
+            self.mail_tools = MailTools(outbox_path=os.path.join(directory, "outbox.db"))
+        self.file_system_tools = FileSystemTools()
+        self.echo_times = []
+
+        @tool
+        def echo(text: str) -> str:
+            """Returns the text it is given."""
+            self.echo_times.append(time.perf_counter())
+            result = text
+            self.echo_times.append(time.perf_counter())
+            return result
+
+        self.tools = (self.calendar_tools.get_tools() + self.mail_tools.get_tools() + TimeTools().get_tools() +
+                      self.file_system_tools.get_tools() + [echo])
+        with open(get_file_path('system_prompt.txt'), encoding='utf-8') as f:
+            system_prompt = f.read()
+        self.model = ScriptedChatModel()
+        self.prefetcher = Prefetcher(self.tools)
+        self.agent = Agent(self.model, self.tools, system_prompt, prefetcher=self.prefetcher, warm_up=False)
+
+    def turn(self, user_input, replies, thread_id="1"):
+        """Runs one turn with the given scripted replies; returns its wall time in seconds."""
+        self.model.responses = list(replies)
+        start = time.perf_counter()
+        for _ in self.agent.stream_invoke(user_input, thread_id):
+            pass
+        seconds = time.perf_counter() - start
+        # The script's own bookkeeping isn't the agent's memory
+        self.model.calls.clear()
+        return seconds
+
+    def close(self):
+        self.agent.close()
+        self.prefetcher.close()
+        self.mail_tools.close()
+        self.file_system_tools.close()
+
+
+def bench_turns(session, repeat=20):
+    """Median wall time of each scenario, on fresh threads, in ms; and per model call."""
+    results = {}
+    per_call = []
+    for name, user_input, replies in SCENARIOS:
+        times = [session.turn(user_input, replies, thread_id=f"turns-{name}-{run}") for run in range(repeat)]
+        results[f"turn_ms.{name}"] = median(times) * 1000
+        per_call.append(median(times) * 1000 / len(replies))
+    results['turn_ms.per_model_call'] = median(per_call)
+    return results
+
+
+def bench_dispatch(session, repeat=50):
+    """Time from the model's tool call to the tool running, and from its result to the next call, in ms."""
+    replied, resumed = [], []
+
+    def call_echo(messages):
+        replied.append(time.perf_counter())
+        return tool_call("echo", {"text": "ping"})
+
+    def answer(messages):
+        resumed.append(time.perf_counter())
+        return "pong"
+
+    session.echo_times.clear()
+    for run in range(repeat):
+        session.turn("Echo ping", [call_echo, answer], thread_id=f"dispatch-{run}")
+    starts, ends = session.echo_times[0::2], session.echo_times[1::2]
+    to_tool = [start - reply for reply, start in zip(replied, starts)]
+    to_model = [resume - end for end, resume in zip(ends, resumed)]
+
+    events_tool = next(item for item in session.tools if item.name == "get_events_on_date")
+    impl = session.calendar_tools._get_events_on_date_impl
+    direct = median(_timed(lambda: impl("2026-01-21")) for _ in range(500))
+    wrapped = median(_timed(lambda: events_tool.invoke({"date": "2026-01-21"})) for _ in range(500))
+    return {
+        'dispatch_ms.model_to_tool_p50': percentile(to_tool, 50) * 1000,
+        'dispatch_ms.tool_to_model_p50': percentile(to_model, 50) * 1000,
+        'dispatch_ms.tool_wrapper': (wrapped - direct) * 1000,
+    }
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_memory(session, turns=200, warmup=20):
+    """Traced memory growth of one long conversation, in KB per turn: on average, and over its last tenth.
+
+    The two differ when the cost of a turn grows with the length of the conversation (e.g. a
+    checkpointer storing the whole history at every step).
+    """
+    for index in range(warmup):
+        session.turn(*SCENARIOS[index % len(SCENARIOS)][1:], thread_id="long")
+    last = max(1, turns // 10)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for index in range(turns):
+            if index == turns - last:
+                before_last = tracemalloc.get_traced_memory()[0]
+            session.turn(*SCENARIOS[index % len(SCENARIOS)][1:], thread_id="long")
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        'memory_kb.per_turn': (after - before) / 1024 / turns,
+        'memory_kb.per_turn_at_end': (after - before_last) / 1024 / last,
+    }
+
+
+def run(turns=200, service_latency=0.0):
+    with tempfile.TemporaryDirectory() as directory:
+        session = Session(directory, service_latency)
+        try:
+            # The first turns pay for imports and caches
+            for _, user_input, replies in SCENARIOS:
+                session.turn(user_input, replies, thread_id="warmup")
+            results = bench_turns(session)
+            results.update(bench_dispatch(session))
+            results.update(bench_memory(session, turns))
+        finally:
+            session.close()
+    return results
+
+
+def find_regressions(results, baseline, tolerance=0.5):
+    """Returns a description of each metric more than `tolerance` (a fraction) worse than its baseline.
+
+    Every metric is lower-is-better; metrics missing from either side are ignored.
+    """
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        unit = 'KB' if name.startswith('memory') else 'ms'
+        if value > reference * (1 + tolerance) and value - reference > MIN_DIFFERENCE[unit]:
+            regressions.append(f"{name}: {value:.2f} {unit}, baseline {reference:.2f} {unit} "
+                               f"(+{(value / reference - 1) * 100 if reference else float('inf'):.0f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop against a stored baseline.")
+    parser.add_argument("--turns", type=int, default=200, help="turns of the long session (default 200)")
+    parser.add_argument("--service-latency", type=float, default=0.0,
+                        help="seconds each fake Google API request takes (default 0)")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown over the baseline, as a fraction (default 0.5)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    settings = {'turns': args.turns, 'service_latency': args.service_latency}
+    results = run(**settings)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get('settings') == settings:
+            baseline = stored['metrics']
+        elif not args.save_baseline:
+            print(f"The baseline was recorded with {stored.get('settings')}, not {settings}: not comparing")
+    for name, value in results.items():
+        unit = 'KB' if name.startswith('memory') else 'ms'
+        reference = f"  (baseline {baseline[name]:.2f})" if name in baseline else ""
+        print(f"  {name:<45} {value:>10.2f} {unit}{reference}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({'settings': settings, 'metrics': {name: round(value, 4) for name, value in results.items()}},
+                      f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+    if not baseline:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; record one with --save-baseline")
+        sys.exit(0)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.tolerance:.0%} tolerance:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions.")
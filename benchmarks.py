@@ -0,0 +1,716 @@
+"""Performance benchmarks for AI Assistant components.
+
+Run every benchmark with `python benchmarks.py`, or only some of them by name
+(e.g. `python benchmarks.py calendar_mirror`). Benchmarks run offline against
+in-process stand-ins for the Google services.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+from calendar_mirror import CalendarMirror, event_timestamp
+from recurrence import RecurrenceEngine
+from scheduling import IntervalIndex, daily_windows
+
+
+def measure(func, repeat=1000):
+    """Returns the average wall time of `func()` in seconds over `repeat` calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def report(name, seconds, unit="us"):
+    scale = {"s": 1, "ms": 1e3, "us": 1e6}[unit]
+    print(f"  {name:<45} {seconds * scale:>12.2f} {unit}")
+
+
+def generate_events(count, start=None, seed_minutes=37):
+    """Generates `count` non-recurring event resources spread over the year after `start`."""
+    start = start or datetime(2026, 1, 1, 8, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        begin = start + timedelta(minutes=(i * seed_minutes * 13) % (365 * 24 * 60))
+        end = begin + timedelta(minutes=30 + (i % 4) * 15)
+        events.append({
+            'id': f"event{i}",
+            'etag': f'"{i}"',
+            'status': 'confirmed',
+            'htmlLink': f"https://www.google.com/calendar/event?eid=event{i}",
+            'summary': f"Event {i}",
+            'description': "Generated benchmark event " * 4,
+            'location': "Room 1",
+            'creator': {'email': 'me@example.com', 'self': True},
+            'organizer': {'email': 'me@example.com', 'self': True},
+            'start': {'dateTime': begin.isoformat(), 'timeZone': 'UTC'},
+            'end': {'dateTime': end.isoformat(), 'timeZone': 'UTC'},
+            'iCalUID': f"event{i}@google.com",
+            'sequence': 0,
+            'reminders': {'useDefault': True},
+            'eventType': 'default',
+        })
+    return events
+
+
+class _PagedEventsService:
+    """Minimal stand-in for `service.events().list(...).execute()` serving fixed pages."""
+
+    def __init__(self, events, page_size=2500):
+        self.events_data = events
+        self.page_size = page_size
+        self.list_calls = 0
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.list_calls += 1
+        if params.get('syncToken'):
+            response = {'items': [], 'nextSyncToken': 'sync-token'}
+        else:
+            offset = int(params.get('pageToken') or 0)
+            page = self.events_data[offset:offset + self.page_size]
+            response = {'items': page}
+            if offset + self.page_size < len(self.events_data):
+                response['nextPageToken'] = str(offset + self.page_size)
+            else:
+                response['nextSyncToken'] = 'sync-token'
+        return _Executable(response)
+
+
+class _Executable:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+def bench_calendar_mirror(n_events=10000):
+    """Sync and read latency of the local calendar mirror over a 10k-event calendar."""
+    print(f"calendar_mirror ({n_events} events)")
+    service = _PagedEventsService(generate_events(n_events))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mirror = CalendarMirror(os.path.join(tmp_dir, "mirror.db"), max_staleness=300)
+
+        report("full sync", measure(lambda: mirror.sync(service), repeat=1), unit="ms")
+        report("incremental sync (no changes)", measure(lambda: mirror.sync(service), repeat=20), unit="ms")
+
+        now = datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp()
+        report("upcoming(10)", measure(lambda: mirror.upcoming(now, 10)))
+        report("events on one day", measure(lambda: mirror.between(now, now + 86400)))
+        report("fresh read incl. staleness check", measure(
+            lambda: (mirror.ensure_fresh(service), mirror.upcoming(now, 10))))
+
+        extra = generate_events(1, start=datetime(2026, 6, 1, 9, tzinfo=timezone.utc))[0]
+        extra['id'] = "written-through"
+        report("write-through upsert", measure(lambda: mirror.upsert(extra), repeat=200))
+        mirror.close()
+
+
+def _apply_fields_mask(event, keys):
+    return {key: event[key] for key in keys if key in event}
+
+
+def bench_list_payload(n_events=250):
+    """Response size of a full events().list page versus the partial responses the tools request."""
+    from calendar_mirror import SYNC_FIELDS
+    from tools import EVENT_LIST_FIELDS
+
+    print(f"list_payload ({n_events} events per page)")
+    events = generate_events(n_events)
+    full = len(json.dumps({'kind': 'calendar#events', 'items': events}).encode())
+    for name, fields in (("tools listing", EVENT_LIST_FIELDS), ("mirror sync", SYNC_FIELDS)):
+        keys = fields[fields.index("items(") + len("items("):-1].split(',')
+        masked = len(json.dumps({'items': [_apply_fields_mask(event, keys) for event in events]}).encode())
+        print(f"  {name:<20} full {full:>8} B  masked {masked:>8} B  saved {100 * (1 - masked / full):5.1f}%")
+
+
+def expand_weekly(first_start, duration, weeks, label):
+    """Expands a weekly recurring event into (start_ts, end_ts, label) instances."""
+    return [(first_start + week * 7 * 86400, first_start + week * 7 * 86400 + duration, label)
+            for week in range(weeks)]
+
+
+def bench_free_slots(n_events=5000, n_recurring=20):
+    """Free-slot and conflict queries on the interval index versus a linear scan."""
+    events = generate_events(n_events)
+    intervals = [(event_timestamp(event['start']), event_timestamp(event['end']), event['summary'])
+                 for event in events]
+    year_start = datetime(2026, 1, 5, 9, tzinfo=timezone.utc).timestamp()
+    for i in range(n_recurring):
+        intervals += expand_weekly(year_start + i * 3600 * 5, 3600, 52, f"Weekly {i}")
+    print(f"free_slots ({len(intervals)} busy intervals, incl. {n_recurring} weekly series expanded over a year)")
+
+    report("build index", measure(lambda: IntervalIndex(intervals), repeat=20), unit="ms")
+    index = IntervalIndex(intervals)
+
+    week_start = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    windows = [(start.timestamp(), end.timestamp()) for start, end in daily_windows(
+        week_start, week_start + timedelta(days=7), dt_time(9), dt_time(18))]
+
+    def free_week_indexed():
+        return [index.free(start, end, 1800) for start, end in windows]
+
+    def conflicts_linear(start, end):
+        return [interval for interval in intervals if interval[0] < end and interval[1] > start]
+
+    report("free slots for one week (index)", measure(free_week_indexed))
+    report("free slots for one week (linear scan)", measure(
+        lambda: [conflicts_linear(start, end) for start, end in windows], repeat=50))
+    one_hour = (windows[2][0], windows[2][0] + 3600)
+    report("conflict check (index)", measure(lambda: index.overlapping(*one_hour)))
+    report("conflict check (linear scan)", measure(lambda: conflicts_linear(*one_hour), repeat=200))
+
+
+def bench_recurrence(n_rules=50):
+    """Validation and expansion speed of the recurrence engine, cold versus with compiled rules cached."""
+    from dateutil import tz
+    from dateutil.rrule import rrulestr
+
+    print(f"recurrence ({n_rules} distinct rules)")
+    rules = [f"FREQ=WEEKLY;BYDAY={day};INTERVAL={1 + i // 5}"
+             for i, day in enumerate(["MO", "TU", "WE", "TH", "FR"] * (n_rules // 5))]
+    dtstart = datetime(2026, 1, 5, 19, tzinfo=tz.gettz("Europe/Rome"))
+    window_start = datetime(2026, 6, 1, tzinfo=dtstart.tzinfo)
+    window_end = window_start + timedelta(days=90)
+    engine = RecurrenceEngine()
+
+    report("validate", measure(lambda: [engine.validate(rule) for rule in rules], repeat=100) / n_rules)
+    report("rrulestr parse per rule (uncached)", measure(
+        lambda: [rrulestr(rule, dtstart=dtstart) for rule in rules], repeat=20) / n_rules)
+    report("compile per rule (cached)", measure(
+        lambda: [engine.compile(rule, dtstart) for rule in rules], repeat=100) / n_rules)
+
+    def expand_window():
+        return sum(1 for rule in rules for _ in engine.occurrences(rule, dtstart, window_start, window_end))
+
+    occurrences = expand_window()
+    seconds = measure(expand_window, repeat=20)
+    report("expand 90-day window, all rules", seconds, unit="ms")
+    print(f"  {'occurrences per second':<45} {occurrences / seconds:>12.0f}")
+    report("first 10 occurrences of an infinite rule", measure(
+        lambda: list(engine.occurrences("FREQ=DAILY", dtstart, limit=10))))
+    info = engine.cache_info()
+    print(f"  {'compile cache':<45} {info.hits} hits / {info.misses} misses")
+
+
+def bench_prefetch(model_latency=0.4, tool_latency=0.3, turns=10):
+    """Time to the first tool result when the likely read is prefetched during model generation."""
+    from langchain.tools import tool
+    from prefetch import Prefetcher
+
+    @tool
+    def get_latest_emails(count: int) -> str:
+        """Retrieves the latest emails from the inbox."""
+        time.sleep(tool_latency)
+        return "\n".join(f"Message ID: {i}" for i in range(count))
+
+    print(f"prefetch (model takes {model_latency * 1000:.0f} ms to emit the tool call, "
+          f"tool takes {tool_latency * 1000:.0f} ms)")
+    prefetcher = Prefetcher([get_latest_emails])
+
+    def turn(prefetch):
+        if prefetch:
+            prefetcher.start("Do I have new emails?")
+        time.sleep(model_latency)  # the model generating its tool call
+        result = prefetcher.take('get_latest_emails', {'count': 5}) if prefetch else None
+        if result is None:
+            get_latest_emails.invoke({'count': 5})
+        prefetcher.finish()
+
+    report("turn without prefetch", measure(lambda: turn(False), repeat=turns), unit="ms")
+    report("turn with prefetch", measure(lambda: turn(True), repeat=turns), unit="ms")
+    print(f"  {'hit rate':<45} {prefetcher.stats()['hit_rate']:>12.0%}")
+    prefetcher.close()
+
+
+def bench_plan_mode(call_latency=0.05, latency_per_char=20e-6):
+    """LLM calls, prompt characters and wall time per turn: tool loop versus plan-then-execute."""
+    from langchain.tools import tool
+    from agent import Agent
+    from fakes import ScriptedChatModel, tool_call
+
+    @tool
+    def get_events_on_date(date: str) -> str:
+        """Retrieves events on a specific date from the calendar."""
+        time.sleep(0.1)
+        return f"{date}T10:00:00 - Standup - ID: 1\n{date}T15:00:00 - Review - ID: 2"
+
+    @tool
+    def get_latest_emails(count: int) -> str:
+        """Retrieves the latest emails from the inbox."""
+        time.sleep(0.1)
+        return "\n".join(f"Message ID: {i}, From: bob@example.com, Subject: Update {i}" for i in range(count))
+
+    @tool
+    def send_message(to: str, subject: str, body: str) -> str:
+        """Sends an email."""
+        time.sleep(0.1)
+        return f"Email queued for delivery to {to}"
+
+    tools = [get_events_on_date, get_latest_emails, send_message]
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")) as f:
+        system_prompt = f.read()
+
+    # "Check tomorrow's events and my latest emails, then email Alice a summary of both"
+    react_script = [
+        tool_call("get_events_on_date", {"date": "2026-01-21"}),
+        tool_call("get_latest_emails", {"count": 3}),
+        tool_call("send_message", {"to": "alice@example.com", "subject": "Summary", "body": "..."}),
+        "I sent Alice a summary of tomorrow's events and your latest emails.",
+    ]
+    plan_script = [
+        json.dumps({"steps": [
+            {"id": "s1", "tool": "get_events_on_date", "args": {"date": "2026-01-21"}},
+            {"id": "s2", "tool": "get_latest_emails", "args": {"count": 3}},
+            {"id": "s3", "tool": "send_message", "args": {"to": "alice@example.com", "subject": "Summary",
+                                                          "body": "Events:\n$s1\n\nEmails:\n$s2"}}]}),
+        "I sent Alice a summary of tomorrow's events and your latest emails.",
+    ]
+
+    print(f"plan_mode (3 tool calls, {call_latency * 1000:.0f} ms per LLM call + prompt re-read time)")
+    for mode, script in (("react", react_script), ("plan", plan_script)):
+        model = ScriptedChatModel(responses=list(script), latency=call_latency, latency_per_char=latency_per_char)
+        agent = Agent(model, tools, system_prompt, mode=mode)
+        start = time.perf_counter()
+        for _ in agent.stream_invoke("Check tomorrow's events and my latest emails, then email Alice a summary"):
+            pass
+        seconds = time.perf_counter() - start
+        prompt_chars = sum(call['prompt_chars'] for call in model.calls)
+        print(f"  {mode:<8} {len(model.calls)} LLM calls  {prompt_chars:>8} prompt chars  {seconds * 1000:>8.0f} ms")
+
+
+ROUTING_TURNS = [
+    "Hi!", "Thanks a lot", "What meetings do I have tomorrow?", "Show my latest 5 emails",
+    "What's in my Downloads folder?", "Check tomorrow's events, then email Alice the list",
+    "Add a gym session every Tuesday at 7pm", "Am I free on Friday afternoon?",
+    "Email Bob my calendar for Friday", "What time is it?",
+]
+
+
+def bench_routing(small_latency=0.08, large_latency=0.4):
+    """Mean turn latency on a mixed workload: large model only versus the small/large cascade."""
+    from agent import Agent
+    from fakes import ScriptedChatModel
+    from routing import ModelRouter
+
+    def answers():
+        return ["Done."] * len(ROUTING_TURNS)
+
+    print(f"routing ({len(ROUTING_TURNS)} mixed turns, small model {small_latency * 1000:.0f} ms, "
+          f"large {large_latency * 1000:.0f} ms per call)")
+    for label, use_router in (("large only", False), ("cascade", True)):
+        large = ScriptedChatModel(responses=answers(), latency=large_latency)
+        router = ModelRouter([("small", ScriptedChatModel(responses=answers(), latency=small_latency)),
+                              ("large", large)]) if use_router else None
+        agent = Agent(large, [], "You are a helpful assistant.", router=router)
+        start = time.perf_counter()
+        for turn in ROUTING_TURNS:
+            agent.invoke(turn)
+        mean = (time.perf_counter() - start) / len(ROUTING_TURNS)
+        line = f"  {label:<12} {mean * 1000:>8.0f} ms per turn"
+        if router is not None:
+            stats = router.stats()
+            line += f"  ({stats['tiers']['small']['calls']} small / {stats['tiers']['large']['calls']} large calls)"
+        print(line)
+
+
+BACKEND_TURNS = ["Hi!", "What time is it?", "Thanks", "What time is it now?", "Bye"]
+
+
+def bench_backends(first_token_latency=0.05, token_latency=0.005, concurrent=4):
+    """The same conversation through each backend's HTTP client against the local mock server.
+
+    The mock server emulates Ollama serving one request at a time (OLLAMA_NUM_PARALLEL=1)
+    and an OpenAI-compatible server batching concurrent requests (llama.cpp --parallel, vLLM).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from langchain.messages import HumanMessage
+    from agent import Agent
+    from llm_backends import close_http_clients, make_chat_model
+    from mock_llm_server import MockLLMServer
+    from tools import TimeTools
+
+    print(f"backends ({len(BACKEND_TURNS)} turns; server takes {first_token_latency * 1000:.0f} ms to the "
+          f"first token, {token_latency * 1000:.0f} ms per token)")
+    for backend, parallel in (("ollama", 1), ("openai", concurrent)):
+        with MockLLMServer(first_token_latency=first_token_latency, token_latency=token_latency,
+                           parallel=parallel) as server:
+            base_url = server.url + ("/v1" if backend == "openai" else "")
+            model = make_chat_model("qwen3:8b", backend=backend, base_url=base_url)
+            agent = Agent(model, TimeTools().get_tools(), "You are a helpful assistant.", reasoning="off",
+                          warm_up=False)
+            start = time.perf_counter()
+            for turn in BACKEND_TURNS:
+                agent.invoke(turn)
+            conversation = (time.perf_counter() - start) / len(BACKEND_TURNS)
+            requests, connections = server.stats['requests'], server.stats['connections']
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrent) as executor:
+                list(executor.map(lambda _: model.invoke([HumanMessage(content="Hi!")]), range(concurrent * 2)))
+            burst = time.perf_counter() - start
+            print(f"  {backend:<7} {conversation * 1000:>6.0f} ms per turn ({requests} requests over "
+                  f"{connections} connections)  {concurrent * 2} calls from {concurrent} "
+                  f"threads: {burst * 1000:>5.0f} ms ({parallel} server slots)")
+        close_http_clients()
+
+
+def bench_warmup(load_latency=1.5, prompt_latency_per_char=50e-6, pause=1.0):
+    """First-token latency of the first turn, and of a turn after an idle pause, with and without warm-up.
+
+    The mock server loads the model on the first request and after `keep_alive` idle seconds,
+    and evaluates only the prompt characters past the prefix cached by the previous request.
+    """
+    from agent import Agent
+    from llm_backends import close_http_clients, make_chat_model
+    from mock_llm_server import MockLLMServer
+    from tools import FileSystemTools, TimeTools
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")) as f:
+        system_prompt = f.read()
+    tools = TimeTools().get_tools() + FileSystemTools().get_tools()
+    print(f"warmup (model load {load_latency * 1000:.0f} ms, prompt evaluation "
+          f"{prompt_latency_per_char * 1e6:.0f} us per uncached character, {pause:.1f} s pause "
+          f"with a {pause * 0.6:.1f} s keep-alive)")
+    for label, warm_up in (("cold start", False), ("warm-up", True)):
+        with MockLLMServer(load_latency=load_latency, prompt_latency_per_char=prompt_latency_per_char) as server:
+            agent = Agent(make_chat_model("qwen3:8b", base_url=server.url), tools, system_prompt,
+                          reasoning="off", warm_up=warm_up, keep_alive=pause * 0.6)
+            agent.warmer.wait(timeout=30)  # the user reading the welcome message
+            first = time.perf_counter()
+            agent.invoke("Hi!")
+            first = time.perf_counter() - first
+            time.sleep(pause)
+            after_pause = time.perf_counter()
+            agent.invoke("Hi again!")
+            after_pause = time.perf_counter() - after_pause
+            agent.close()
+            stats = agent.warmer.stats()
+            print(f"  {label:<11} first turn {first * 1000:>6.0f} ms  after the pause {after_pause * 1000:>6.0f} ms  "
+                  f"({server.stats['loads']} loads, {stats['cold_calls']} cold / {stats['warm_calls']} warm calls)")
+        close_http_clients()
+
+
+def bench_folder_listing(n_files=100_000):
+    """Listing a very large folder: every name joined (the old tool) versus one sorted, capped page."""
+    from tools import FileSystemTools
+
+    tools = FileSystemTools()
+    with tempfile.TemporaryDirectory() as folder:
+        for index in range(n_files):
+            open(os.path.join(folder, f"document_{index:06d}.{('txt', 'pdf', 'docx')[index % 3]}"), "w").close()
+        print(f"folder_listing ({n_files} files)")
+
+        def old_listing():
+            return "\n".join(os.listdir(folder))
+
+        for label, listing in (
+                ("all names (old)", old_listing),
+                ("first page by name", lambda: tools.show_folder_contents_impl(folder)),
+                ("50 most recent, with details", lambda: tools.show_folder_contents_impl(
+                    folder, sort_by="mtime", descending=True, details=True)),
+                ("'*_0999*' pdf files", lambda: tools.show_folder_contents_impl(
+                    folder, pattern="*_0999*", extensions=["pdf"]))):
+            output = listing()
+            report(f"{label} ({len(output)} chars)", measure(listing, repeat=3), unit="ms")
+
+
+def bench_file_index(n_files=50_000, n_rows=1_000_000):
+    """Finding a file by name: walking the tree versus querying the index, on a tree plus synthetic rows."""
+    import fnmatch
+    from file_index import FileIndex
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "home")
+        per_folder = 100
+        for index in range(n_files):
+            folder = os.path.join(root, f"project_{index // (per_folder * 20):03d}", f"folder_{index // per_folder:04d}")
+            if index % per_folder == 0:
+                os.makedirs(folder)
+            open(os.path.join(folder, f"document_{index:07d}.{('txt', 'pdf', 'docx')[index % 3]}"), "w").close()
+        print(f"file_index ({n_files} files on disk)")
+
+        index = FileIndex(os.path.join(directory, "index.db"), [root], use_inotify=False)
+        report("build (parallel walk + insert)", measure(index.build, repeat=1), unit="s")
+
+        def walk_search():
+            return [os.path.join(folder, name) for folder, _, names in os.walk(root)
+                    for name in fnmatch.filter(names, "*_0049999*")]
+        report("os.walk + fnmatch (no index)", measure(walk_search, repeat=3), unit="ms")
+        report("index: substring", measure(lambda: index.search("0049999"), repeat=100), unit="ms")
+
+        # Synthetic rows (not on disk) to measure queries at a million paths
+        now = time.time()
+        for start in range(0, n_rows, 100_000):
+            index._upsert((f"/synthetic/folder_{row // 1000:05d}/report_{row:07d}.{('txt', 'pdf', 'md')[row % 3]}",
+                           f"report_{row:07d}.{('txt', 'pdf', 'md')[row % 3]}", False, row, now - row)
+                          for row in range(start, min(start + 100_000, n_rows)))
+        print(f"  ({index.count()} rows in the index)")
+        for label, search in (
+                ("substring 'report_0999'", lambda: index.search("report_0999")),
+                ("pattern '*_09999*.pdf'", lambda: index.search(pattern="*_09999*.pdf")),
+                ("20 most recent pdf", lambda: index.search(extensions=["pdf"])),
+                ("modified in the last day", lambda: index.search(modified_within_days=1)),
+                ("no match", lambda: index.search("quarterly"))):
+            report(label, measure(search, repeat=20), unit="ms")
+        index.close()
+
+
+def bench_read_file(n_lines=1_000_000):
+    """Reading a window of a large log: the whole file read and split, versus mmap and the window cache."""
+    from tools import FileSystemTools
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "app.log")
+        with open(path, "w") as f:
+            f.writelines(f"2026-01-01 12:00:00 INFO request {index} served in {index % 97} ms\n"
+                         for index in range(n_lines))
+        print(f"read_file ({n_lines} lines, {os.path.getsize(path) / 1e6:.0f} MB)")
+
+        def read_all():
+            with open(path, encoding="utf-8") as f:
+                return "\n".join(f.read().splitlines()[n_lines // 2:n_lines // 2 + 50])
+
+        tools = FileSystemTools()
+        middle = n_lines // 2
+        report("read + split whole file (old way)", measure(read_all, repeat=3), unit="ms")
+        report("first 2000 tokens", measure(lambda: tools.read_file_content_impl(path), repeat=20), unit="ms")
+        report("lines in the middle (cold)", measure(
+            lambda: FileSystemTools().read_file_content_impl(path, start_line=middle), repeat=3), unit="ms")
+        tools.read_file_content_impl(path, start_line=middle)
+        next_line = middle
+        def show_more():
+            nonlocal next_line
+            header = tools.read_file_content_impl(path, start_line=next_line).splitlines()[0]
+            next_line = int(header.split("start_line=")[1].split(" ")[0])
+        report("'show me more' from the middle (cached)", measure(show_more, repeat=20), unit="ms")
+
+
+def bench_content_search(n_files=30_000):
+    """Searching inside a tree of files: a naive walk-and-read loop versus the batched worker pool."""
+    from content_search import ContentSearcher
+
+    with tempfile.TemporaryDirectory() as root:
+        for index in range(n_files):
+            folder = os.path.join(root, f"project_{index // 3000:02d}", f"folder_{index // 100:04d}")
+            if index % 100 == 0:
+                os.makedirs(folder)
+            with open(os.path.join(folder, f"notes_{index:06d}.txt"), "w") as f:
+                f.writelines(f"Line {line} of document {index}: meeting notes and action items\n"
+                             for line in range(40))
+                if index % 5000 == 1234:
+                    f.write("The Q3 budget was approved.\n")
+        print(f"content_search ({n_files} files, {os.cpu_count()} CPUs)")
+
+        def naive():
+            matches = []
+            for folder, _, names in os.walk(root):
+                for name in names:
+                    with open(os.path.join(folder, name), encoding="utf-8", errors="replace") as f:
+                        matches += [line for line in f if "q3 budget" in line.lower()]
+            return matches
+
+        report("os.walk + read every line (no tool before)", measure(naive, repeat=1), unit="ms")
+        for workers in sorted({1, 2, os.cpu_count() or 1}):
+            searcher = ContentSearcher(workers=workers)
+            search = lambda: list(searcher.search(root, "q3 budget", max_results=100))
+            assert len(search()) == len(naive())  # also starts the worker processes
+            report(f"search, {workers} worker process{'es' if workers > 1 else ''}", measure(search, repeat=3), unit="ms")
+            first = lambda: list(searcher.search(root, "meeting notes", max_results=50))
+            report(f"  first 50 of 1.2M matches, {workers} workers", measure(first, repeat=3), unit="ms")
+            searcher.close()
+
+
+def bench_retrieval(n_files=1000, words_per_file=16_000):
+    """Document retrieval over about 100k chunks: index build, refresh and query latency."""
+    import numpy as np
+    from retrieval import DocumentIndex
+    from utils import percentile
+
+    rng = np.random.default_rng(7)
+    vocabulary = np.array([f"term{index}" for index in range(50_000)])
+    # Zipf-like word frequencies, as in natural text
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "documents")
+        os.makedirs(root)
+        for file_index in range(n_files):
+            words = rng.choice(vocabulary, size=words_per_file, p=weights)
+            with open(os.path.join(root, f"document_{file_index:05d}.txt"), "w") as f:
+                for line in range(0, len(words), 16):
+                    f.write(" ".join(words[line:line + 16]) + "\n")
+
+        index = DocumentIndex(os.path.join(directory, "index"), [root])
+        start = time.perf_counter()
+        index.refresh()
+        build = time.perf_counter() - start
+        print(f"retrieval ({index.count()} chunks, {index.embedder.dim} dimensions, "
+              f"{os.path.getsize(index._vectors_path) / 1e6:.0f} MB of vectors)")
+        report(f"build ({index.count() / build:.0f} chunks/s)", build, unit="s")
+        report("refresh, nothing changed", measure(index.refresh, repeat=3), unit="ms")
+        with open(os.path.join(root, "document_00000.txt"), "a") as f:
+            f.write("term1 term2 quarterly report\n")
+        report("refresh, one file changed", measure(index.refresh, repeat=1), unit="ms")
+
+        queries = [" ".join(rng.choice(vocabulary[100:5000], size=4)) for _ in range(50)]
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, k=5)
+            latencies.append(time.perf_counter() - started)
+        report("search, p50", percentile(latencies, 50), unit="ms")
+        report("search, p95", percentile(latencies, 95), unit="ms")
+        vector = index.embedder.embed(queries[0])
+        rows = index._rows
+        report("  matrix-vector product alone", measure(lambda: index._vectors[:rows] @ vector, repeat=20), unit="ms")
+        scores = index._vectors[:rows] @ vector
+        report("  top 50: full argsort", measure(lambda: np.argsort(-scores)[:50], repeat=20), unit="ms")
+        report("  top 50: argpartition", measure(lambda: np.argpartition(scores, -50)[-50:], repeat=20), unit="ms")
+        index.close()
+
+
+def bench_bulk_remove(n_files=20_000):
+    """Deleting a tree of small files: shutil.rmtree versus remove_tree (parallel, bottom-up)."""
+    import re
+    import shutil
+    from unittest.mock import patch
+    from tools import FileSystemTools
+
+    def make_tree(root):
+        for index in range(n_files):
+            folder = os.path.join(root, f"module_{index // 2000:02d}", f"build_{index // 100:04d}")
+            if index % 100 == 0:
+                os.makedirs(folder)
+            with open(os.path.join(folder, f"object_{index:06d}.o"), "w") as f:
+                f.write("x" * 512)
+
+    print(f"bulk_remove ({n_files} files)")
+    tool = FileSystemTools()
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "build")
+        make_tree(root)
+        report("shutil.rmtree", measure(lambda: shutil.rmtree(root), repeat=1), unit="ms")
+
+        with patch('tools.MAX_REMOVE_FILES', n_files):
+            make_tree(root)
+            preview = []
+            report("remove_tree, dry run", measure(lambda: preview.append(tool.remove_tree_impl(root)), repeat=1), unit="ms")
+            token = re.search(r"confirm_token='(\w+)'", preview[0]).group(1)
+            report("remove_tree, confirmed", measure(lambda: tool.remove_tree_impl(root, confirm_token=token), repeat=1), unit="ms")
+            assert not os.path.exists(root)
+
+            make_tree(root)
+            preview = tool.remove_matching_impl(root, "*.o")
+            token = re.search(r"confirm_token='(\w+)'", preview).group(1)
+            report("remove_matching *.o, confirmed", measure(lambda: tool.remove_matching_impl(root, "*.o", confirm_token=token), repeat=1), unit="ms")
+
+
+def bench_disk_usage(n_files=100_000, files_per_folder=20):
+    """Folder sizes: os.walk + stat of every file versus DiskUsage, cold and with its mtime cache."""
+    from disk_usage import DiskUsage
+
+    with tempfile.TemporaryDirectory() as root:
+        for index in range(n_files):
+            folder = os.path.join(root, f"project_{index // 10_000:02d}", f"folder_{index // files_per_folder:05d}")
+            if index % files_per_folder == 0:
+                os.makedirs(folder)
+            with open(os.path.join(folder, f"file_{index:06d}.dat"), "wb") as f:
+                f.write(b"x" * (index % 4096))
+        print(f"disk_usage ({n_files} files in {n_files // files_per_folder} folders)")
+
+        def naive():
+            return sum(os.stat(os.path.join(folder, name)).st_size
+                       for folder, _, names in os.walk(root) for name in names)
+
+        expected = naive()
+        report("os.walk + stat every file (no tool before)", measure(naive, repeat=1), unit="ms")
+        cold = lambda: DiskUsage().usage(root)
+        assert cold()['size'] == expected
+        report("DiskUsage, cold cache", measure(cold, repeat=1), unit="ms")
+        disk_usage = DiskUsage()
+        disk_usage.usage(root)
+        report("DiskUsage, nothing changed", measure(lambda: disk_usage.usage(root), repeat=3), unit="ms")
+        changed = os.path.join(root, "project_03", "folder_01500")
+
+        def one_change():
+            with open(os.path.join(changed, f"new_{time.perf_counter_ns()}.dat"), "wb") as f:
+                f.write(b"x" * 100)
+            return disk_usage.usage(root)
+
+        report("DiskUsage, one folder changed", measure(one_change, repeat=3), unit="ms")
+
+
+def bench_google_replay(n_events=10000, latency=0.05):
+    """Calendar mirror sync through the real API client, on traffic recorded from a slow service and replayed.
+
+    The stand-in service returns Python objects; replayed responses are parsed from their
+    recorded JSON, at its recorded size, as the real client parses them.
+    """
+    from googleapiclient.discovery import build
+
+    from fakes import FakeCalendarService, FakeGoogleHttp
+    from google_replay import RecordingHttp, ReplayHttp
+
+    print(f"google_replay ({n_events} events, {latency * 1000:.0f} ms per recorded request)")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cassette = os.path.join(tmp_dir, "calendar.jsonl")
+
+        def sync(service):
+            # A full sync into an empty mirror, then an incremental one
+            mirror = CalendarMirror(os.path.join(tmp_dir, f"mirror{time.perf_counter_ns()}.db"), max_staleness=300)
+            try:
+                mirror.sync(service)
+                mirror.sync(service)
+            finally:
+                mirror.close()
+
+        live = FakeGoogleHttp(calendar=FakeCalendarService(generate_events(n_events), latency=latency))
+        report("recording", measure(lambda: sync(build("calendar", "v3", http=RecordingHttp(live, cassette))),
+                                    repeat=1), unit="ms")
+        report("stand-in service, no client", measure(
+            lambda: sync(_PagedEventsService(generate_events(n_events))), repeat=3), unit="ms")
+        replay = ReplayHttp(cassette)
+        report("replay, no latency", measure(lambda: sync(build("calendar", "v3", http=replay)), repeat=3),
+               unit="ms")
+        report("replay, recorded latency", measure(
+            lambda: sync(build("calendar", "v3", http=ReplayHttp(cassette, latency=1.0))), repeat=1), unit="ms")
+        print(f"  {replay.stats['requests'] // 3} requests and {replay.stats['bytes'] // 3 / 1e6:.1f} MB "
+              f"replayed per run")
+
+
+BENCHMARKS = {
+    'calendar_mirror': bench_calendar_mirror,
+    'list_payload': bench_list_payload,
+    'free_slots': bench_free_slots,
+    'recurrence': bench_recurrence,
+    'prefetch': bench_prefetch,
+    'plan_mode': bench_plan_mode,
+    'routing': bench_routing,
+    'backends': bench_backends,
+    'warmup': bench_warmup,
+    'folder_listing': bench_folder_listing,
+    'file_index': bench_file_index,
+    'read_file': bench_read_file,
+    'content_search': bench_content_search,
+    'retrieval': bench_retrieval,
+    'bulk_remove': bench_bulk_remove,
+    'disk_usage': bench_disk_usage,
+    'google_replay': bench_google_replay,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+        BENCHMARKS[name]()
+        print()
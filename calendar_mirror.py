@@ -0,0 +1,230 @@
+"""Local mirror of a Google Calendar kept up to date with incremental sync.
+
+Events are stored in SQLite with indexes on their start and end timestamps,
+so listing questions are answered locally. The mirror is refreshed through the
+Calendar API `syncToken` mechanism: the first sync downloads every event and
+later ones only fetch what changed since the previous sync.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from dateutil.parser import isoparse
+from googleapiclient.errors import HttpError
+
+from utils import get_zone
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    summary TEXT,
+    transparent INTEGER NOT NULL DEFAULT 0,
+    resource TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events(start_ts);
+CREATE INDEX IF NOT EXISTS idx_events_end ON events(end_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Partial response for sync: the mirror only stores these parts of each event
+SYNC_FIELDS = ("nextPageToken,nextSyncToken,"
+               "items(id,etag,status,summary,location,start,end,recurringEventId,htmlLink,transparency)")
+
+
+def event_timestamp(when, default_zone=None):
+    """Converts an event 'start'/'end' dict to a POSIX timestamp.
+
+    All-day events only carry a 'date'; they are anchored at midnight in
+    `default_zone` (the local timezone if not given).
+    """
+    value = when.get('dateTime') or when.get('date')
+    moment = isoparse(value)
+    if moment.tzinfo is None:
+        zone = get_zone(when['timeZone']) if when.get('timeZone') else None
+        moment = moment.replace(tzinfo=zone or default_zone or get_zone())
+    return moment.timestamp()
+
+
+class CalendarMirror:
+    """SQLite copy of one calendar's events (recurring events expanded into instances).
+
+    Args:
+        db_path: Path of the SQLite database file.
+        calendar_id: Calendar to mirror.
+        max_staleness: Seconds after the last sync before reads trigger a new incremental sync.
+    """
+
+    def __init__(self, db_path, calendar_id='primary', max_staleness=300.0):
+        self.db_path = db_path
+        self.calendar_id = calendar_id
+        self.max_staleness = max_staleness
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(events)")]
+            if 'transparent' not in columns:
+                # Mirrors synced before transparency was stored: start over with a full sync
+                self._conn.execute("DROP TABLE events")
+                self._conn.executescript(_SCHEMA)
+                self._set_meta('sync_token', None)
+                self._set_meta('last_sync', '0')
+            # Longest stored event: bounds range scans on the start index so overlap queries stay O(log n)
+            self._max_duration = self._conn.execute(
+                "SELECT COALESCE(MAX(end_ts - start_ts), 0) FROM events").fetchone()[0]
+
+    # Sync state
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def last_sync(self):
+        """POSIX time of the last successful sync (0 if never synced)."""
+        with self._lock:
+            value = self._get_meta('last_sync')
+        return float(value) if value else 0.0
+
+    def is_stale(self):
+        """Returns True when the mirror is older than `max_staleness`."""
+        return time.time() - self.last_sync > self.max_staleness
+
+    def invalidate(self):
+        """Forces the next read to sync, e.g. after a write the mirror can't apply locally."""
+        with self._lock, self._conn:
+            self._set_meta('last_sync', '0')
+
+    def ensure_fresh(self, service):
+        """Syncs if the mirror is stale. Returns True if a sync happened."""
+        if not self.is_stale():
+            return False
+        self.sync(service)
+        return True
+
+    def sync(self, service):
+        """Brings the mirror up to date, incrementally when a sync token is available.
+
+        Returns the number of changed events received from the API.
+        """
+        with self._lock:
+            sync_token = self._get_meta('sync_token')
+        try:
+            return self._sync(service, sync_token)
+        except HttpError as error:
+            # 410 Gone: the sync token expired, start over with a full sync
+            if sync_token and getattr(error.resp, 'status', None) == 410:
+                with self._lock, self._conn:
+                    self._conn.execute("DELETE FROM events")
+                    self._set_meta('sync_token', None)
+                return self._sync(service, None)
+            raise
+
+    def _sync(self, service, sync_token):
+        params = {'calendarId': self.calendar_id, 'singleEvents': True, 'maxResults': 2500,
+                  'fields': SYNC_FIELDS}
+        if sync_token:
+            params['syncToken'] = sync_token
+        else:
+            params['showDeleted'] = False
+
+        changed = []
+        next_sync_token = None
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+            response = service.events().list(**params).execute()
+            changed.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                next_sync_token = response.get('nextSyncToken')
+                break
+
+        with self._lock, self._conn:
+            if not sync_token:
+                self._conn.execute("DELETE FROM events")
+            for event in changed:
+                if event.get('status') == 'cancelled':
+                    self._conn.execute("DELETE FROM events WHERE id = ?", (event['id'],))
+                else:
+                    self._upsert(event)
+            self._set_meta('sync_token', next_sync_token)
+            self._set_meta('last_sync', str(time.time()))
+        return len(changed)
+
+    # Write-through
+
+    def _upsert(self, event):
+        start = event['start'].get('dateTime', event['start'].get('date'))
+        end = event['end'].get('dateTime', event['end'].get('date'))
+        start_ts, end_ts = event_timestamp(event['start']), event_timestamp(event['end'])
+        self._max_duration = max(self._max_duration, end_ts - start_ts)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events (id, start_ts, end_ts, start, end, summary, transparent, resource) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (event['id'], start_ts, end_ts, start, end, event.get('summary', ''),
+             event.get('transparency') == 'transparent', json.dumps(event)),
+        )
+
+    def upsert(self, event):
+        """Stores a created or updated event returned by the API."""
+        with self._lock, self._conn:
+            self._upsert(event)
+
+    def delete(self, event_id):
+        """Removes an event from the mirror."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    # Reads
+
+    def upcoming(self, after_ts, limit):
+        """Returns up to `limit` events that haven't ended before `after_ts`, ordered by start."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, start, end, summary FROM events WHERE start_ts >= ? AND end_ts > ? "
+                "ORDER BY start_ts LIMIT ?",
+                (after_ts - self._max_duration, after_ts, limit),
+            ).fetchall()
+
+    def between(self, start_ts, end_ts, busy_only=False):
+        """Returns the events overlapping [start_ts, end_ts), ordered by start.
+
+        With `busy_only`, transparent ("show as available") events are left out.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, start, end, summary, start_ts, end_ts FROM events WHERE start_ts >= ? AND start_ts < ? AND end_ts > ? "
+                + ("AND NOT transparent " if busy_only else "") + "ORDER BY start_ts",
+                (start_ts - self._max_duration, end_ts, start_ts),
+            ).fetchall()
+
+    def get(self, event_id):
+        """Returns the full stored resource of an event, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT resource FROM events WHERE id = ?", (event_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,265 @@
+"""Search inside files across directory trees, like grep -r, for the search_file_contents tool.
+
+The tree is listed by the parallel directory walker while files are searched
+in a pool of worker processes (regular expression matching holds the GIL, so
+threads wouldn't run it in parallel). Files go to the workers in batches, to
+pay the inter-process overhead once per batch rather than per file. Each
+worker skips binary files from a prefix sample and memory-maps large ones.
+
+Matches are streamed back as batches complete, and the search stops as soon as
+the result cap is reached, without reading the rest of the tree.
+"""
+
+import codecs
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from file_reader import SNIFF_BYTES, sniff_encoding
+from utils import SKIPPED_DIRS, walk_parallel
+
+# Files larger than this are memory-mapped instead of read
+MMAP_THRESHOLD = 1024 * 1024
+
+# Files larger than this are skipped (large logs and datasets, disk images...)
+MAX_FILE_SIZE = 256 * 1024 * 1024
+
+# Files per batch sent to a worker, and total bytes per batch
+BATCH_FILES = 64
+BATCH_BYTES = 8 * 1024 * 1024
+
+# Longest line shown in a match or context line, in characters
+MAX_LINE_CHARS = 300
+
+# Workers are started from a clean server process rather than forked from the agent,
+# whose threads may hold locks at fork time
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class _Query:
+    """A query compiled once per batch: one bytes pattern per file encoding, and a literal prefilter."""
+
+    def __init__(self, query, regex, ignore_case):
+        self.query = query
+        self.regex = regex
+        # ^ and $ match at line boundaries, as in grep; case folding is ASCII-only on bytes
+        self.flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        self.ignore_case = ignore_case
+        self._patterns = {}
+        self._needle = None
+        if not regex and query.isascii():
+            self._needle = query.lower().encode() if ignore_case else query.encode()
+
+    def pattern(self, encoding):
+        """The bytes pattern for files in `encoding`; None if the query can't be written in it."""
+        if encoding not in self._patterns:
+            try:
+                pattern = self.query.encode(encoding)
+                self._patterns[encoding] = re.compile(pattern if self.regex else re.escape(pattern), self.flags)
+            except UnicodeEncodeError:
+                self._patterns[encoding] = None
+        return self._patterns[encoding]
+
+    def may_match(self, data):
+        """Cheap check, before sniffing the encoding, that a literal query can occur in a small file.
+
+        An ASCII query has the same bytes in every encoding searched as bytes, so a file that
+        doesn't contain them is skipped without further work.
+        """
+        if self.regex or not self._needle:
+            return True
+        if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return True
+        return self._needle in (data.lower() if self.ignore_case else data)
+
+
+def _line_text(data, start, end, encoding):
+    text = bytes(data[start:end]).decode(encoding, errors="replace").rstrip("\r\n")
+    return text if len(text) <= MAX_LINE_CHARS else text[:MAX_LINE_CHARS] + "..."
+
+
+def search_file(path, size, query, context=1, max_matches=20):
+    """Returns the matches of a file as (line number, line, lines before, lines after) tuples.
+
+    Binary files, files over MAX_FILE_SIZE and unreadable files give no matches. UTF-16
+    files are decoded first; other files are searched as bytes in their own encoding.
+    """
+    if size == 0 or size > MAX_FILE_SIZE:
+        return []
+    try:
+        with open(path, "rb") as f:
+            if size > MMAP_THRESHOLD:
+                encoding = sniff_encoding(f.read(SNIFF_BYTES))
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if encoding else None
+            else:
+                data = f.read()
+                if not query.may_match(data):
+                    return []
+                encoding = sniff_encoding(data[:SNIFF_BYTES])
+    except (OSError, ValueError):
+        return []
+    if encoding is None:
+        return []
+    if encoding == "utf-16":
+        data = bytes(data).decode("utf-16", errors="replace").encode("utf-8")
+        encoding = "utf-8"
+    elif encoding == "utf-8-sig":
+        encoding = "utf-8"
+
+    matches = []
+    try:
+        pattern = query.pattern(encoding)
+        if pattern is None:
+            return []
+        line_number, counted_to = 1, 0
+        last_line_start = -1
+        for match in pattern.finditer(data):
+            start = data.rfind(b"\n", 0, match.start()) + 1
+            if start == last_line_start:
+                continue  # one result per line
+            last_line_start = start
+            end = data.find(b"\n", match.start())
+            end = len(data) if end < 0 else end + 1
+            line_number += data.count(b"\n", counted_to, start)
+            counted_to = start
+
+            before, position = [], start
+            for _ in range(context):
+                if position == 0:
+                    break
+                previous = data.rfind(b"\n", 0, position - 1) + 1
+                before.insert(0, _line_text(data, previous, position, encoding))
+                position = previous
+            after, position = [], end
+            for _ in range(context):
+                if position >= len(data):
+                    break
+                following = data.find(b"\n", position)
+                following = len(data) if following < 0 else following + 1
+                after.append(_line_text(data, position, following, encoding))
+                position = following
+
+            matches.append((line_number, _line_text(data, start, end, encoding), before, after))
+            if len(matches) >= max_matches:
+                break
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return matches
+
+
+def search_files(files, query, regex=False, ignore_case=True, context=1, max_matches=20):
+    """Searches a batch of (path, size) files; returns (path, matches) for the files with matches."""
+    compiled = _Query(query, regex, ignore_case)
+    results = []
+    for path, size in files:
+        matches = search_file(path, size, compiled, context, max_matches)
+        if matches:
+            results.append((path, matches))
+    return results
+
+
+class ContentSearcher:
+    """Searches file contents under folders with a pool of worker processes.
+
+    Args:
+        workers: Worker processes (defaults to the number of CPUs). With 1, files are searched
+            in the calling process.
+        skip: Directory names never descended into.
+    """
+
+    def __init__(self, workers=None, skip=SKIPPED_DIRS):
+        self.workers = workers or os.cpu_count() or 1
+        self.skip = skip
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Started on first use and kept: starting worker processes costs more than most searches
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(_START_METHOD))
+            return self._executor
+
+    def _batches(self, roots, extensions):
+        """Yields lists of (path, size) files to search, listing the trees lazily."""
+        batch, batch_bytes = [], 0
+        for directory, entries in walk_parallel(roots, skip=self.skip):
+            for path, name, is_dir, size, _ in entries:
+                if is_dir or size == 0 or size > MAX_FILE_SIZE:
+                    continue
+                if extensions and not name.lower().endswith(extensions):
+                    continue
+                batch.append((path, size))
+                batch_bytes += size
+                if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                    yield batch
+                    batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+    def search(self, roots, query, regex=False, ignore_case=True, extensions=None, context=1,
+               max_results=50, max_per_file=5):
+        """Yields (path, line number, line, lines before, lines after) for every match, as found.
+
+        Stops after `max_results` matches. Files of a directory are searched together, so
+        matches arrive roughly in walk order, not sorted.
+
+        Raises:
+            re.error: If `regex` is set and the query isn't a valid regular expression.
+        """
+        if regex:
+            re.compile(query)
+        if isinstance(roots, str):
+            roots = [roots]
+        extensions = tuple('.' + extension.lower().lstrip('.') for extension in extensions) if extensions else None
+        args = (query, regex, ignore_case, context, max_per_file)
+        found = 0
+
+        if self.workers <= 1:
+            for batch in self._batches(roots, extensions):
+                for path, matches in search_files(batch, *args):
+                    for match in matches:
+                        yield (path, *match)
+                        found += 1
+                        if found >= max_results:
+                            return
+            return
+
+        pool = self._pool()
+        batches = self._batches(roots, extensions)
+        running = set()
+        try:
+            exhausted = False
+            while running or not exhausted:
+                # Keep every worker busy, with a few batches queued, without listing the whole tree first
+                while not exhausted and len(running) < self.workers * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                    else:
+                        running.add(pool.submit(search_files, batch, *args))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for path, matches in future.result():
+                        for match in matches:
+                            yield (path, *match)
+                            found += 1
+                            if found >= max_results:
+                                return
+        finally:
+            for future in running:
+                future.cancel()
+            batches.close()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,143 @@
+"""Disk usage of directory trees, for the disk_usage tool: what takes the space in a folder.
+
+Subtree sizes are summed over a walk that lists sibling directories in parallel
+threads. What a directory listing contributes (the total size and count of its
+files, its subdirectories and its largest files) is cached with the directory's
+mtime, which changes whenever an entry is added, removed or renamed in it. A
+repeated query then costs one stat per directory, and only the directories that
+changed are listed again.
+
+A file rewritten in place (a growing log) doesn't change its directory's mtime:
+cached listings are also re-read once they are older than `max_age`.
+"""
+
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils import scan_dir
+
+# Largest files remembered per directory, and so the most children a report can show
+KEPT_FILES = 50
+
+# Directories checked or listed per thread pool task
+BATCH_DIRS = 32
+
+
+class _Listing:
+    """The cached contribution of one directory, without its subdirectories' contents."""
+
+    __slots__ = ('mtime_ns', 'scanned', 'file_bytes', 'file_count', 'subdirs', 'largest')
+
+    def __init__(self, mtime_ns, entries, subdirs):
+        files = [(name, size) for _, name, is_dir, size, _ in entries if not is_dir]
+        self.mtime_ns = mtime_ns
+        self.scanned = time.monotonic()
+        self.file_bytes = sum(size for _, size in files)
+        self.file_count = len(files)
+        self.subdirs = subdirs
+        self.largest = heapq.nlargest(KEPT_FILES, files, key=lambda item: item[1])
+
+
+class DiskUsage:
+    """Computes the size of folder trees, re-listing only the directories changed since the last call.
+
+    Args:
+        workers: Threads listing directories in parallel.
+        max_age: Seconds after which a cached listing is read again even if its mtime is unchanged.
+        max_dirs: Directory listings kept in the cache; the least recently used are dropped first.
+        skip: Directory names not descended into. Nothing is skipped by default: dependency
+            and cache folders are often what takes the space.
+    """
+
+    def __init__(self, workers=8, max_age=600.0, max_dirs=500_000, skip=()):
+        self.workers = workers
+        self.max_age = max_age
+        self.max_dirs = max_dirs
+        self.skip = skip
+        self._cache = OrderedDict()  # directory path -> _Listing
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _listing(self, path):
+        """Returns (listing, whether it was read again) for a directory; (None, False) if it is unreadable."""
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+        except OSError:
+            return None, False
+        with self._lock:
+            listing = self._cache.get(path)
+            if listing is not None and listing.mtime_ns == mtime_ns and \
+                    time.monotonic() - listing.scanned < self.max_age:
+                self._cache.move_to_end(path)
+                self.stats['hits'] += 1
+                return listing, False
+            self.stats['misses'] += 1
+        # Stat before listing: a change in between gives a newer mtime, and a re-read next time
+        listing = _Listing(mtime_ns, *scan_dir(path, self.skip))
+        with self._lock:
+            self._cache[path] = listing
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_dirs:
+                self._cache.popitem(last=False)
+        return listing, True
+
+    def _listings(self, paths):
+        return [(path, *self._listing(path)) for path in paths]
+
+    def usage(self, folder_path, top=10):
+        """Measures a folder tree.
+
+        Returns:
+            Dict with 'size', 'files' and 'folders' for the whole tree, 'children' the `top`
+            (at most KEPT_FILES) largest direct children as (name, is_dir, size, files) tuples,
+            largest first, 'rest' the (count, size) of the other children, and 'listed' the
+            number of directories that had to be listed again, out of 'folders' + 1.
+        """
+        folder_path = os.path.abspath(folder_path)
+        top = max(1, min(top, KEPT_FILES))
+        order, listings, listed = [], {}, 0
+        pending = [folder_path]
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="du") as executor:
+            running = set()
+            while running or pending:
+                # Directories go to the threads in batches: a task per directory costs more than
+                # the stat that checks a cached one
+                while pending and len(running) < self.workers * 2:
+                    running.add(executor.submit(self._listings, pending[-BATCH_DIRS:]))
+                    del pending[-BATCH_DIRS:]
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for path, listing, fresh in future.result():
+                        if listing is None:
+                            continue
+                        listed += fresh
+                        order.append(path)
+                        listings[path] = listing
+                        pending += listing.subdirs
+
+        # Subdirectories are reached after their parent: summing in reverse order is bottom-up
+        totals = {}  # path -> (size, files, folders)
+        for path in reversed(order):
+            listing = listings[path]
+            size, files, folders = listing.file_bytes, listing.file_count, 0
+            for subdir in listing.subdirs:
+                sub_size, sub_files, sub_folders = totals.get(subdir, (0, 0, 0))
+                size, files, folders = size + sub_size, files + sub_files, folders + sub_folders + 1
+            totals[path] = (size, files, folders)
+
+        root = listings.get(folder_path)
+        if root is None:
+            raise OSError(f"Cannot read '{folder_path}'")
+        children = [(os.path.basename(subdir), True, *totals.get(subdir, (0, 0, 0))[:2]) for subdir in root.subdirs]
+        children += [(name, False, size, 1) for name, size in root.largest]
+        children = heapq.nlargest(top, children, key=lambda child: child[2])
+        size, files, folders = totals[folder_path]
+        return {
+            'size': size, 'files': files, 'folders': folders, 'children': children,
+            'rest': (len(root.subdirs) + root.file_count - len(children), size - sum(child[2] for child in children)),
+            'listed': listed,
+        }
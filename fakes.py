@@ -0,0 +1,316 @@
+"""Offline stand-ins used by the tests and benchmarks."""
+
+import email
+import json
+import re
+import time
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import httplib2
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from pydantic import Field
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replies with a fixed script, one response per call.
+
+    Each response is an AIMessage, a string (a plain answer) or a callable taking the
+    prompt messages and returning one of those. Every call is recorded in `calls`
+    (with the prompt size in characters), so tests and benchmarks can count LLM round trips.
+
+    A scripted AIMessage may carry thinking in additional_kwargs['reasoning_content'];
+    like ChatOllama, it is streamed inline in <think> tags when `reasoning` is None,
+    as separate reasoning chunks when True, and dropped when False.
+
+    Args:
+        responses: The scripted responses, consumed in order.
+        latency: Seconds each call takes, plus `latency_per_char` for each prompt character
+            to mimic a local model re-reading the whole prompt on every call.
+        reasoning: Default reasoning setting, overridable per call like ChatOllama's.
+    """
+
+    responses: list = Field(default_factory=list)
+    latency: float = 0.0
+    latency_per_char: float = 0.0
+    reasoning: bool | None = None
+    calls: list = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next_message(self, messages, reasoning):
+        prompt_chars = sum(len(str(message.content)) for message in messages)
+        self.calls.append({'messages': len(messages), 'prompt_chars': prompt_chars, 'reasoning': reasoning})
+        time.sleep(self.latency + self.latency_per_char * prompt_chars)
+        if not self.responses:
+            raise RuntimeError("ScriptedChatModel has no responses left")
+        response = self.responses.pop(0)
+        if callable(response):
+            response = response(messages)
+        return AIMessage(content=response) if isinstance(response, str) else response
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = list(self._stream(messages, stop, **kwargs))
+        if run_manager:
+            for chunk in chunks:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+        return generate_from_stream(iter(chunks))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reasoning = kwargs.get('reasoning', self.reasoning)
+        message = self._next_message(messages, reasoning)
+        thinking = message.additional_kwargs.get('reasoning_content', '')
+        chunks = []
+        if thinking and reasoning:
+            chunks += [AIMessageChunk(content="", additional_kwargs={'reasoning_content': word + " "})
+                       for word in thinking.split(" ")]
+        content = message.content
+        if thinking and reasoning is None:
+            content = f"<think>{thinking}</think>{content}"
+        if message.tool_calls or not content:
+            chunks.append(AIMessageChunk(content=content, tool_call_chunks=[
+                {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+                for index, call in enumerate(message.tool_calls)]))
+        else:
+            chunks += [AIMessageChunk(content=word if position == 0 else " " + word)
+                       for position, word in enumerate(content.split(" "))]
+
+        for message_chunk in chunks:
+            yield ChatGenerationChunk(message=message_chunk)
+
+
+def tool_call(name, args, call_id=None):
+    """Builds an AIMessage requesting a single tool call."""
+    return AIMessage(content="", tool_calls=[{'name': name, 'args': args, 'id': call_id or f"call_{name}",
+                                              'type': 'tool_call'}])
+
+
+class FakeRequest:
+    """A request of a fake Google service: `execute()` waits the service latency, then responds."""
+
+    def __init__(self, service, respond):
+        self.service = service
+        self.respond = respond
+        self.headers = {}
+
+    def execute(self):
+        self.service.requests += 1
+        time.sleep(self.service.latency)
+        return self.respond()
+
+
+class FakeCalendarService:
+    """In-process stand-in for the Google Calendar v3 service, holding events in memory.
+
+    Supports what CalendarTools uses: events().list (time range, paging, sync tokens), get,
+    insert, patch and delete, settings().get('timezone') and freebusy().query. Every request takes
+    `latency` seconds and is counted in `requests`.
+    """
+
+    def __init__(self, events=(), latency=0.0, time_zone="UTC"):
+        self.events_by_id = {event['id']: dict(event) for event in events}
+        self.latency = latency
+        self.time_zone = time_zone
+        self.requests = 0
+        self._version = 0  # ids and etags of inserted and patched events
+
+    def events(self):
+        return self
+
+    def settings(self):
+        return self
+
+    def freebusy(self):
+        return self
+
+    def _in_range(self, event, time_min, time_max):
+        from calendar_mirror import event_timestamp
+        from dateutil.parser import isoparse
+        start, end = event_timestamp(event['start']), event_timestamp(event['end'])
+        return (time_max is None or start < isoparse(time_max).timestamp()) and \
+            (time_min is None or end > isoparse(time_min).timestamp())
+
+    def list(self, calendarId='primary', timeMin=None, timeMax=None, maxResults=250, pageToken=None,
+             syncToken=None, **params):
+        from calendar_mirror import event_timestamp
+
+        def respond():
+            if syncToken:
+                # Nothing changes behind the agent's back: an incremental sync finds no changes
+                return {'items': [], 'nextSyncToken': syncToken}
+            events = sorted((event for event in self.events_by_id.values() if self._in_range(event, timeMin, timeMax)),
+                            key=lambda event: event_timestamp(event['start']))
+            offset = int(pageToken or 0)
+            response = {'items': events[offset:offset + maxResults]}
+            if offset + maxResults < len(events):
+                response['nextPageToken'] = str(offset + maxResults)
+            else:
+                response['nextSyncToken'] = f"sync{self._version}"
+            return response
+        return FakeRequest(self, respond)
+
+    def get(self, calendarId='primary', eventId=None, setting=None, **params):
+        if setting is not None:
+            return FakeRequest(self, lambda: {'value': self.time_zone})
+        return FakeRequest(self, lambda: dict(self.events_by_id[eventId]))
+
+    def insert(self, calendarId='primary', body=None, **params):
+        def respond():
+            self._version += 1
+            event = dict(body, id=f"event{self._version}", etag=f'"{self._version}"',
+                         htmlLink=f"https://calendar.example.com/event{self._version}")
+            self.events_by_id[event['id']] = event
+            return dict(event)
+        return FakeRequest(self, respond)
+
+    def patch(self, calendarId='primary', eventId=None, body=None, **params):
+        def respond():
+            self._version += 1
+            event = self.events_by_id[eventId]
+            event.update(body, etag=f'"{self._version}"')
+            return dict(event)
+        return FakeRequest(self, respond)
+
+    def delete(self, calendarId='primary', eventId=None, **params):
+        return FakeRequest(self, lambda: self.events_by_id.pop(eventId, None) and "")
+
+    def query(self, body=None):
+        def respond():
+            busy = [{'start': event['start'].get('dateTime'), 'end': event['end'].get('dateTime')}
+                    for event in self.events_by_id.values()
+                    if 'dateTime' in event['start'] and self._in_range(event, body['timeMin'], body['timeMax'])]
+            return {'calendars': {item['id']: {'busy': busy} for item in body.get('items', [])}}
+        return FakeRequest(self, respond)
+
+
+class FakeGmailService:
+    """In-process stand-in for the Gmail v1 service: listing, reading and sending messages, and drafts.
+
+    `messages` are (sender, subject) pairs, newest first, kept in `inbox`. Sent messages and
+    drafts are kept in `sent` and `drafted`. Every request takes `latency` seconds and is counted in `requests`.
+    """
+
+    def __init__(self, messages=(), latency=0.0):
+        self.inbox = {f"msg{index}": {'id': f"msg{index}", 'snippet': subject,
+                                         'payload': {'headers': [{'name': 'From', 'value': sender},
+                                                                 {'name': 'Subject', 'value': subject}]}}
+                         for index, (sender, subject) in enumerate(messages)}
+        self.latency = latency
+        self.requests = 0
+        self.sent = []
+        self.drafted = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return _FakeGmailMessages(self)
+
+    def drafts(self):
+        return _FakeGmailDrafts(self)
+
+
+class _FakeGmailMessages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId="me", **params):
+        return FakeRequest(self.service, lambda: {'messages': [{'id': message_id}
+                                                               for message_id in self.service.inbox]})
+
+    def get(self, userId="me", id=None, **params):
+        return FakeRequest(self.service, lambda: self.service.inbox[id])
+
+    def send(self, userId="me", body=None):
+        def respond():
+            self.service.sent.append(body)
+            return {'id': f"sent{len(self.service.sent)}", 'labelIds': ['SENT']}
+        return FakeRequest(self.service, respond)
+
+
+class _FakeGmailDrafts:
+    def __init__(self, service):
+        self.service = service
+
+    def create(self, userId="me", body=None):
+        def respond():
+            self.service.drafted.append(body)
+            return {'id': f"draft{len(self.service.drafted)}", 'message': body.get('message', {})}
+        return FakeRequest(self.service, respond)
+
+
+class FakeGoogleHttp:
+    """httplib2-style http object serving the Calendar and Gmail REST APIs from the fake services.
+
+    Lets the real googleapiclient services run offline, with their JSON encoding and batch
+    requests: `build('calendar', 'v3', http=FakeGoogleHttp(calendar=FakeCalendarService()))`.
+    """
+
+    _ROUTES = [
+        ('GET', r"/calendar/v3/calendars/([^/]+)/events", lambda s, m, q, b: s.calendar.list(m[1], **q)),
+        ('POST', r"/calendar/v3/calendars/([^/]+)/events", lambda s, m, q, b: s.calendar.insert(m[1], b)),
+        ('GET', r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", lambda s, m, q, b: s.calendar.get(m[1], m[2])),
+        ('PATCH', r"/calendar/v3/calendars/([^/]+)/events/([^/]+)",
+         lambda s, m, q, b: s.calendar.patch(m[1], m[2], b)),
+        ('DELETE', r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", lambda s, m, q, b: s.calendar.delete(m[1], m[2])),
+        ('GET', r"/calendar/v3/users/me/settings/([^/]+)", lambda s, m, q, b: s.calendar.get(setting=m[1])),
+        ('POST', r"/calendar/v3/freeBusy", lambda s, m, q, b: s.calendar.query(b)),
+        ('GET', r"/gmail/v1/users/([^/]+)/messages", lambda s, m, q, b: s.gmail.messages().list(m[1])),
+        ('POST', r"/gmail/v1/users/([^/]+)/messages/send", lambda s, m, q, b: s.gmail.messages().send(m[1], b)),
+        ('GET', r"/gmail/v1/users/([^/]+)/messages/([^/]+)", lambda s, m, q, b: s.gmail.messages().get(m[1], m[2])),
+        ('POST', r"/gmail/v1/users/([^/]+)/drafts", lambda s, m, q, b: s.gmail.drafts().create(m[1], b)),
+    ]
+
+    def __init__(self, calendar=None, gmail=None):
+        self.calendar = calendar
+        self.gmail = gmail
+
+    def _dispatch(self, method, uri, body):
+        parts = urlsplit(uri)
+        path = unquote(parts.path)
+        query = {name: int(value) if name == 'maxResults' else value
+                 for name, value in parse_qsl(parts.query) if name not in ('alt', 'fields', 'prettyPrint')}
+        for route_method, pattern, handler in self._ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                try:
+                    return 200, handler(self, match, query, json.loads(body) if body else None).execute()
+                except KeyError:
+                    break
+        return 404, {'error': {'code': 404, 'message': f"Not Found: {method} {path}"}}
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        if urlsplit(uri).path.startswith("/batch/"):
+            return self._batch(body, headers or {})
+        status, payload = self._dispatch(method, uri, body)
+        content = json.dumps(payload).encode() if payload is not None else b""
+        return httplib2.Response({'status': str(status), 'content-type': 'application/json; charset=UTF-8',
+                                  'content-length': str(len(content))}), content
+
+    def _batch(self, body, headers):
+        """Answers a multipart batch request, one embedded HTTP response per embedded request."""
+        content_type = next(value for name, value in headers.items() if name.lower() == 'content-type')
+        body = body if isinstance(body, bytes) else body.encode()
+        message = email.message_from_bytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        boundary = "batch_fake_boundary"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, uri = request_line.split(" ")[:2]
+            request_body = rest.split("\n\n", 1)[1].strip() if "\n\n" in rest else ""
+            status, payload = self._dispatch(method, uri, request_body or None)
+            content_id = part['Content-ID'].replace("<", "<response-", 1)
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                         f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n")
+        content = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        return httplib2.Response({'status': '200', 'content-type': f"multipart/mixed; boundary={boundary}",
+                                  'content-length': str(len(content))}), content
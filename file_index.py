@@ -0,0 +1,436 @@
+"""Local index of file names and metadata, so the agent finds files in one tool call.
+
+Paths under the configured roots are stored in SQLite with an FTS5 trigram index
+on file names: substring and wildcard queries ("notes", "*meeting*.docx") use
+the index instead of scanning, and recency queries use an index on mtime, so
+answers take milliseconds even over millions of paths.
+
+The index is built once with a parallel directory walker and then kept current:
+- through inotify on Linux: every indexed directory is watched, and only the
+  files and directories that changed are updated;
+- by polling where inotify isn't available (or runs out of watches): directories
+  whose mtime changed are re-listed, and a full re-walk catches file edits.
+On start, an existing index catches up with a polling pass.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from utils import SKIPPED_DIRS, format_size, scan_dir, walk_parallel
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    scan INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS idx_files_mtime ON files(mtime);
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(name, content='files', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Rows written per transaction while building, so queries can run in between
+_BATCH_SIZE = 5000
+
+# inotify event masks (linux/inotify.h)
+# IN_MODIFY isn't watched: IN_CLOSE_WRITE reports a file written in place once, when it's closed
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (_IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE |
+               _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal inotify binding through ctypes (Linux only)."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read(self, timeout):
+        """Returns the pending (wd, mask, name) events, waiting up to `timeout` seconds for one."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _glob_to_like(pattern):
+    """Converts a wildcard pattern using only * and ? to a case-insensitive LIKE pattern; None otherwise."""
+    if "[" in pattern:
+        return None
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+class FileIndex:
+    """Index of the files under a set of root folders.
+
+    Args:
+        db_path: Path of the SQLite database file.
+        roots: Folders to index.
+        workers: Threads of the directory walker.
+        poll_interval: Seconds between polling passes when inotify isn't used.
+        full_rescan_interval: Seconds between full re-walks when polling (directory mtimes don't change
+            when a file inside is edited, so polling alone misses edits).
+        use_inotify: Set to False to always poll.
+        skip: Directory names never descended into.
+    """
+
+    def __init__(self, db_path, roots, workers=8, poll_interval=30.0, full_rescan_interval=600.0,
+                 use_inotify=True, skip=SKIPPED_DIRS):
+        self.db_path = db_path
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.full_rescan_interval = full_rescan_interval
+        self.use_inotify = use_inotify
+        self.skip = skip
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            # Rows written by the current walk carry its number
+            self._scan = self._conn.execute("SELECT COALESCE(MAX(scan), 0) FROM files").fetchone()[0]
+        self._inotify = None
+        self._watches = {}  # wd -> directory
+        self._stop = threading.Event()
+        self._thread = None
+        self.building = False
+        self.mode = None  # 'inotify' or 'polling' once started
+
+    # Storage
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _upsert(self, entries):
+        """Inserts or updates (path, name, is_dir, size, mtime) entries."""
+        rows = [(path, os.path.dirname(path), name, int(is_dir), size, mtime, self._scan)
+                for path, name, is_dir, size, mtime in entries]
+        with self._lock, self._conn:
+            # The name is part of the path, so an update never needs to touch the name index
+            self._conn.executemany(
+                "INSERT INTO files (path, dir, name, is_dir, size, mtime, scan) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET is_dir = excluded.is_dir, size = excluded.size, "
+                "mtime = excluded.mtime, scan = excluded.scan", rows)
+
+    def _remove(self, path):
+        """Removes a path and, for a directory, everything under it."""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                               (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # Building and updating
+
+    def build(self):
+        """Walks every path under the roots, then drops the rows of paths that weren't found.
+
+        The old rows stay searchable until the walk is over, so a rebuild never empties the index.
+        """
+        self.building = True
+        try:
+            self._scan += 1
+            self._index_trees(self.roots)
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM files WHERE scan != ?", (self._scan,))
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('roots', ?)",
+                                   (os.pathsep.join(self.roots),))
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_at', ?)",
+                                   (str(time.time()),))
+        finally:
+            self.building = False
+
+    def _index_trees(self, roots):
+        """Walks the trees under `roots` in parallel, storing their entries and watching their directories."""
+        batch, directories = [], []
+        for directory, entries in walk_parallel(roots, self.workers, self.skip):
+            self._watch(directory)
+            directories.append(directory)
+            batch += entries
+            if len(batch) >= _BATCH_SIZE:
+                self._upsert(batch)
+                batch = []
+        if batch:
+            self._upsert(batch)
+        return directories
+
+    def _stat_entry(self, path):
+        try:
+            stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return None
+        is_dir = os.path.isdir(path) and not os.path.islink(path)
+        return path, os.path.basename(path), is_dir, stat.st_size, stat.st_mtime
+
+    def sync_dir(self, directory):
+        """Brings one directory's entries up to date: new, removed and changed entries.
+
+        New subdirectories are indexed with everything under them.
+        """
+        if not os.path.isdir(directory):
+            self._remove(directory)
+            return
+        entries, _ = scan_dir(directory, self.skip)
+        with self._lock:
+            known = {path: (size, mtime, is_dir) for path, size, mtime, is_dir in self._conn.execute(
+                "SELECT path, size, mtime, is_dir FROM files WHERE dir = ?", (directory,))}
+        current = {entry[0] for entry in entries}
+        for path in set(known) - current:
+            self._remove(path)
+        changed = [entry for entry in entries if known.get(entry[0]) != (entry[3], entry[4], int(entry[2]))]
+        new_dirs = [entry[0] for entry in changed if entry[2] and entry[0] not in known]
+        self._upsert(changed)
+        if new_dirs:
+            started = time.time()
+            for new_dir in self._index_trees(new_dirs):
+                # Entries created after the directory was listed but before it was watched
+                stat = self._stat_entry(new_dir)
+                if self._inotify is not None and stat is not None and stat[4] >= started - 1:
+                    self.sync_dir(new_dir)
+        stat = self._stat_entry(directory)
+        if stat is not None and directory not in self.roots:
+            self._upsert([stat])
+
+    def poll(self):
+        """One polling pass: re-lists the directories whose mtime changed since they were indexed."""
+        with self._lock:
+            directories = dict(self._conn.execute("SELECT path, mtime FROM files WHERE is_dir = 1").fetchall())
+        for root in self.roots:
+            self.sync_dir(root)
+        for directory, mtime in directories.items():
+            try:
+                current = os.stat(directory, follow_symlinks=False).st_mtime
+            except OSError:
+                self._remove(directory)
+                continue
+            if current != mtime:
+                self.sync_dir(directory)
+
+    # Watching
+
+    def _watch(self, directory):
+        if self._inotify is None:
+            return
+        try:
+            self._watches[self._inotify.add_watch(directory)] = directory
+        except OSError as error:
+            # Typically fs.inotify.max_user_watches reached: fall back to polling for everything
+            print(f"File index: inotify unavailable for {directory} ({error}), polling instead.")
+            self._inotify.close()
+            self._inotify = None
+            self._watches = {}
+            self.mode = 'polling'
+
+    def _handle_events(self, events):
+        dirty = set()
+        overflow = False
+        for wd, mask, name in events:
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & _IN_IGNORED or mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                self._watches.pop(wd, None)
+                continue
+            if not name:
+                continue  # the watched directory itself; its parent's watch reports it
+            path = os.path.join(directory, name)
+            if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                self._remove(path)
+            elif mask & (_IN_CREATE | _IN_MOVED_TO) and mask & _IN_ISDIR:
+                if name not in self.skip:
+                    dirty.add(directory)
+            else:
+                entry = self._stat_entry(path)
+                if entry is not None:
+                    self._upsert([entry])
+        for directory in dirty:
+            self.sync_dir(directory)
+        if overflow:
+            # Events were lost anywhere under the roots: re-list every directory whose mtime changed
+            self.poll()
+
+    def _run(self):
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                self.mode = 'inotify'
+            except OSError:
+                self._inotify = None
+        if self._inotify is None:
+            self.mode = 'polling'
+
+        with self._lock:
+            same_roots = self._meta('roots') == os.pathsep.join(self.roots)
+        if not same_roots or self.count() == 0:
+            self.build()
+        else:
+            # Catch up with what changed while nobody was watching, and set up the watches
+            self.building = True
+            try:
+                if self._inotify is not None:
+                    for directory, _ in walk_parallel(self.roots, self.workers, self.skip):
+                        if self._inotify is None:
+                            break
+                        self._watch(directory)
+                self.poll()
+            finally:
+                self.building = False
+
+        last_full_scan = time.monotonic()
+        while not self._stop.is_set():
+            if self._inotify is not None:
+                self._handle_events(self._inotify.read(timeout=1.0))
+                continue
+            if self._stop.wait(self.poll_interval):
+                break
+            if time.monotonic() - last_full_scan >= self.full_rescan_interval:
+                self.build()
+                last_full_scan = time.monotonic()
+            else:
+                self.poll()
+
+    def start(self):
+        """Builds or catches up the index, then keeps it current, all in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="file-index", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # Queries
+
+    def search(self, query=None, pattern=None, extensions=None, modified_within_days=None,
+               folders_only=False, limit=20):
+        """Returns up to `limit` (path, is_dir, size, mtime) rows matching every given filter, newest first.
+
+        Args:
+            query: Words that must all appear in the name (case-insensitive substrings).
+            pattern: Wildcard pattern the whole name must match, e.g. '*notes*.md'.
+            extensions: Extensions to keep, e.g. ['pdf', 'docx'].
+            modified_within_days: Keep only entries modified in the last N days.
+            folders_only: Keep only directories.
+        """
+        # Runs of 3+ literal characters select candidate rows through the trigram index (MATCH:
+        # LIKE with an ESCAPE clause can't use it). The other filters (short words, extensions,
+        # which match many files) are checked while reading the rows newest first, which stops
+        # at `limit` matches.
+        trigrams, conditions, params = [], [], []
+        for word in (query or "").split():
+            if len(word) >= 3:
+                trigrams.append(word)
+            else:
+                conditions.append("files.name LIKE ? ESCAPE '\\'")
+                params.append("%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if pattern:
+            trigrams += [run for run in re.split(r"[*?]|\[[^\]]*\]?", pattern) if len(run) >= 3]
+            like = _glob_to_like(pattern)
+            if like is None:
+                conditions.append("files.name GLOB ?")
+                params.append(pattern)
+            else:
+                conditions.append("files.name LIKE ? ESCAPE '\\'")
+                params.append(like)
+        if extensions:
+            ext_conditions = []
+            for extension in extensions:
+                ext_conditions.append("files.name LIKE ? ESCAPE '\\'")
+                params.append("%." + extension.lstrip(".").replace("_", "\\_").replace("%", "\\%"))
+            conditions.append("(" + " OR ".join(ext_conditions) + ") AND files.is_dir = 0")
+        if modified_within_days is not None:
+            conditions.append("files.mtime >= ?")
+            params.append(time.time() - modified_within_days * 86400)
+        if folders_only:
+            conditions.append("files.is_dir = 1")
+        if trigrams:
+            conditions.insert(0, "files.id IN (SELECT rowid FROM names WHERE names MATCH ?)")
+            params.insert(0, " AND ".join('"' + run.replace('"', '""') + '"' for run in trigrams))
+
+        sql = ("SELECT files.path, files.is_dir, files.size, files.mtime FROM files" +
+               (" WHERE " + " AND ".join(conditions) if conditions else "") +
+               " ORDER BY files.mtime DESC LIMIT ?")
+        with self._lock:
+            return self._conn.execute(sql, params + [limit]).fetchall()
+
+    def format_results(self, rows):
+        lines = []
+        for path, is_dir, size, mtime in rows:
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+            lines.append(f"{path}{os.sep if is_dir else ''}  {'-' if is_dir else format_size(size)}  {modified}")
+        return "\n".join(lines)
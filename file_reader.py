@@ -0,0 +1,200 @@
+"""Bounded reads of file contents for the model: line or byte ranges of any file size.
+
+Files are memory-mapped, so reading lines 1000-1100 of a 2 GB log touches only
+the pages holding them. The encoding, and whether the file is binary, is guessed
+from the first few KB. Every read stops at a token budget, so one call can't
+flood the model's context.
+
+Recently read files are kept in a small LRU: their encoding and the byte
+offsets where earlier windows ended. A follow-up "show me more" then starts
+reading right where the previous window stopped, instead of counting lines
+from the top of the file again.
+"""
+
+import codecs
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Rough size of a token in characters, used to turn token budgets into character limits
+CHARS_PER_TOKEN = 4
+
+# Bytes read to guess the encoding and detect binary files
+SNIFF_BYTES = 8192
+
+# Bytes whose newlines are counted at once when skipping to a line far from any known one
+_SKIP_CHUNK = 1 << 20
+
+# Files larger than this in UTF-16 (which can't be split on b"\n") are refused
+MAX_UTF16_BYTES = 16 * 1024 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def sniff_encoding(sample):
+    """Returns the encoding of a file from its first bytes, or None for a binary file."""
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\0" in sample:
+        return None
+    try:
+        # The sample may end in the middle of a character: let the decoder wait for the rest
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    # Not UTF-8: a legacy 8-bit text encoding, unless it's full of control characters
+    controls = sum(1 for byte in sample if byte < 32 and byte not in (9, 10, 12, 13, 27))
+    if sample and controls / len(sample) > 0.1:
+        return None
+    return 'cp1252'
+
+
+class _FileState:
+    """What the reader remembers of a file: its encoding and known line start offsets."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.line_starts = {1: 0}  # line number -> byte offset of its first character
+        self.total_lines = None
+
+
+class FileReader:
+    """Reads line or byte ranges of files within a character budget.
+
+    Args:
+        cache_size: Number of recently read files whose state is kept.
+    """
+
+    def __init__(self, cache_size=16):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (path, size, mtime_ns) -> _FileState
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _state(self, path, stat):
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            state = self._cache.get(key)
+            if state is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return state
+            self.stats['misses'] += 1
+        with open(path, 'rb') as f:
+            state = _FileState(sniff_encoding(f.read(SNIFF_BYTES)))
+        with self._lock:
+            # A changed file has a new key; its stale entries age out
+            self._cache[key] = state
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return state
+
+    def read_lines(self, path, start_line=1, end_line=None, max_chars=8000):
+        """Reads lines `start_line` to `end_line` (1-based, inclusive), stopping at `max_chars`.
+
+        Returns a dict with 'text', 'first_line', 'last_line' (0 when no line was read),
+        'next_line' (the line to continue from, or None at the end of the file or range),
+        'total_lines' (None until the end of the file has been reached once), 'encoding'
+        and 'size'. Raises ValueError for binary files.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        state = self._state(path, stat)
+        if state.encoding is None:
+            raise ValueError("binary file")
+        start_line = max(1, start_line)
+        result = {'first_line': start_line, 'encoding': state.encoding, 'size': stat.st_size}
+        if stat.st_size == 0:
+            state.total_lines = 0
+            return dict(result, text="", last_line=0, next_line=None, total_lines=0)
+        if state.encoding == 'utf-16':
+            return dict(result, **self._read_utf16_lines(path, stat, state, start_line, end_line, max_chars))
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with self._lock:
+                known = max(line for line in state.line_starts if line <= start_line)
+                position = state.line_starts[known]
+            # Skip to the start line from the closest known line start: whole chunks first
+            line = known
+            while start_line - line > 1000 and position + _SKIP_CHUNK < len(data):
+                chunk = data[position:position + _SKIP_CHUNK]
+                newlines = chunk.count(b"\n")
+                if newlines >= start_line - line:
+                    break
+                position += len(chunk)
+                line += newlines
+            while line < start_line and position < len(data):
+                newline = data.find(b"\n", position)
+                position = len(data) if newline < 0 else newline + 1
+                line += 1
+            if position >= len(data):
+                state.total_lines = line - 1
+                return dict(result, text="", last_line=0, next_line=None, total_lines=line - 1)
+            with self._lock:
+                state.line_starts[line] = position
+
+            lines, used = [], 0
+            decode = codecs.getdecoder(state.encoding)
+            while position < len(data) and (end_line is None or line <= end_line):
+                newline = data.find(b"\n", position)
+                stop = len(data) if newline < 0 else newline + 1
+                # At most 4 bytes per character: never decode more of a huge line than can be shown
+                text = decode(data[position:min(stop, position + 4 * max_chars + 4)], 'replace')[0].rstrip("\r\n")
+                if used + len(text) + 1 > max_chars:
+                    if not lines:
+                        # A single line over the budget: show its beginning
+                        lines.append(text[:max_chars] + " [line truncated]")
+                        position, line = stop, line + 1
+                    break
+                lines.append(text)
+                used += len(text) + 1
+                position, line = stop, line + 1
+
+        at_end = position >= stat.st_size
+        with self._lock:
+            state.line_starts[line] = position
+            if at_end:
+                state.total_lines = line - 1
+        done = at_end or (end_line is not None and line > end_line)
+        return dict(result, text="\n".join(lines), last_line=line - 1, next_line=None if done else line,
+                    total_lines=state.total_lines)
+
+    def _read_utf16_lines(self, path, stat, state, start_line, end_line, max_chars):
+        if stat.st_size > MAX_UTF16_BYTES:
+            raise ValueError(f"UTF-16 file larger than {MAX_UTF16_BYTES // (1024 * 1024)} MB")
+        with open(path, encoding='utf-16') as f:
+            all_lines = f.read().splitlines()
+        state.total_lines = len(all_lines)
+        last = len(all_lines) if end_line is None else min(end_line, len(all_lines))
+        lines, used, line = [], 0, start_line
+        while line <= last:
+            text = all_lines[line - 1]
+            if used + len(text) + 1 > max_chars:
+                if not lines:
+                    lines.append(text[:max_chars] + " [line truncated]")
+                    line += 1
+                break
+            lines.append(text)
+            used += len(text) + 1
+            line += 1
+        return {'text': "\n".join(lines), 'last_line': line - 1 if lines else 0,
+                'next_line': line if line <= last else None, 'total_lines': state.total_lines}
+
+    def read_bytes(self, path, offset=0, length=4096):
+        """Returns up to `length` bytes of a file from `offset`, and the file size."""
+        size = os.path.getsize(path)
+        if size == 0 or offset >= size:
+            return b"", size
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data[offset:offset + length], size
+
+    def encoding(self, path):
+        """Returns the guessed encoding of a file, or None for a binary file."""
+        return self._state(os.path.abspath(path), os.stat(path)).encoding
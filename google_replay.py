@@ -0,0 +1,247 @@
+"""Record and replay of Google API traffic, for realistic offline tests and benchmarks.
+
+The googleapiclient services send every request through an httplib2-style `http`
+object. RecordingHttp wraps the real, authorized one and appends each request and
+its response to a cassette (a JSONL file per service). ReplayHttp answers from a
+cassette without network access or credentials, with the recorded payloads, so
+listing, batch and sync paths parse responses of their real size, and optionally
+with the recorded latency.
+
+Secrets and personal data are scrubbed before anything is written: request headers
+(with the OAuth token) aren't stored, token parameters are dropped from URLs, email
+addresses are replaced by pseudonyms, and message bodies ('raw' and 'data'), Gmail
+snippets, the names in address headers, subjects and the text of calendar events
+(summary, description, location, display names) by filler. Every replacement keeps
+the length of what it replaces, so replayed payloads have their original size.
+
+Set GOOGLE_API_RECORD to a folder to record while using the app normally, then
+GOOGLE_API_REPLAY to that folder to replay; GOOGLE_API_REPLAY_LATENCY scales the
+recorded latencies during replay (0, the default, replays instantly).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+import httplib2
+
+RECORD_ENV = "GOOGLE_API_RECORD"
+REPLAY_ENV = "GOOGLE_API_REPLAY"
+REPLAY_LATENCY_ENV = "GOOGLE_API_REPLAY_LATENCY"
+
+# Query parameters holding credentials, never written to a cassette
+_SECRET_PARAMS = {'access_token', 'key', 'oauth_token'}
+
+# Response headers not worth keeping: cookies, and per-response noise
+_DROPPED_HEADERS = {'set-cookie', 'date', 'expires', 'alt-svc', 'server', 'x-xss-protection',
+                    'x-frame-options', 'x-content-type-options', 'server-timing'}
+
+_EMAIL = re.compile(rb"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# JSON string values of message bodies: base64url data that may hold anything
+_BODY_FIELDS = re.compile(rb'("(?:raw|data)"\s*:\s*")([A-Za-z0-9_=+/-]*)(")')
+# JSON string values of free text: the start of a message, and what an event says and who is in it
+_TEXT_FIELDS = re.compile(rb'("(?:snippet|summary|description|location|displayName)"\s*:\s*")((?:[^"\\]|\\.)*)(")')
+# Gmail headers naming people or telling what a message is about
+_PERSONAL_HEADERS = re.compile(
+    rb'("name"\s*:\s*"(?:From|To|Cc|Bcc|Reply-To|Sender|Subject)"\s*,\s*"value"\s*:\s*")((?:[^"\\]|\\.)*)(")',
+    re.IGNORECASE)
+# Characters of a JSON string replaced by filler in header values: escaped and plain letters and digits
+_WORD_CHARACTERS = re.compile(rb"\\u[0-9a-fA-F]{4}|[A-Za-z0-9\x80-\xff]")
+# The parts of a batch request that change on every call: MIME boundaries and Content-ID bases
+_BOUNDARY = re.compile(rb"={15}[0-9]+==")
+_CONTENT_ID_BASE = re.compile(rb"<[0-9a-f-]{36} \+ ")
+_LETTERS = b"abcdefghijklmnopqrstuvwxyz"
+_DIGITS = b"0123456789"
+
+
+def _pseudonym(match):
+    """Replaces an email address by one of the same length and shape, always the same for an address.
+
+    Letters stay letters and digits stay digits, so the pseudonym still passes address validation.
+    """
+    address = match.group(0)
+    digest = hashlib.sha256(address.lower()).digest()
+    while len(digest) < len(address):
+        digest += hashlib.sha256(digest).digest()
+    return bytes(_LETTERS[digest[index] % 26] if chr(byte).isalpha() else
+                 _DIGITS[digest[index] % 10] if chr(byte).isdigit() else byte
+                 for index, byte in enumerate(address))
+
+
+def _header_filler(match):
+    """Replaces the words of a header value by filler, keeping its (already pseudonymous) addresses."""
+    value = match.group(2)
+    parts, position = [], 0
+    for address in _EMAIL.finditer(value):
+        parts += [_WORD_CHARACTERS.sub(lambda word: b"x" * len(word.group(0)), value[position:address.start()]),
+                  address.group(0)]
+        position = address.end()
+    parts.append(_WORD_CHARACTERS.sub(lambda word: b"x" * len(word.group(0)), value[position:]))
+    return match.group(1) + b"".join(parts) + match.group(3)
+
+
+def scrub(data, patterns=()):
+    """Returns `data` (bytes) with email addresses, message bodies and text, personal headers and
+    `patterns` replaced, at the same length."""
+    data = _EMAIL.sub(_pseudonym, data)
+    data = _BODY_FIELDS.sub(lambda match: match.group(1) + b"A" * len(match.group(2)) + match.group(3), data)
+    data = _TEXT_FIELDS.sub(lambda match: match.group(1) + b"x" * len(match.group(2)) + match.group(3), data)
+    data = _PERSONAL_HEADERS.sub(_header_filler, data)
+    for pattern in patterns:
+        data = pattern.sub(lambda match: b"x" * len(match.group(0)), data)
+    return data
+
+
+def request_key(method, uri, body=None, patterns=()):
+    """Returns (method, normalized URL, digest of the normalized body) identifying a request.
+
+    The URL loses its credentials and gets its query parameters sorted; batch bodies lose
+    their random boundaries and ids. Both are scrubbed, so recorded and replayed requests
+    compare equal.
+    """
+    parts = urlsplit(uri)
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name not in _SECRET_PARAMS)
+    url = f"{parts.path}?{urlencode(query)}" if query else parts.path
+    url = scrub(unquote(url).encode(), patterns).decode()
+    if body is None:
+        return method, url, ""
+    if isinstance(body, str):
+        body = body.encode()
+    body = _CONTENT_ID_BASE.sub(b"<ID + ", _BOUNDARY.sub(b"BOUNDARY", body))
+    return method, url, hashlib.sha256(scrub(body, patterns)).hexdigest()[:16]
+
+
+class Cassette:
+    """Recorded interactions of one service, in a JSONL file: one request and its response per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, interaction):
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction) + "\n")
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class RecordingHttp:
+    """Wraps an authorized http object, writing every request and its response to a cassette.
+
+    Args:
+        http: The http object doing the real requests (e.g. google_auth_httplib2.AuthorizedHttp).
+        cassette: Cassette (or its path) the interactions are appended to.
+        patterns: Extra compiled bytes regular expressions whose matches are scrubbed.
+    """
+
+    def __init__(self, http, cassette, patterns=()):
+        self.http = http
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.patterns = patterns
+
+    def __getattr__(self, name):
+        # Credentials, timeouts and the like are the wrapped object's
+        return getattr(self.http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        start = time.perf_counter()
+        response, content = self.http.request(uri, method=method, body=body, headers=headers,
+                                              redirections=redirections, connection_type=connection_type)
+        elapsed = time.perf_counter() - start
+        method, url, body_digest = request_key(method, uri, body, self.patterns)
+        stored = scrub(content if isinstance(content, bytes) else content.encode(), self.patterns)
+        try:
+            text, encoding = stored.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(stored).decode(), "base64"
+        self.cassette.append({
+            'method': method, 'url': url, 'body': body_digest, 'status': response.status,
+            'headers': {name: value for name, value in response.items()
+                        if name not in _DROPPED_HEADERS and name != 'status'},
+            'content': text, 'encoding': encoding, 'elapsed': round(elapsed, 4),
+        })
+        return response, content
+
+
+class ReplayHttp:
+    """Answers requests from a cassette, in recorded order for repeated requests.
+
+    A request is matched on its method, URL and body; failing that, on its method and URL
+    alone (bodies with random parts, e.g. MIME boundaries of attachments). When the recorded
+    answers to a request are used up, the last one is repeated, so benchmarks can loop.
+
+    Args:
+        cassette: Cassette (or its path) to replay.
+        latency: Factor applied to the recorded latency of each response (0 replays instantly).
+        patterns: The extra scrubbing patterns used when recording.
+
+    Raises:
+        LookupError: From `request`, for a request that was never recorded.
+    """
+
+    def __init__(self, cassette, latency=0.0, patterns=()):
+        cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.latency = latency
+        self.patterns = patterns
+        self._lock = threading.Lock()
+        self._exact, self._loose = {}, {}
+        for interaction in cassette.load():
+            key = (interaction['method'], interaction['url'], interaction['body'])
+            self._exact.setdefault(key, []).append(interaction)
+            self._loose.setdefault(key[:2], []).append(interaction)
+        self._served = {}  # key -> answers already given
+        self.stats = {'requests': 0, 'bytes': 0}
+
+    def _next(self, table, key):
+        answers = table.get(key)
+        if not answers:
+            return None
+        served = self._served.get(key, 0)
+        self._served[key] = served + 1
+        return answers[min(served, len(answers) - 1)]
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        key = request_key(method, uri, body, self.patterns)
+        with self._lock:
+            interaction = self._next(self._exact, key) or self._next(self._loose, key[:2])
+        if interaction is None:
+            raise LookupError(f"No recorded response for {method} {key[1]}")
+        content = interaction['content'].encode() if interaction['encoding'] == "utf-8" \
+            else base64.b64decode(interaction['content'])
+        if self.latency:
+            time.sleep(interaction['elapsed'] * self.latency)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += len(content)
+        return httplib2.Response(dict(interaction['headers'], status=str(interaction['status']))), content
+
+
+def replay_http(service_name):
+    """Returns a ReplayHttp for a service when GOOGLE_API_REPLAY is set, else None."""
+    folder = os.getenv(REPLAY_ENV)
+    if not folder:
+        return None
+    return ReplayHttp(os.path.join(folder, f"{service_name}.jsonl"),
+                      latency=float(os.getenv(REPLAY_LATENCY_ENV) or 0))
+
+
+def recording_http(service_name, credentials):
+    """Returns an authorized http object recording the traffic when GOOGLE_API_RECORD is set, else None."""
+    folder = os.getenv(RECORD_ENV)
+    if not folder:
+        return None
+    import google_auth_httplib2
+    return RecordingHttp(google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http()),
+                         os.path.join(folder, f"{service_name}.jsonl"))
@@ -0,0 +1,212 @@
+"""Streaming iCalendar (RFC 5545) parser for importing events.
+
+The file is read line by line and events are yielded one at a time, so large
+calendars (a whole semester timetable, a conference schedule) are never
+loaded into memory at once.
+"""
+
+from datetime import timedelta
+
+from dateutil.parser import isoparse
+
+_TEXT_ESCAPES = {'n': '\n', 'N': '\n', '\\': '\\', ';': ';', ',': ','}
+_DURATION_UNITS = {'W': 'weeks', 'D': 'days', 'H': 'hours', 'M': 'minutes', 'S': 'seconds'}
+MALFORMED = 'X-MALFORMED-LINE'
+
+
+def unfold_lines(stream):
+    """Yields logical content lines, joining folded continuation lines."""
+    current = None
+    for raw_line in stream:
+        line = raw_line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_content_line(line):
+    """Splits 'NAME;PARAM=value:VALUE' into (name, params, value). Quoted parameter values may contain ':' or ';'."""
+    in_quotes = False
+    for position, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:position], line[position + 1:]
+            break
+    else:
+        raise ValueError(f"Malformed iCalendar line: {line}")
+
+    parts = []
+    current = ''
+    in_quotes = False
+    for char in head:
+        if char == '"':
+            in_quotes = not in_quotes
+        if char == ';' and not in_quotes:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+
+    params = {}
+    for param in parts[1:]:
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape_text(value):
+    """Decodes TEXT escapes (\\n, \\, \\; \\,)."""
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            result.append(_TEXT_ESCAPES.get(escaped, escaped))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def iter_vevents(stream):
+    """Yields each VEVENT as a dict mapping property names to lists of (params, value).
+
+    Nested components such as VALARM are skipped. A line that can't be parsed doesn't stop the
+    stream: inside an event it is kept under MALFORMED so only that event fails, elsewhere it is ignored.
+    """
+    event = None
+    depth = 0
+    for line in unfold_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            name, params, value = parse_content_line(line)
+        except ValueError:
+            if event is not None and not depth:
+                event.setdefault(MALFORMED, []).append(({}, line))
+            continue
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and event is None:
+                event = {}
+            elif event is not None:
+                depth += 1
+        elif name == 'END':
+            if event is not None and depth:
+                depth -= 1
+            elif event is not None and value.upper() == 'VEVENT':
+                yield event
+                event = None
+        elif event is not None and not depth:
+            event.setdefault(name, []).append((params, value))
+
+
+def parse_duration(value):
+    """Parses an iCalendar DURATION such as 'PT1H30M' or 'P1D' into a timedelta."""
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-')
+    if not value.startswith('P'):
+        raise ValueError(f"Invalid DURATION: {value}")
+    amounts = {}
+    number = ''
+    for char in value[1:]:
+        if char == 'T':
+            continue
+        if char.isdigit():
+            number += char
+        elif char in _DURATION_UNITS and number:
+            amounts[_DURATION_UNITS[char]] = int(number)
+            number = ''
+        else:
+            raise ValueError(f"Invalid DURATION: {value}")
+    return sign * timedelta(**amounts)
+
+
+def parse_date_value(params, value, default_time_zone):
+    """Converts a DTSTART/DTEND value to a Google Calendar 'start'/'end' dict."""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        moment = isoparse(value)
+        return {'date': moment.strftime('%Y-%m-%d')}
+    if value.endswith('Z'):
+        moment = isoparse(value)
+        return {'dateTime': moment.strftime('%Y-%m-%dT%H:%M:%SZ'), 'timeZone': 'UTC'}
+    moment = isoparse(value)
+    return {'dateTime': moment.strftime('%Y-%m-%dT%H:%M:%S'),
+            'timeZone': params.get('TZID') or default_time_zone}
+
+
+def shift_date_value(when, delta):
+    """Returns a copy of a 'start'/'end' dict moved by `delta`."""
+    if 'date' in when:
+        return {'date': (isoparse(when['date']) + delta).strftime('%Y-%m-%d')}
+    moment = isoparse(when['dateTime'].rstrip('Z')) + delta
+    suffix = 'Z' if when['dateTime'].endswith('Z') else ''
+    return {'dateTime': moment.strftime('%Y-%m-%dT%H:%M:%S') + suffix, 'timeZone': when['timeZone']}
+
+
+def vevent_to_event(vevent, default_time_zone="UTC", normalize_rrule=None):
+    """Converts a parsed VEVENT into a Google Calendar event resource.
+
+    Args:
+        vevent: A dict yielded by iter_vevents.
+        default_time_zone: Time zone for floating (zone-less) date-times.
+        normalize_rrule: Optional callable returning (is_valid, normalized_or_error) for an RRULE value.
+
+    Raises:
+        ValueError: If the event has a malformed line, no DTSTART or an invalid RRULE.
+    """
+    def first(name):
+        values = vevent.get(name)
+        return values[0] if values else (None, None)
+
+    malformed = first(MALFORMED)[1]
+    if malformed is not None:
+        raise ValueError(f"Malformed iCalendar line: {malformed}")
+
+    start_params, start_value = first('DTSTART')
+    if start_value is None:
+        raise ValueError("event has no DTSTART")
+    start = parse_date_value(start_params, start_value, default_time_zone)
+
+    end_params, end_value = first('DTEND')
+    _, duration = first('DURATION')
+    if end_value is not None:
+        end = parse_date_value(end_params, end_value, default_time_zone)
+    elif duration is not None:
+        end = shift_date_value(start, parse_duration(duration))
+    else:
+        end = shift_date_value(start, timedelta(days=1) if 'date' in start else timedelta(0))
+
+    event = {
+        'summary': unescape_text(first('SUMMARY')[1] or ''),
+        'start': start,
+        'end': end,
+    }
+    for name, key in (('LOCATION', 'location'), ('DESCRIPTION', 'description')):
+        value = first(name)[1]
+        if value:
+            event[key] = unescape_text(value)
+    uid = first('UID')[1]
+    if uid:
+        event['iCalUID'] = uid
+
+    recurrence = []
+    for _, rrule in vevent.get('RRULE', []):
+        if normalize_rrule is not None:
+            is_valid, result = normalize_rrule(rrule)
+            if not is_valid:
+                raise ValueError(f"invalid RRULE: {result}")
+            rrule = result
+        recurrence.append(rrule if rrule.upper().startswith('RRULE:') else f"RRULE:{rrule}")
+    for name in ('EXDATE', 'RDATE'):
+        for params, value in vevent.get(name, []):
+            param_text = ''.join(f";{key}={param}" for key, param in params.items())
+            recurrence.append(f"{name}{param_text}:{value}")
+    if recurrence:
+        event['recurrence'] = recurrence
+    return event
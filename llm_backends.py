@@ -0,0 +1,108 @@
+"""Chat model backends: Ollama, or any OpenAI-compatible server (llama.cpp, vLLM, ...).
+
+All models share one pooled HTTP transport, so connections to the inference
+server stay open between calls (no TCP setup per LLM round trip), concurrent
+calls reuse a bounded pool, and every request has connect/read timeouts
+instead of waiting forever on a stuck server.
+
+Configuration (see ai_chatbot.py): LLM_BACKEND ("ollama" or "openai"),
+LLM_BASE_URL, LLM_API_KEY, LLM_MAX_CONNECTIONS and LLM_TIMEOUT.
+"""
+
+import threading
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_ollama import ChatOllama
+from langchain_openai import ChatOpenAI
+
+BACKENDS = ("ollama", "openai")
+
+DEFAULT_BASE_URLS = {
+    'ollama': "http://localhost:11434",
+    'openai': "http://localhost:8080/v1",  # llama.cpp server; vLLM listens on :8000/v1
+}
+
+# Sampling settings shared by every backend
+SAMPLING = {'temperature': 0, 'top_p': 0.7}
+
+_transport_lock = threading.Lock()
+_transport = None
+_openai_client = None
+
+
+def http_timeout(read=300.0):
+    """Request timeouts: fail fast when the server is down, allow long generations (`read` seconds)."""
+    return httpx.Timeout(connect=5.0, read=read, write=30.0, pool=read)
+
+
+def shared_transport(max_connections=8):
+    """Returns the process-wide pooled HTTP transport used by every chat model.
+
+    Connections are kept alive for a minute between calls; at most `max_connections`
+    are open at once, further concurrent requests wait for a free one. The pool size
+    is fixed by the first call.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = httpx.HTTPTransport(limits=httpx.Limits(max_connections=max_connections,
+                                                                 max_keepalive_connections=max_connections,
+                                                                 keepalive_expiry=60.0))
+        return _transport
+
+
+def _shared_openai_client(timeout):
+    global _openai_client
+    transport = shared_transport()
+    with _transport_lock:
+        if _openai_client is None:
+            _openai_client = httpx.Client(transport=transport, timeout=timeout)
+        return _openai_client
+
+
+def close_http_clients():
+    """Closes the shared transport and its connections (e.g. at exit, or between benchmarks)."""
+    global _transport, _openai_client
+    with _transport_lock:
+        transport, _transport, _openai_client = _transport, None, None
+    if transport is not None:
+        transport.close()
+
+
+def make_chat_model(model, backend="ollama", base_url=None, api_key=None, timeout=300.0, max_connections=8):
+    """Returns the chat model for a model name; chat model instances are returned as they are.
+
+    Args:
+        model: Model name on the server (e.g. "qwen3:8b" for Ollama), or a chat model instance.
+        backend: "ollama", or "openai" for OpenAI-compatible servers such as llama.cpp or vLLM,
+            which batch concurrent requests together.
+        base_url: Server URL, see DEFAULT_BASE_URLS.
+        api_key: API key for OpenAI-compatible servers; local servers usually ignore it.
+        timeout: Seconds to wait for the server's reply before giving up.
+        max_connections: Size of the shared connection pool.
+    """
+    if isinstance(model, BaseChatModel):
+        return model
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of: {', '.join(BACKENDS)}. Got: {backend}")
+    base_url = base_url or DEFAULT_BASE_URLS[backend]
+    transport = shared_transport(max_connections)
+
+    if backend == "openai":
+        return ChatOpenAI(
+            model=model,
+            base_url=base_url,
+            api_key=api_key or "not-needed",
+            http_client=_shared_openai_client(http_timeout(timeout)),
+            max_retries=1,
+            **SAMPLING,
+        )
+    return ChatOllama(
+        model=model,
+        base_url=base_url,
+        top_k=40,            # Limit to top 40 tokens: reduces computation
+        # The Ollama client builds its own httpx client; sharing the transport shares the pool
+        sync_client_kwargs={'transport': transport, 'timeout': http_timeout(timeout)},
+        **SAMPLING,          # top_p: nucleus sampling, lower = faster & more focused
+    )
@@ -0,0 +1,184 @@
+"""Load test: how many simultaneous conversations one agent process serves before latency collapses.
+
+Starts the local mock Ollama server (mock_llm_server.py) streaming replies at a
+set token rate after a set think time, then runs N concurrent sessions through one
+Agent, each a conversation of a few turns with a pause between them, for growing N.
+For each N it reports the time to the first token of the answer (p50/p95/p99), the
+turn latency, the throughput in turns and tokens per second, and the process RSS.
+
+Every turn goes through the real Ollama HTTP client and its shared connection pool,
+the agent loop and, for turns asking the time, a real tool call.
+
+Usage:
+    python load_test.py [--sessions 1,2,4,8,16,32] [--turns 4] [--token-rate 50] [--think-time 0.2]
+                        [--parallel 4] [--pause 0.5] [--max-connections 8] [--slo-ttft 2.0]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import threading
+import time
+
+from langchain.messages import AIMessageChunk
+
+from agent import Agent
+from llm_backends import close_http_clients, make_chat_model
+from mock_llm_server import MockLLMServer
+from tools import TimeTools
+from utils import percentile
+
+# User turns each session cycles through; those mentioning the time make the model call a tool
+PROMPTS = [
+    "Hi! Can you help me plan my day?",
+    "What time is it?",
+    "Give me three tips to stay focused this afternoon.",
+    "What time is it now? I need to leave soon.",
+]
+
+
+def make_reply(answer_tokens):
+    """Reply function of the mock server: a tool call for time questions, else an answer of `answer_tokens` words."""
+    words = [f"word{index}" for index in range(answer_tokens)]
+
+    def reply(messages):
+        last = messages[-1] if messages else {}
+        if last.get('role') != 'tool' and 'time' in str(last.get('content', '')).lower():
+            return {'tool_calls': [('get_current_time', {})]}
+        return {'content': " ".join(words)}
+    return reply
+
+
+def current_rss():
+    """Resident set size of this process in bytes (the peak where the current value isn't available,
+    0 where neither is, e.g. on Windows)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_turn(agent, prompt, thread_id):
+    """Streams one turn; returns (seconds to the first answer token, turn seconds, answer tokens)."""
+    start = time.perf_counter()
+    first_token, tokens = None, 0
+    for message, _ in agent.stream_invoke(prompt, thread_id):
+        if isinstance(message, AIMessageChunk) and message.content:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            tokens += 1
+    seconds = time.perf_counter() - start
+    return (seconds if first_token is None else first_token), seconds, tokens
+
+
+def run_level(agent, sessions, turns, pause, seed=0):
+    """Runs `sessions` concurrent conversations of `turns` turns each; returns the level's measurements."""
+    ttfts, latencies, errors = [], [], []
+    tokens = 0
+    lock = threading.Lock()
+
+    def session(index):
+        nonlocal tokens
+        rng = random.Random(seed * 1000 + index)
+        # Users don't all press enter at the same instant
+        time.sleep(rng.uniform(0, pause))
+        for turn in range(turns):
+            try:
+                ttft, seconds, count = run_turn(agent, PROMPTS[(index + turn) % len(PROMPTS)],
+                                                f"load-{sessions}-{index}")
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+                continue
+            with lock:
+                ttfts.append(ttft)
+                latencies.append(seconds)
+                tokens += count
+            if turn < turns - 1:
+                time.sleep(rng.expovariate(1 / pause) if pause else 0)
+
+    threads = [threading.Thread(target=session, args=(index,), name=f"session-{index}") for index in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    gc.collect()
+    return {
+        'sessions': sessions, 'turns': len(latencies), 'errors': len(errors),
+        'ttft': [percentile(ttfts, q) for q in (50, 95, 99)],
+        'latency': [percentile(latencies, q) for q in (50, 95, 99)],
+        'turns_per_second': len(latencies) / wall, 'tokens_per_second': tokens / wall,
+        'rss': current_rss(), 'first_error': repr(errors[0]) if errors else None,
+    }
+
+
+def print_level(result):
+    ttft = "/".join(f"{value * 1000:.0f}" for value in result['ttft'])
+    latency = "/".join(f"{value * 1000:.0f}" for value in result['latency'])
+    print(f"{result['sessions']:>8}  {ttft:>20}  {latency:>20}  {result['turns_per_second']:>7.2f}  "
+          f"{result['tokens_per_second']:>8.0f}  {result['rss'] / 1e6:>7.0f}"
+          + (f"  {result['errors']} errors, first: {result['first_error']}" if result['errors'] else ""))
+
+
+def run_load_test(levels, turns=4, token_rate=50.0, think_time=0.2, parallel=4, pause=0.5,
+                  answer_tokens=40, max_connections=8, report=print_level):
+    """Runs every level of concurrent sessions against a fresh mock server; returns their measurements."""
+    results = []
+    with MockLLMServer(reply=make_reply(answer_tokens), first_token_latency=think_time,
+                       token_latency=1 / token_rate, parallel=parallel) as server:
+        model = make_chat_model("qwen3:8b", base_url=server.url, max_connections=max_connections)
+        for sessions in levels:
+            # A fresh agent per level, so earlier conversations don't weigh on later levels
+            agent = Agent(model, TimeTools().get_tools(), "You are a helpful assistant.", reasoning="off",
+                          warm_up=False)
+            try:
+                result = run_level(agent, sessions, turns, pause)
+            finally:
+                agent.close()
+            results.append(result)
+            report(result)
+    close_http_clients()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test against a local mock Ollama server.")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="comma-separated session counts to run")
+    parser.add_argument("--turns", type=int, default=4, help="turns per session (default 4)")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="tokens per second per reply (default 50)")
+    parser.add_argument("--think-time", type=float, default=0.2,
+                        help="seconds the server takes before a reply's first token (default 0.2)")
+    parser.add_argument("--parallel", type=int, default=4,
+                        help="replies the server generates at once, like OLLAMA_NUM_PARALLEL (default 4)")
+    parser.add_argument("--pause", type=float, default=0.5, help="mean seconds a user waits between turns (default 0.5)")
+    parser.add_argument("--answer-tokens", type=int, default=40, help="tokens per answer (default 40)")
+    parser.add_argument("--max-connections", type=int, default=8,
+                        help="size of the client's connection pool, as in the app (default 8)")
+    parser.add_argument("--slo-ttft", type=float, default=2.0,
+                        help="p95 time to first token, in seconds, a level must stay under (default 2.0)")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.sessions.split(",")]
+
+    print(f"Mock Ollama: {args.token_rate:.0f} tokens/s, {args.think_time * 1000:.0f} ms think time, "
+          f"{args.parallel} parallel replies; {args.turns} turns per session, {args.pause:.1f} s mean pause")
+    print(f"{'sessions':>8}  {'TTFT p50/95/99 ms':>20}  {'turn p50/95/99 ms':>20}  {'turns/s':>7}  "
+          f"{'tokens/s':>8}  {'RSS MB':>7}")
+    results = run_load_test(levels, args.turns, args.token_rate, args.think_time, args.parallel, args.pause,
+                            args.answer_tokens, args.max_connections)
+    within = [result['sessions'] for result in results
+              if result['ttft'][1] <= args.slo_ttft and not result['errors']]
+    if within:
+        print(f"Most concurrent sessions with p95 TTFT under {args.slo_ttft:.1f} s: {max(within)}")
+    else:
+        print(f"No level kept p95 TTFT under {args.slo_ttft:.1f} s")
@@ -0,0 +1,273 @@
+"""Local HTTP server mimicking the Ollama and OpenAI-compatible chat APIs.
+
+Used by the tests and benchmarks to exercise the real HTTP clients of each
+backend without a model: it serves Ollama's `/api/chat` (NDJSON streaming) and
+the OpenAI `/v1/chat/completions` endpoint (server-sent events) served by
+llama.cpp, vLLM and others, with scripted replies and simulated latency.
+
+Run it on its own with `python mock_llm_server.py [port]`.
+"""
+
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_reply(messages):
+    """Default reply: answers tool results, and asks for the time when the user mentions it."""
+    last = messages[-1] if messages else {}
+    if last.get('role') == 'tool':
+        return {'content': f"Here is what I found: {last.get('content', '')}"}
+    if 'time' in str(last.get('content', '')).lower():
+        return {'tool_calls': [('get_current_time', {})]}
+    return {'content': "Hello! How can I help you today?"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so clients can keep the connection open between requests
+    protocol_version = "HTTP/1.1"
+    # Small writes (headers, then each token) must not wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': self.server.model_name}]})
+        elif self.path == '/v1/models':
+            self._send_json({'object': 'list', 'data': [{'id': self.server.model_name, 'object': 'model'}]})
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        if self.path == '/api/chat':
+            self._ollama_chat(self._read_json())
+        elif self.path == '/v1/chat/completions':
+            self._openai_chat(self._read_json())
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def _ollama_chat(self, request):
+        tokens, tool_calls, prefill = self.server.generate(request)
+        model = request.get('model', self.server.model_name)
+        ollama_calls = [{'function': {'name': name, 'arguments': args}} for name, args in tool_calls]
+
+        def message(content, calls=None):
+            payload = {'role': 'assistant', 'content': content}
+            if calls:
+                payload['tool_calls'] = calls
+            return payload
+        final = {'model': model, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ'), 'done': True,
+                 'done_reason': 'stop', 'prompt_eval_count': 0, 'eval_count': len(tokens)}
+
+        if not request.get('stream', True):
+            with self.server.slot():
+                self.server.wait_tokens(tokens, prefill)
+            self._send_json(dict(final, message=message("".join(tokens), ollama_calls)))
+            return
+
+        self._start_chunked('application/x-ndjson')
+        with self.server.slot():
+            for token in self.server.stream_tokens(tokens, prefill):
+                self._write_chunk(json.dumps({'model': model, 'created_at': final['created_at'],
+                                              'message': message(token), 'done': False}).encode() + b"\n")
+        self._write_chunk(json.dumps(dict(final, message=message("", ollama_calls))).encode() + b"\n")
+        self._write_chunk(b"")
+
+    def _openai_chat(self, request):
+        tokens, tool_calls, prefill = self.server.generate(request)
+        model = request.get('model', self.server.model_name)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        openai_calls = [{'id': f"call_{index}", 'type': 'function',
+                         'function': {'name': name, 'arguments': json.dumps(args)}}
+                        for index, (name, args) in enumerate(tool_calls)]
+        finish_reason = 'tool_calls' if tool_calls else 'stop'
+
+        if not request.get('stream'):
+            with self.server.slot():
+                self.server.wait_tokens(tokens, prefill)
+            message = {'role': 'assistant', 'content': "".join(tokens) or None}
+            if openai_calls:
+                message['tool_calls'] = openai_calls
+            self._send_json({'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()),
+                             'model': model, 'choices': [{'index': 0, 'message': message,
+                                                          'finish_reason': finish_reason}],
+                             'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens),
+                                       'total_tokens': len(tokens)}})
+            return
+
+        def event(delta, finish=None):
+            payload = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                       'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        self._start_chunked('text/event-stream')
+        self._write_chunk(event({'role': 'assistant', 'content': ""}))
+        with self.server.slot():
+            for token in self.server.stream_tokens(tokens, prefill):
+                self._write_chunk(event({'content': token}))
+        if openai_calls:
+            self._write_chunk(event({'tool_calls': [dict(call, index=index)
+                                                    for index, call in enumerate(openai_calls)]}))
+        self._write_chunk(event({}, finish_reason))
+        # The end of the body goes out with [DONE]: clients stop reading there
+        data = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Chat server answering both APIs from a reply function.
+
+    Args:
+        reply: Callable taking the request's messages (dicts with 'role' and 'content') and
+            returning {'content': str} or {'tool_calls': [(tool name, args), ...]}.
+        port: Port to listen on (0 picks a free one).
+        first_token_latency: Seconds before the first token.
+        prompt_latency_per_char: Seconds to evaluate each prompt character. Only the part of the
+            prompt that differs from the previous request is evaluated, like a KV cache reusing
+            a shared prefix.
+        load_latency: Seconds to load the model on the first request, and again once it was
+            unloaded after `keep_alive` idle seconds (the request's Ollama `keep_alive`, 300 by default).
+        token_latency: Seconds between tokens.
+        parallel: Number of requests generated at once; the others queue, like Ollama with
+            OLLAMA_NUM_PARALLEL or llama.cpp with --parallel. None for no limit.
+        model_name: Model name reported by the server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, reply=echo_reply, port=0, first_token_latency=0.0, token_latency=0.0,
+                 parallel=None, model_name="qwen3:8b", prompt_latency_per_char=0.0, load_latency=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.reply = reply
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.prompt_latency_per_char = prompt_latency_per_char
+        self.load_latency = load_latency
+        self.model_name = model_name
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._lock = threading.Lock()
+        self.stats = {'connections': 0, 'requests': 0, 'loads': 0}
+        self._model_lock = threading.Lock()
+        self._loaded_until = 0.0
+        self._cached_prompt = ""
+        self.last_request = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def generate(self, request):
+        """Returns the reply's tokens, its tool calls and the prompt evaluation time of a chat request."""
+        self.count('requests')
+        self.last_request = request
+        prompt = json.dumps([request.get('tools'), request.get('messages')])
+        keep_alive = request.get('keep_alive')
+        keep_alive = 300 if keep_alive is None else float(keep_alive)
+        with self._model_lock:
+            if time.monotonic() > self._loaded_until:
+                self.count('loads')
+                time.sleep(self.load_latency)
+                self._cached_prompt = ""
+            shared = 0
+            for cached, new in zip(self._cached_prompt, prompt):
+                if cached != new:
+                    break
+                shared += 1
+            self._cached_prompt = prompt
+            prefill = self.prompt_latency_per_char * (len(prompt) - shared)
+            self._loaded_until = time.monotonic() + keep_alive
+        reply = self.reply(request.get('messages', []))
+        content = reply.get('content') or ""
+        tokens = [word if position == 0 else " " + word for position, word in enumerate(content.split(" "))] \
+            if content else []
+        return tokens, list(reply.get('tool_calls') or []), prefill
+
+    def slot(self):
+        """Context manager holding one of the server's generation slots."""
+        return self._slots if self._slots is not None else _NO_SLOT
+
+    def stream_tokens(self, tokens, prefill=0.0):
+        time.sleep(self.first_token_latency + prefill)
+        for position, token in enumerate(tokens):
+            if position:
+                time.sleep(self.token_latency)
+            yield token
+
+    def wait_tokens(self, tokens, prefill=0.0):
+        for _ in self.stream_tokens(tokens, prefill):
+            pass
+
+    def start(self):
+        """Serves in a background thread and returns the server."""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _NoSlot:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SLOT = _NoSlot()
+
+
+if __name__ == "__main__":
+    server = MockLLMServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 11435,
+                           first_token_latency=0.2, token_latency=0.02)
+    print(f"Mock LLM server on {server.url} (Ollama /api/chat, OpenAI /v1/chat/completions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,208 @@
+"""Durable outbox for outgoing emails.
+
+Messages are stored in a SQLite database before delivery and drained by a
+background worker thread, so a send never blocks the agent turn and a
+transient Gmail failure doesn't lose the email. Pending messages survive
+process restarts and are picked up again when the outbox is reopened.
+"""
+
+import sqlite3
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    subject TEXT,
+    raw TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    message_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+"""
+
+
+def is_permanent_error(error):
+    """Returns True for errors that retrying won't fix (4xx except 408/429)."""
+    if isinstance(error, HttpError):
+        status = getattr(error.resp, "status", None)
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            return False
+        return 400 <= status < 500 and status not in (408, 429)
+    return False
+
+
+class Outbox:
+    """SQLite-backed queue of raw (base64url) Gmail messages with a retrying worker.
+
+    Args:
+        db_path: Path of the SQLite database file.
+        send_func: Callable taking the raw message and returning the Gmail message id.
+        max_attempts: Number of delivery attempts before a message is marked failed.
+        base_delay: Delay in seconds before the first retry, doubled on every attempt.
+        max_delay: Upper bound for the retry delay in seconds.
+    """
+
+    def __init__(self, db_path, send_func, max_attempts=5, base_delay=2.0, max_delay=300.0):
+        self.db_path = db_path
+        self.send_func = send_func
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            # A message left in 'sending' was interrupted by a crash or shutdown:
+            # deliver it again (at-least-once delivery).
+            self._conn.execute("UPDATE outbox SET status = ? WHERE status = ?", (PENDING, SENDING))
+
+    def enqueue(self, recipient, subject, raw):
+        """Stores a message for delivery and returns its queue id."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (recipient, subject, raw, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (recipient, subject, raw, PENDING, now, now, now),
+            )
+        self._wake.set()
+        return cursor.lastrowid
+
+    def status(self, queue_id):
+        """Returns the delivery state of a queued message as a dict, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, recipient, subject, status, attempts, last_error, message_id, created_at, updated_at "
+                "FROM outbox WHERE id = ?",
+                (queue_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit=10):
+        """Returns the delivery state of the most recently queued messages."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, recipient, subject, status, attempts, last_error, message_id, created_at, updated_at "
+                "FROM outbox ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_count(self):
+        """Returns the number of messages not yet delivered or failed."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchone()[0]
+
+    def start(self):
+        """Starts the background delivery worker (idempotent)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=None):
+        """Stops the background worker. Undelivered messages stay queued on disk."""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def wait_until_idle(self, timeout=None):
+        """Blocks until nothing is due for delivery. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending_count():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=5.0):
+        """Gives the worker up to `timeout` seconds to drain, then stops it and closes the database."""
+        if self._worker is not None and self._worker.is_alive():
+            self.wait_until_idle(timeout)
+        self.stop(timeout)
+        with self._lock:
+            self._conn.close()
+
+    def _claim_next(self):
+        """Atomically marks the next due message as 'sending' and returns it."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, raw, attempts FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (SENDING, now, row["id"]),
+            )
+        return row["id"], row["raw"], row["attempts"] + 1
+
+    def _seconds_until_due(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _deliver(self, queue_id, raw, attempts):
+        try:
+            message_id = self.send_func(raw)
+        except Exception as error:
+            now = time.time()
+            if attempts >= self.max_attempts or is_permanent_error(error):
+                status, next_attempt = FAILED, now
+            else:
+                delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+                status, next_attempt = PENDING, now + delay
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (status, next_attempt, str(error), now, queue_id),
+                )
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, message_id = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (SENT, message_id, time.time(), queue_id),
+            )
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._claim_next()
+            if item is not None:
+                self._deliver(*item)
+                continue
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
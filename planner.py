@@ -0,0 +1,263 @@
+"""Plan-then-execute support for the agent.
+
+Instead of one LLM round trip per tool call, the model writes the whole plan
+at once as a small DAG of tool calls. Steps refer to the results of earlier
+steps with `$<step id>` (any other `$...`, such as "$100", is plain text), e.g.
+
+    {"steps": [
+        {"id": "s1", "tool": "get_events_on_date", "args": {"date": "2026-01-21"}},
+        {"id": "s2", "tool": "send_message",
+         "args": {"to": "alice@example.com", "subject": "Tomorrow", "body": "My events:\\n$s1"}}
+    ]}
+
+The executor runs every step as soon as the steps it depends on are done, so
+independent calls run in parallel. A final generation then writes the answer.
+"""
+
+import json
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from langchain.agents.middleware import ToolCallRequest
+from langchain.messages import ToolMessage
+
+PLAN_INSTRUCTIONS = """
+PLANNING MODE: Do not answer yet. Write a plan of tool calls that gathers or does everything needed for
+the user's request, as a single JSON object and nothing else:
+{"steps": [{"id": "s1", "tool": "<tool name>", "args": {<arguments>}}, ...]}
+- Use only the tools listed below, with their exact argument names.
+- To use the result of an earlier step inside an argument, write $<step id> (e.g. "body": "Events:\\n$s1").
+  Steps run in parallel unless they reference each other; add "after": ["s1"] to a step that must wait
+  for another one without using its result.
+- Do not add steps that depend on results you can't predict (e.g. an event ID that a listing will return);
+  stop the plan before them, they can be done in the next turn.
+- Emails are never sent from a plan: use draft_message, and send it in a later turn once the user confirms.
+- If no tool is needed, return {"steps": [], "answer": "<your answer to the user>"}.
+
+AVAILABLE TOOLS:
+"""
+
+# Prompt for the final generation, which turns the plan's results into the answer
+ANSWER_INSTRUCTIONS = ("The tool calls for the user's last message have been run. Their results are below. "
+                       "Write the answer for the user based on them; do not describe the plan.\n\n")
+
+# Tools left out of plans: they need the user's confirmation first, which the tool loop asks for
+UNPLANNED_TOOLS = {'send_message', 'send_message_with_attachment'}
+
+_REFERENCE_PATTERN = re.compile(r"\$(\w+)")
+_THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+class PlanError(ValueError):
+    """Raised when the model's plan can't be parsed or is not a valid DAG."""
+
+
+def describe_tools(tools):
+    """Returns one line per tool: its name, arguments and the first line of its description."""
+    lines = []
+    for tool in tools:
+        args = ", ".join(f"{name}: {schema.get('type', 'any')}" + ("" if 'default' not in schema else " (optional)")
+                         for name, schema in tool.args.items())
+        description = tool.description.strip().splitlines()[0] if tool.description else ""
+        lines.append(f"- {tool.name}({args}): {description}")
+    return "\n".join(lines)
+
+
+def _references(value, ids):
+    """Returns the step ids among `ids` referenced anywhere in an argument value."""
+    if isinstance(value, str):
+        return set(_REFERENCE_PATTERN.findall(value)) & ids
+    if isinstance(value, dict):
+        return set().union(*(_references(item, ids) for item in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(_references(item, ids) for item in value)) if value else set()
+    return set()
+
+
+def substitute(value, results):
+    """Replaces $<step id> references in an argument value with the results of those steps."""
+    if isinstance(value, str):
+        whole = _REFERENCE_PATTERN.fullmatch(value)
+        if whole and whole.group(1) in results:
+            return results[whole.group(1)]
+        return _REFERENCE_PATTERN.sub(lambda match: str(results.get(match.group(1), match.group(0))), value)
+    if isinstance(value, dict):
+        return {key: substitute(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, results) for item in value]
+    return value
+
+
+def parse_plan(text, tool_names, max_steps=12):
+    """Parses and validates the model's plan.
+
+    Returns:
+        Tuple of (steps, answer). Each step is a dict with 'id', 'tool', 'args' and 'deps'
+        (the ids it waits for); answer is the direct answer of a plan without steps, or None.
+
+    Raises:
+        PlanError: If the text holds no JSON plan, names unknown tools or steps, or has a cycle.
+    """
+    text = _THINK_PATTERN.sub("", text)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise PlanError("the plan is not a JSON object")
+    try:
+        plan = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as error:
+        raise PlanError(f"the plan is not valid JSON: {error}")
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps", []), list):
+        raise PlanError("the plan must be an object with a 'steps' list")
+
+    raw_steps = plan.get("steps", [])
+    if len(raw_steps) > max_steps:
+        raise PlanError(f"the plan has {len(raw_steps)} steps, the limit is {max_steps}")
+
+    steps = []
+    ids = set()
+    for position, raw in enumerate(raw_steps):
+        if not isinstance(raw, dict):
+            raise PlanError(f"step {position + 1} is not an object")
+        step_id = str(raw.get("id") or f"s{position + 1}")
+        if not re.fullmatch(r"\w+", step_id) or step_id in ids:
+            raise PlanError(f"step id '{step_id}' is invalid or repeated")
+        if raw.get("tool") not in tool_names:
+            raise PlanError(f"step {step_id} uses unknown tool '{raw.get('tool')}'")
+        args = raw.get("args") or {}
+        if not isinstance(args, dict):
+            raise PlanError(f"the args of step {step_id} must be an object")
+        ids.add(step_id)
+        steps.append({"id": step_id, "tool": raw["tool"], "args": args, "deps": set(raw.get("after") or [])})
+
+    # Only declared step ids are references, so "$100" in an email body stays text
+    for step in steps:
+        step["deps"] |= _references(step["args"], ids)
+
+    for step in steps:
+        unknown = step["deps"] - ids
+        if unknown:
+            raise PlanError(f"step {step['id']} refers to unknown steps: {', '.join(sorted(unknown))}")
+
+    # Kahn's algorithm: every step must become ready at some point
+    remaining = {step["id"]: set(step["deps"]) for step in steps}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        if not ready:
+            raise PlanError(f"the plan has a dependency cycle between: {', '.join(sorted(remaining))}")
+        for step_id in ready:
+            del remaining[step_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    answer = plan.get("answer") if not steps else None
+    return steps, answer if isinstance(answer, str) else None
+
+
+class PlanExecutor:
+    """Runs a validated plan with as much parallelism as its dependencies allow.
+
+    Tools tagged with the same `metadata['service']` (e.g. all Calendar tools, which share
+    one Google API client that isn't thread-safe) run one at a time.
+
+    Args:
+        tools: The agent's tools.
+        max_workers: Maximum number of steps running at once.
+        cached_result: Optional callable (tool_name, args) returning a ready result or None,
+            e.g. Prefetcher.take.
+        middleware: `wrap_tool_call` middleware every step goes through, outermost first, as in
+            the agent's tool loop. A ToolMessage with status 'error' fails the step.
+    """
+
+    def __init__(self, tools, max_workers=4, cached_result=None, middleware=()):
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_workers = max_workers
+        self.cached_result = cached_result
+        self.middleware = list(middleware)
+        self._service_locks = {}
+        for tool in tools:
+            service = (tool.metadata or {}).get('service')
+            if service:
+                self._service_locks.setdefault(service, threading.Lock())
+
+    def service_lock(self, tool_name):
+        """Returns the lock of the service a tool uses, or None when the tool can run concurrently."""
+        tool = self.tools.get(tool_name)
+        return self._service_locks.get((tool.metadata or {}).get('service')) if tool is not None else None
+
+    def _run_step(self, step, args):
+        tool = self.tools[step["tool"]]
+        if self.cached_result is not None:
+            result = self.cached_result(step["tool"], args)
+            if result is not None:
+                return result
+        lock = self.service_lock(step["tool"])
+
+        def execute(request):
+            if lock is None:
+                content = str(tool.invoke(request.tool_call["args"]))
+            else:
+                with lock:
+                    content = str(tool.invoke(request.tool_call["args"]))
+            return ToolMessage(content=content, tool_call_id=request.tool_call["id"], name=tool.name)
+
+        handler = execute
+        for middleware in reversed(self.middleware):
+            handler = partial(middleware.wrap_tool_call, handler=handler)
+        call = {"name": step["tool"], "args": args, "id": step["id"], "type": "tool_call"}
+        message = handler(ToolCallRequest(tool_call=call, tool=tool, state=None, runtime=None))
+        if getattr(message, "status", None) == "error":
+            raise RuntimeError(message.content)
+        return str(message.content)
+
+    def run(self, steps):
+        """Runs the steps and returns their outcomes in plan order.
+
+        Each outcome is the step dict with the resolved 'args', a 'status' ('ok', 'error'
+        or 'skipped', the latter when a step it depends on failed) and a 'result' string.
+        """
+        outcomes = {step["id"]: dict(step, status=None, result=None) for step in steps}
+        results = {}
+        waiting = list(steps)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="plan") as executor:
+            while waiting or running:
+                for step in list(waiting):
+                    deps = [outcomes[dep] for dep in step["deps"]]
+                    if any(dep["status"] in ("error", "skipped") for dep in deps):
+                        outcome = outcomes[step["id"]]
+                        outcome["status"] = "skipped"
+                        failed = [dep["id"] for dep in deps if dep["status"] in ("error", "skipped")]
+                        outcome["result"] = f"Not run because step {', '.join(failed)} failed."
+                        waiting.remove(step)
+                    elif all(dep["status"] == "ok" for dep in deps):
+                        args = substitute(step["args"], results)
+                        outcomes[step["id"]]["args"] = args
+                        running[executor.submit(self._run_step, step, args)] = step
+                        waiting.remove(step)
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    outcome = outcomes[step["id"]]
+                    try:
+                        outcome["result"] = results[step["id"]] = future.result()
+                        outcome["status"] = "ok"
+                    except Exception as error:
+                        outcome["result"] = str(error)
+                        outcome["status"] = "error"
+
+        return [outcomes[step["id"]] for step in steps]
+
+
+def format_results(outcomes):
+    """Formats step outcomes for the final answer prompt."""
+    blocks = []
+    for outcome in outcomes:
+        args = json.dumps(outcome["args"], ensure_ascii=False)
+        blocks.append(f"[{outcome['id']}] {outcome['tool']}({args}) -> {outcome['status']}:\n{outcome['result']}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,204 @@
+"""Speculative prefetching of read-only tool results.
+
+While the model is still generating its first tool call, the user input is
+classified with a few keyword rules and the read-only calls it will most
+likely need (today's events, the latest emails, ...) are started in the
+background. When the model then calls one of those tools with compatible
+arguments, the prefetched result is served instead of calling Google again.
+
+Rules that keep guessing wrong are suspended, so wasted API calls stay capped.
+"""
+
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents.middleware import wrap_tool_call
+from langchain.messages import ToolMessage
+
+from utils import resolve_relative_date
+
+# Each rule maps keywords found in the user input to a read-only tool call.
+# `limit_arg` names a count argument: a prefetch fetched with a larger count also
+# answers smaller requests, by keeping the first lines of its one-item-per-line output.
+DEFAULT_RULES = [
+    {'name': 'emails', 'keywords': ('email', 'mail', 'inbox', 'unread'),
+     'tool': 'get_latest_emails', 'args': lambda: {'count': 10}, 'limit_arg': 'count'},
+    {'name': 'tomorrow', 'keywords': ('tomorrow',),
+     'tool': 'get_events_on_date', 'args': lambda: {'date': resolve_relative_date('tomorrow')}},
+    {'name': 'today', 'keywords': ('today', 'tonight'),
+     'tool': 'get_events_on_date', 'args': lambda: {'date': resolve_relative_date('today')}},
+    {'name': 'upcoming', 'keywords': ('meeting', 'calendar', 'agenda', 'upcoming', 'schedule', 'appointment', 'busy'),
+     'tool': 'get_upcoming_events', 'args': lambda: {'max_results': 10}, 'limit_arg': 'max_results'},
+]
+
+# Tools that never change calendar or mailbox data; any other tool call makes pending prefetches stale
+READ_ONLY_TOOLS = {
+    'get_current_time', 'get_upcoming_events', 'get_events_on_date', 'get_events_in_range',
+    'find_free_slots', 'preview_recurrence', 'get_latest_emails', 'get_outbox_status', 'show_folder_contents',
+    'find_files', 'read_file_content', 'search_file_contents', 'search_documents', 'disk_usage',
+}
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+class Prefetcher:
+    """Starts likely read-only tool calls in the background at the beginning of a turn.
+
+    Args:
+        tools: The agent's tools; rules whose tool is missing are ignored.
+        rules: Keyword rules, see DEFAULT_RULES.
+        max_per_turn: Maximum number of calls started per turn.
+        max_waste_ratio: A rule is suspended when more than this share of its recent prefetches went unused.
+        window: Number of recent outcomes per rule used to compute its waste ratio.
+        probe_every: A suspended rule still fires once every `probe_every` matching turns to re-check itself.
+        result_timeout: Seconds to wait for an in-flight prefetch before calling the tool directly.
+    """
+
+    def __init__(self, tools, rules=None, max_per_turn=2, max_waste_ratio=0.5, window=8,
+                 probe_every=5, result_timeout=30.0):
+        self.tools = {tool.name: tool for tool in tools}
+        self.rules = [rule for rule in (rules or DEFAULT_RULES) if rule['tool'] in self.tools]
+        self.prefetchable = {rule['tool'] for rule in self.rules}
+        self.max_per_turn = max_per_turn
+        self.max_waste_ratio = max_waste_ratio
+        self.probe_every = probe_every
+        self.result_timeout = result_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_per_turn, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = []  # (rule, args, future) started this turn and not used yet
+        self._outcomes = {rule['name']: deque(maxlen=window) for rule in self.rules}
+        self._skipped = {rule['name']: 0 for rule in self.rules}
+        self._stats = {'turns': 0, 'issued': 0, 'hits': 0, 'wasted': 0, 'misses': 0, 'suspended': 0}
+
+    # Turn lifecycle
+
+    def classify(self, user_input):
+        """Returns the rules matching the user input, at most one per tool call."""
+        words = _WORD_PATTERN.findall(user_input.lower())
+        matched = []
+        for rule in self.rules:
+            if any(word.startswith(keyword) for keyword in rule['keywords'] for word in words):
+                if all(other['tool'] != rule['tool'] for other in matched):
+                    matched.append(rule)
+        return matched
+
+    def _is_suspended(self, rule):
+        outcomes = self._outcomes[rule['name']]
+        if len(outcomes) < outcomes.maxlen:
+            return False
+        waste_ratio = outcomes.count(False) / len(outcomes)
+        if waste_ratio <= self.max_waste_ratio:
+            return False
+        self._skipped[rule['name']] += 1
+        if self._skipped[rule['name']] >= self.probe_every:
+            self._skipped[rule['name']] = 0
+            return False
+        return True
+
+    def start(self, user_input):
+        """Starts the prefetches for a new turn. Leftovers of the previous turn are discarded first."""
+        self.finish()
+        with self._lock:
+            self._stats['turns'] += 1
+            for rule in self.classify(user_input)[:self.max_per_turn]:
+                if self._is_suspended(rule):
+                    self._stats['suspended'] += 1
+                    continue
+                args = rule['args']()
+                future = self._executor.submit(self.tools[rule['tool']].invoke, args)
+                self._pending.append((rule, args, future))
+                self._stats['issued'] += 1
+
+    def finish(self):
+        """Ends the turn: prefetches the model never asked for are counted as wasted."""
+        with self._lock:
+            self._discard_pending()
+
+    def _discard_pending(self):
+        for rule, _, future in self._pending:
+            future.cancel()
+            self._outcomes[rule['name']].append(False)
+            self._stats['wasted'] += 1
+        self._pending = []
+
+    def _wait_in_flight(self):
+        # Google API clients aren't thread-safe: let running prefetches finish before any other tool call
+        for _, _, future in self._pending:
+            try:
+                future.result(timeout=self.result_timeout)
+            except Exception:
+                pass
+
+    # Serving tool calls
+
+    def _compatible(self, rule, prefetched_args, requested_args):
+        limit_arg = rule.get('limit_arg')
+        if limit_arg is None:
+            return prefetched_args == requested_args
+        others_match = ({key: value for key, value in prefetched_args.items() if key != limit_arg} ==
+                        {key: value for key, value in requested_args.items() if key != limit_arg})
+        requested_limit = requested_args.get(limit_arg)
+        return (others_match and isinstance(requested_limit, int) and
+                0 < requested_limit <= prefetched_args[limit_arg])
+
+    def take(self, tool_name, args):
+        """Returns the prefetched result for a tool call, or None if the tool must be called.
+
+        A call to a tool outside READ_ONLY_TOOLS (e.g. one creating an event) discards the
+        pending prefetches, since their results may no longer be current.
+        """
+        with self._lock:
+            self._wait_in_flight()
+            if tool_name not in self.prefetchable:
+                if tool_name not in READ_ONLY_TOOLS:
+                    self._discard_pending()
+                return None
+
+            for entry in self._pending:
+                rule, prefetched_args, future = entry
+                if rule['tool'] == tool_name and self._compatible(rule, prefetched_args, args):
+                    self._pending.remove(entry)
+                    try:
+                        result = future.result(timeout=self.result_timeout)
+                    except Exception:
+                        result = None
+                    if not isinstance(result, str) or result.startswith("An error occurred"):
+                        self._outcomes[rule['name']].append(False)
+                        self._stats['wasted'] += 1
+                        return None
+                    self._outcomes[rule['name']].append(True)
+                    self._stats['hits'] += 1
+                    limit_arg = rule.get('limit_arg')
+                    if limit_arg and args[limit_arg] < prefetched_args[limit_arg]:
+                        result = "\n".join(result.splitlines()[:args[limit_arg]])
+                    return result
+
+            self._stats['misses'] += 1
+            return None
+
+    def middleware(self):
+        """Returns the agent middleware that answers tool calls from the prefetched results."""
+        @wrap_tool_call
+        def serve_prefetched(request, handler):
+            tool_call = request.tool_call
+            result = self.take(tool_call['name'], tool_call.get('args') or {})
+            if result is None:
+                return handler(request)
+            return ToolMessage(content=result, tool_call_id=tool_call['id'], name=tool_call['name'])
+        return serve_prefetched
+
+    # Metrics
+
+    def stats(self):
+        """Returns the prefetch counters and the hit rate (share of prefetches that were used)."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hit_rate'] = stats['hits'] / stats['issued'] if stats['issued'] else 0.0
+        return stats
+
+    def close(self):
+        self.finish()
+        self._executor.shutdown(wait=False, cancel_futures=True)
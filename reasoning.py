@@ -0,0 +1,196 @@
+"""Control of qwen3's thinking tokens.
+
+Modes:
+    "on": the model's default behavior (thinking is printed inline in <think> tags).
+    "off": thinking disabled on every call.
+    "fast": thinking disabled for simple turns (chit-chat, picking a single tool) and
+        kept, within the budget, for complex ones.
+    "separate": thinking enabled but kept out of the answer text; the chatbot streams
+        it to a separate channel (see Agent.get_reasoning_token).
+
+With a budget, a call whose thinking grows past `budget` tokens is stopped and
+redone with thinking disabled, so reasoning can never stall a turn for long.
+Reasoning tokens and the time spent on them are counted per turn, in every mode
+(inline <think> blocks included).
+"""
+
+import logging
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain.agents.middleware import wrap_model_call
+from langchain.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from routing import classify_turn
+
+REASONING_MODES = ("on", "off", "fast", "separate")
+
+
+def reasoning_kwargs(model, reasoning):
+    """Returns the call arguments setting a model's thinking on or off; {} for the model default.
+
+    Ollama takes a `reasoning` flag; OpenAI-compatible servers (llama.cpp, vLLM) take qwen3's
+    `enable_thinking` chat template switch.
+    """
+    if reasoning is None:
+        return {}
+    if isinstance(model, ChatOpenAI):
+        return {'extra_body': {'chat_template_kwargs': {'enable_thinking': reasoning}}}
+    if 'reasoning' in type(model).model_fields:
+        return {'reasoning': reasoning}
+    return {}
+
+
+class ReasoningBudgetExceeded(Exception):
+    """Raised from the token callback to stop a call that thinks for too long."""
+
+
+class _BudgetLogFilter(logging.Filter):
+    """Drops LangChain's warning about a callback error when the error is the budget stopping a call.
+
+    The callback manager logs every exception raised by a handler before re-raising it, even
+    with `raise_error`; this one is expected and handled.
+    """
+
+    def filter(self, record):
+        return not any(isinstance(arg, ReasoningBudgetExceeded) or 'ReasoningBudgetExceeded' in str(arg)
+                       for arg in record.args or ())
+
+
+logging.getLogger('langchain_core.callbacks.manager').addFilter(_BudgetLogFilter())
+
+
+class _ReasoningMeter(BaseCallbackHandler):
+    """Counts the reasoning and answer chunks of one model call as they stream.
+
+    Thinking comes either in its own field (reasoning_content) or, with the model's default
+    setting, inline in the answer text between <think> tags; both count as reasoning.
+    """
+
+    raise_error = True
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.reasoning_tokens = 0
+        self.answer_tokens = 0
+        self.started = time.perf_counter()
+        self.reasoning_seconds = 0.0
+        self._inline_thinking = False
+
+    def on_llm_new_token(self, token, *, chunk=None, **kwargs):
+        # Some models report each chunk twice, once without the chunk itself: count only the full reports
+        message = getattr(chunk, 'message', None)
+        if message is None:
+            return
+        if message.additional_kwargs.get('reasoning_content'):
+            self.reasoning_tokens += 1
+            self.reasoning_seconds = time.perf_counter() - self.started
+            if self.budget is not None and self.reasoning_tokens > self.budget and not self.answer_tokens:
+                raise ReasoningBudgetExceeded(f"thinking exceeded {self.budget} tokens")
+        elif token:
+            if not self.answer_tokens and '<think>' in token:
+                self._inline_thinking = True
+            if self._inline_thinking:
+                self.reasoning_tokens += 1
+                self.reasoning_seconds = time.perf_counter() - self.started
+                self._inline_thinking = '</think>' not in token
+            else:
+                self.answer_tokens += 1
+
+
+class ReasoningController:
+    """Chooses the reasoning setting of every model call and measures reasoning cost.
+
+    Args:
+        mode: One of REASONING_MODES.
+        budget: Maximum thinking tokens per model call (None for no limit).
+        classify: Callable returning ('simple' | 'complex', reason) for the user's message.
+    """
+
+    def __init__(self, mode="on", budget=None, classify=classify_turn):
+        if mode not in REASONING_MODES:
+            raise ValueError(f"reasoning mode must be one of: {', '.join(REASONING_MODES)}. Got: {mode}")
+        self.mode = mode
+        self.budget = budget
+        self.classify = classify
+        self._lock = threading.Lock()
+        self._turn = self._empty_metrics()
+        self._totals = self._empty_metrics()
+
+    @staticmethod
+    def _empty_metrics():
+        return {'model_calls': 0, 'reasoning_tokens': 0, 'answer_tokens': 0,
+                'reasoning_seconds': 0.0, 'budget_exceeded': 0}
+
+    def reasoning_for(self, messages):
+        """Returns the `reasoning` value for a model call: None (model default), True or False."""
+        if self.mode == "on":
+            return None
+        if self.mode == "off":
+            return False
+        if self.mode == "separate":
+            return True
+        last_human = next((message for message in reversed(messages) if isinstance(message, HumanMessage)), None)
+        if last_human is None:
+            return True
+        kind, _ = self.classify(str(last_human.content))
+        return kind == 'complex'
+
+    def _record(self, meter, budget_exceeded=False):
+        with self._lock:
+            for metrics in (self._turn, self._totals):
+                metrics['model_calls'] += 1
+                metrics['reasoning_tokens'] += meter.reasoning_tokens
+                metrics['answer_tokens'] += meter.answer_tokens
+                metrics['reasoning_seconds'] += meter.reasoning_seconds
+                metrics['budget_exceeded'] += int(budget_exceeded)
+
+    def _call(self, request, handler, reasoning, budget):
+        meter = _ReasoningMeter(budget)
+        model = request.model
+        # The meter rides on a copy of the model, so concurrent calls don't share it
+        model = model.model_copy(update={'callbacks': list(model.callbacks or []) + [meter]})
+        settings = dict(request.model_settings, **reasoning_kwargs(model, reasoning))
+        try:
+            response = handler(request.override(model=model, model_settings=settings))
+        except ReasoningBudgetExceeded:
+            self._record(meter, budget_exceeded=True)
+            raise
+        self._record(meter)
+        return response
+
+    def middleware(self):
+        """Returns the agent middleware applying the reasoning setting to every model call."""
+        @wrap_model_call
+        def control_reasoning(request, handler):
+            reasoning = self.reasoning_for(request.messages)
+            # The budget needs thinking in its own field to count it (reasoning=True)
+            budget = self.budget if reasoning else None
+            try:
+                return self._call(request, handler, reasoning, budget)
+            except ReasoningBudgetExceeded:
+                # Answer straight away instead of thinking any longer
+                return self._call(request, handler, False, None)
+        return control_reasoning
+
+    def call_kwargs(self, model, messages):
+        """Keyword arguments applying the reasoning setting to a direct model call (e.g. plan mode)."""
+        return reasoning_kwargs(model, self.reasoning_for(messages))
+
+    # Metrics
+
+    def start_turn(self):
+        with self._lock:
+            self._turn = self._empty_metrics()
+
+    def turn_metrics(self):
+        """Returns the reasoning metrics of the current (or last) turn."""
+        with self._lock:
+            return dict(self._turn)
+
+    def stats(self):
+        """Returns the reasoning metrics summed over all turns."""
+        with self._lock:
+            return dict(self._totals)
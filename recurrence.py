@@ -0,0 +1,196 @@
+"""RRULE validation and expansion built on dateutil.rrule.
+
+Rules are validated part by part, compiled once and cached, and their
+occurrences are generated lazily, so previewing a rule or checking it for
+conflicts never materializes more dates than needed.
+"""
+
+import re
+from datetime import datetime, time as dt_time
+from functools import lru_cache
+from itertools import islice, takewhile
+
+from dateutil import tz
+from dateutil.rrule import rrulestr
+
+VALID_FREQ = ['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY']
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+_BYDAY_PATTERN = re.compile(r'^([+-]?)(\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+_UNTIL_PATTERN = re.compile(r'^\d{8}(T\d{6}Z?)?$')
+
+# Allowed range of each numeric list part (zero is never allowed where negatives are)
+_NUMERIC_PARTS = {
+    'BYMONTHDAY': (-31, 31, False),
+    'BYYEARDAY': (-366, 366, False),
+    'BYWEEKNO': (-53, 53, False),
+    'BYMONTH': (1, 12, True),
+    'BYHOUR': (0, 23, True),
+    'BYMINUTE': (0, 59, True),
+    'BYSECOND': (0, 60, True),
+    'BYSETPOS': (-366, 366, False),
+}
+
+
+def _parse_int_list(name, value, low, high, zero_allowed):
+    numbers = []
+    for item in value.split(','):
+        if not re.fullmatch(r'[+-]?\d+', item):
+            raise ValueError(f"{name} must be a comma-separated list of integers. Got: {value}")
+        number = int(item)
+        if not low <= number <= high or (number == 0 and not zero_allowed):
+            raise ValueError(f"{name} values must be between {low} and {high}" +
+                             ("" if zero_allowed else " (not 0)") + f". Got: {item}")
+        numbers.append(number)
+    return numbers
+
+
+def parse_until(value, zone):
+    """Parses an UNTIL value. Date-only values include the whole day in `zone`."""
+    if len(value) == 8:
+        day = datetime.strptime(value, '%Y%m%d')
+        return datetime.combine(day.date(), dt_time(23, 59, 59), tzinfo=zone)
+    if value.endswith('Z'):
+        return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=tz.tzutc())
+    return datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=zone)
+
+
+class RecurrenceEngine:
+    """Validates, compiles and expands RRULEs.
+
+    Args:
+        cache_size: Number of compiled (rule, start) pairs kept in memory.
+    """
+
+    def __init__(self, cache_size=256):
+        self._compile = lru_cache(maxsize=cache_size)(self._compile_uncached)
+
+    def validate(self, rrule):
+        """Strictly validates an RRULE and normalizes it for the Google Calendar API.
+
+        Every part is checked: known names only, no duplicates, value ranges, BYDAY
+        syntax, COUNT and UNTIL not combined. WKST is dropped because it can cause
+        API errors. An 'RRULE:' prefix is kept if present.
+
+        Returns:
+            Tuple of (is_valid, normalized_rrule_or_error_message)
+        """
+        if not rrule:
+            return False, "RRULE cannot be empty"
+
+        rrule = rrule.strip()
+        prefix = ''
+        body = rrule
+        if body.upper().startswith('RRULE:'):
+            prefix, body = body[:6], body[6:]
+
+        parts = {}
+        order = []
+        for part in body.rstrip(';').split(';'):
+            name, separator, value = part.partition('=')
+            name = name.strip().upper()
+            value = value.strip().upper()
+            if not name:
+                continue
+            if not separator or not value:
+                return False, f"RRULE part '{part}' must be NAME=VALUE"
+            if name in parts:
+                return False, f"RRULE part {name} appears more than once"
+            parts[name] = value
+            order.append(name)
+
+        if 'FREQ' not in parts:
+            return False, f"RRULE must contain FREQ parameter. Got: {rrule}"
+        if parts['FREQ'] not in VALID_FREQ:
+            return False, f"RRULE FREQ must be one of: {', '.join(VALID_FREQ)}"
+
+        try:
+            self._validate_parts(parts)
+        except ValueError as error:
+            return False, str(error)
+
+        normalized = ';'.join(f"{name}={parts[name]}" for name in order if name != 'WKST')
+        return True, prefix + normalized
+
+    def _validate_parts(self, parts):
+        freq = parts['FREQ']
+        for name, value in parts.items():
+            if name in ('FREQ', 'WKST'):
+                if name == 'WKST' and value not in WEEKDAYS:
+                    raise ValueError(f"WKST must be one of {', '.join(WEEKDAYS)}. Got: {value}")
+            elif name in ('INTERVAL', 'COUNT'):
+                if not value.isdigit() or int(value) < 1:
+                    raise ValueError(f"{name} must be a positive integer. Got: {value}")
+            elif name == 'UNTIL':
+                if not _UNTIL_PATTERN.match(value):
+                    raise ValueError(f"UNTIL must be YYYYMMDD or YYYYMMDDTHHMMSSZ. Got: {value}")
+                try:
+                    parse_until(value, tz.tzutc())
+                except ValueError:
+                    raise ValueError(f"UNTIL is not a valid date. Got: {value}")
+            elif name == 'BYDAY':
+                for day in value.split(','):
+                    match = _BYDAY_PATTERN.match(day)
+                    if not match:
+                        raise ValueError(f"BYDAY must list days like MO,TU or 1MO,-1FR. Got: {day}")
+                    if match.group(2):
+                        if freq not in ('MONTHLY', 'YEARLY'):
+                            raise ValueError(f"BYDAY with an ordinal ({day}) needs FREQ=MONTHLY or YEARLY")
+                        if not 1 <= int(match.group(2)) <= 53:
+                            raise ValueError(f"BYDAY ordinal must be between 1 and 53. Got: {day}")
+            elif name in _NUMERIC_PARTS:
+                _parse_int_list(name, value, *_NUMERIC_PARTS[name])
+            else:
+                raise ValueError(f"Unsupported RRULE part: {name}")
+
+        if 'COUNT' in parts and 'UNTIL' in parts:
+            raise ValueError("RRULE cannot contain both COUNT and UNTIL")
+        if 'BYWEEKNO' in parts and freq != 'YEARLY':
+            raise ValueError("BYWEEKNO is only allowed with FREQ=YEARLY")
+        if 'BYYEARDAY' in parts and freq in ('DAILY', 'WEEKLY', 'MONTHLY'):
+            raise ValueError("BYYEARDAY is only allowed with FREQ=YEARLY")
+        if 'BYMONTHDAY' in parts and freq == 'WEEKLY':
+            raise ValueError("BYMONTHDAY is not allowed with FREQ=WEEKLY")
+        if 'BYSETPOS' in parts and not any(name.startswith('BY') and name != 'BYSETPOS' for name in parts):
+            raise ValueError("BYSETPOS needs another BYxxx part")
+
+    def _compile_uncached(self, rrule, dtstart):
+        is_valid, result = self.validate(rrule)
+        if not is_valid:
+            raise ValueError(result)
+        body = result[6:] if result.upper().startswith('RRULE:') else result
+        parts = [part for part in body.split(';') if part and not part.upper().startswith('UNTIL=')]
+        until = next((part.split('=', 1)[1] for part in body.split(';') if part.upper().startswith('UNTIL=')), None)
+        rule = rrulestr(';'.join(parts), dtstart=dtstart)
+        if until:
+            # dateutil requires UNTIL to match DTSTART's awareness: resolve it in the event's zone
+            rule = rule.replace(until=parse_until(until, dtstart.tzinfo))
+        return rule
+
+    def compile(self, rrule, dtstart):
+        """Returns a cached dateutil rrule for a rule and a timezone-aware start.
+
+        Raises:
+            ValueError: If the rule is invalid (invalid rules are not cached).
+        """
+        return self._compile(rrule, dtstart)
+
+    def occurrences(self, rrule, dtstart, window_start=None, window_end=None, limit=None):
+        """Lazily yields occurrence starts of a rule, optionally limited to [window_start, window_end].
+
+        Args:
+            rrule: The RRULE string.
+            dtstart: Timezone-aware start of the first occurrence.
+            window_start, window_end: Optional aware datetimes bounding the occurrences.
+            limit: Optional maximum number of occurrences.
+        """
+        rule = self.compile(rrule, dtstart)
+        iterator = rule.xafter(window_start, inc=True) if window_start is not None else iter(rule)
+        if window_end is not None:
+            # Occurrences come in order, so stop at the first one past the window (rules may be infinite)
+            iterator = takewhile(lambda occurrence: occurrence <= window_end, iterator)
+        return islice(iterator, limit) if limit is not None else iterator
+
+    def cache_info(self):
+        return self._compile.cache_info()
+
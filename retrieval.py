@@ -0,0 +1,353 @@
+"""Offline retrieval over the user's text documents, for the search_documents tool.
+
+Text files under the configured roots are split into overlapping chunks of a
+few hundred words, and every chunk is embedded on the CPU with a hashing
+vectorizer: each word is hashed to one of `dim` buckets, counts are damped
+(log(1 + tf)) and the vector is L2-normalized. There is no vocabulary or model
+to train or download, and a chunk's vector depends only on its own text, so
+files can be added and removed one at a time.
+
+Vectors live in a float32 matrix memory-mapped from disk, one row per chunk;
+the text and location of each chunk are in SQLite. A query is embedded the
+same way, weighted by the inverse document frequency of its buckets (kept
+up to date as chunks come and go), and scored against every row with one
+matrix-vector product per block of rows; the top k come from argpartition,
+without sorting all the scores.
+
+The index is refreshed incrementally: only files whose size or mtime changed
+are re-chunked, and the rows of deleted or changed files are recycled.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+from file_reader import SNIFF_BYTES, sniff_encoding
+from utils import SKIPPED_DIRS, walk_parallel
+
+# Files read as text documents
+TEXT_EXTENSIONS = ('.txt', '.md', '.markdown', '.rst', '.org', '.tex', '.csv', '.tsv', '.log', '.json', '.yaml',
+                   '.yml', '.ini', '.cfg', '.html', '.htm', '.xml', '.eml', '.py', '.js', '.ts', '.java', '.c',
+                   '.h', '.cpp', '.go', '.rs', '.sh', '.sql')
+
+# Larger files are skipped (datasets, dumps)
+MAX_DOCUMENT_BYTES = 4 * 1024 * 1024
+
+# Rows scored per matrix-vector product, to bound the temporary score arrays
+SEARCH_BLOCK_ROWS = 65536
+
+_WORD = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks(path);
+CREATE TABLE IF NOT EXISTS free_rows (
+    row INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def chunk_text(text, chunk_chars=1200, overlap_chars=200):
+    """Splits text into chunks of about `chunk_chars`, cut at whitespace, overlapping by `overlap_chars`.
+
+    Returns (line number of the chunk's start, chunk text) pairs.
+    """
+    chunks = []
+    start, line, length = 0, 1, len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            cut = text.rfind(" ", start + chunk_chars // 2, end)
+            cut = max(cut, text.rfind("\n", start + chunk_chars // 2, end))
+            end = cut + 1 if cut > 0 else end
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append((line, chunk))
+        if end >= length:
+            break
+        following = max(end - overlap_chars, start + 1)
+        following = text.find(" ", following, end) + 1 or following
+        line += text.count("\n", start, following)
+        start = following
+    return chunks
+
+
+class HashingEmbedder:
+    """Embeds text as damped, normalized counts of hashed words.
+
+    Args:
+        dim: Number of hash buckets, i.e. the vector size.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self._buckets = {}  # word -> bucket, memoized: hashing is the slow part
+
+    def buckets(self, text):
+        """Returns the bucket of every word of the text, as an int array."""
+        memo = self._buckets
+        result = []
+        for word in _WORD.findall(text.lower()):
+            bucket = memo.get(word)
+            if bucket is None:
+                # crc32, not hash(): string hashes change between processes
+                bucket = zlib.crc32(word.encode()) % self.dim
+                if len(memo) < 1_000_000:
+                    memo[word] = bucket
+            result.append(bucket)
+        return np.array(result, dtype=np.int64)
+
+    def embed(self, text, weights=None):
+        """Returns the float32 unit vector of a text (all zeros for a text without words)."""
+        counts = np.bincount(self.buckets(text), minlength=self.dim).astype(np.float32)
+        vector = np.log1p(counts)
+        if weights is not None:
+            vector *= weights
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class DocumentIndex:
+    """Chunks and vectors of the text documents under a set of root folders.
+
+    Args:
+        directory: Folder holding the index files (created if needed).
+        roots: Folders whose documents are indexed.
+        dim: Vector size of the hashing embedder.
+        refresh_interval: Seconds between refreshes once started.
+        extensions: File extensions read as text.
+        skip: Directory names never descended into.
+    """
+
+    def __init__(self, directory, roots, dim=512, refresh_interval=300.0, extensions=TEXT_EXTENSIONS,
+                 skip=SKIPPED_DIRS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        self.refresh_interval = refresh_interval
+        self.extensions = tuple(extensions)
+        self.skip = skip
+        self.embedder = HashingEmbedder(dim)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.db"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        stored_dim = self._meta('dim')
+        if stored_dim is not None and int(stored_dim) != dim:
+            raise ValueError(f"the index at {directory} has {stored_dim} dimensions, not {dim}")
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._df_path = os.path.join(directory, "document_frequency.npy")
+        row = self._conn.execute("SELECT MAX(row) FROM chunks").fetchone()[0]
+        free = self._conn.execute("SELECT MAX(row) FROM free_rows").fetchone()[0]
+        self._rows = max(-1 if row is None else row, -1 if free is None else free) + 1  # rows in use or free
+        self._vectors = None
+        self._open_vectors(max(self._rows, 1024))
+        self._df = np.load(self._df_path) if os.path.exists(self._df_path) else np.zeros(dim, dtype=np.float64)
+        self._chunk_count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+        self._stop = threading.Event()
+        self._thread = None
+        self.building = False
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _open_vectors(self, capacity):
+        """Maps the vector file with room for `capacity` rows, growing the file if needed."""
+        size = capacity * self.embedder.dim * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        if self._vectors is not None:
+            self._vectors.flush()
+        capacity = os.path.getsize(self._vectors_path) // (self.embedder.dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.embedder.dim))
+
+    # Updating
+
+    def _take_rows(self, count):
+        """Returns `count` rows for new chunks: recycled ones first, then new ones at the end."""
+        rows = [row for row, in self._conn.execute("SELECT row FROM free_rows LIMIT ?", (count,))]
+        if rows:
+            self._conn.executemany("DELETE FROM free_rows WHERE row = ?", [(row,) for row in rows])
+        while len(rows) < count:
+            rows.append(self._rows)
+            self._rows += 1
+        if self._rows > len(self._vectors):
+            self._open_vectors(max(self._rows, 2 * len(self._vectors)))
+        return rows
+
+    def _drop_document(self, path):
+        """Frees the rows of a document's chunks; call within a transaction holding the lock."""
+        rows = [row for row, in self._conn.execute("SELECT row FROM chunks WHERE path = ?", (path,))]
+        if rows:
+            vectors = self._vectors[rows]
+            self._df -= (vectors > 0).sum(axis=0)
+            self._vectors[rows] = 0
+            self._conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+            self._conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(row,) for row in rows])
+            self._chunk_count -= len(rows)
+        self._conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+    def _read_document(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read(MAX_DOCUMENT_BYTES + 1)
+        except OSError:
+            return None
+        if len(data) > MAX_DOCUMENT_BYTES:
+            return None
+        encoding = sniff_encoding(data[:SNIFF_BYTES])
+        return data.decode(encoding, errors="replace") if encoding else None
+
+    def add_document(self, path, size, mtime):
+        """Chunks, embeds and stores one document, replacing its previous chunks."""
+        text = self._read_document(path)
+        chunks = chunk_text(text) if text else []
+        vectors = np.array([self.embedder.embed(chunk) for _, chunk in chunks], dtype=np.float32)
+        with self._lock, self._conn:
+            self._drop_document(path)
+            if chunks:
+                rows = self._take_rows(len(chunks))
+                self._vectors[rows] = vectors
+                self._df += (vectors > 0).sum(axis=0)
+                self._conn.executemany("INSERT INTO chunks (row, path, line, text) VALUES (?, ?, ?, ?)",
+                                       [(row, path, line, chunk) for row, (line, chunk) in zip(rows, chunks)])
+                self._chunk_count += len(chunks)
+            # Stored even without chunks, so unreadable files aren't retried until they change
+            self._conn.execute("INSERT INTO documents (path, size, mtime) VALUES (?, ?, ?)", (path, size, mtime))
+
+    def refresh(self):
+        """Indexes new and changed documents and drops deleted ones.
+
+        Returns:
+            Dict with the number of documents 'added', 'updated' and 'removed'.
+        """
+        self.building = True
+        try:
+            with self._lock:
+                known = {path: (size, mtime) for path, size, mtime in
+                         self._conn.execute("SELECT path, size, mtime FROM documents")}
+            stats = {'added': 0, 'updated': 0, 'removed': 0}
+            seen = set()
+            for _, entries in walk_parallel(self.roots, skip=self.skip):
+                for path, name, is_dir, size, mtime in entries:
+                    if is_dir or not name.lower().endswith(self.extensions):
+                        continue
+                    seen.add(path)
+                    if known.get(path) == (size, mtime):
+                        continue
+                    stats['updated' if path in known else 'added'] += 1
+                    self.add_document(path, size, mtime)
+                    if self._stop.is_set():
+                        return stats
+            with self._lock, self._conn:
+                for path in set(known) - seen:
+                    self._drop_document(path)
+                    stats['removed'] += 1
+            self.flush()
+            return stats
+        finally:
+            self.building = False
+
+    def flush(self):
+        """Writes the vectors and document frequencies to disk."""
+        with self._lock:
+            self._vectors.flush()
+            np.save(self._df_path, self._df)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as error:
+                print(f"Document index refresh failed: {error}")
+            if self._stop.wait(self.refresh_interval):
+                return
+
+    def start(self):
+        """Refreshes the index now and then every `refresh_interval` seconds, in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="document-index", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    # Searching
+
+    def count(self):
+        """Number of indexed chunks."""
+        return self._chunk_count
+
+    def search(self, query, k=5, candidates=50):
+        """Returns the `k` chunks most similar to the query, best first.
+
+        The vectors select the `candidates` best chunks; these are then re-ranked by how much of
+        the query (weighted by inverse document frequency) they actually contain, which undoes
+        the false matches of hash collisions. Chunks containing no query word are left out.
+
+        Returns:
+            List of (score, path, line, text) tuples.
+        """
+        words = set(_WORD.findall(query.lower()))
+        with self._lock:
+            documents = max(self._chunk_count, 1)
+            idf = np.log((documents + 1) / (self._df + 1)).astype(np.float32) + 1
+            vector = self.embedder.embed(query, idf)
+            if not vector.any() or self._rows == 0:
+                return []
+            candidates = max(k, candidates)
+            best_scores, best_rows = [], []
+            for start in range(0, self._rows, SEARCH_BLOCK_ROWS):
+                scores = self._vectors[start:min(start + SEARCH_BLOCK_ROWS, self._rows)] @ vector
+                top = np.argpartition(scores, -candidates)[-candidates:] if len(scores) > candidates \
+                    else np.arange(len(scores))
+                best_scores.append(scores[top])
+                best_rows.append(top + start)
+            scores, rows = np.concatenate(best_scores), np.concatenate(best_rows)
+            order = np.argsort(-scores)[:candidates]
+            similarity = {int(rows[i]): float(scores[i]) for i in order if scores[i] > 0}
+            if not similarity:
+                return []
+            chunks = self._conn.execute(
+                f"SELECT row, path, line, text FROM chunks WHERE row IN ({','.join('?' * len(similarity))})",
+                list(similarity)).fetchall()
+
+        weights = {word: float(idf[self.embedder.buckets(word)[0]]) for word in words}
+        total = sum(weights.values())
+        results = []
+        for row, path, line, text in chunks:
+            chunk_words = set(_WORD.findall(text.lower()))
+            coverage = sum(weight for word, weight in weights.items() if word in chunk_words) / total
+            if coverage > 0:
+                results.append((similarity[row] * coverage, path, line, text))
+        results.sort(key=lambda result: -result[0])
+        return results[:k]
@@ -0,0 +1,140 @@
+"""Model cascade: simple turns go to a small fast model, complex ones to the large model.
+
+Each model call of the agent is routed by a cheap heuristic classification of
+the user's last message. When the small model's reply looks unreliable (an
+unparseable or unknown tool call, an empty reply) the same call is repeated
+with the next tier, before any tool runs, so escalation has no side effects.
+"""
+
+import re
+import threading
+import time
+from functools import lru_cache
+
+from langchain.agents.middleware import wrap_model_call
+from langchain.messages import AIMessage, HumanMessage, ToolMessage
+
+# Words hinting at each tool domain; a request touching several domains is multi-step
+DOMAIN_KEYWORDS = {
+    'calendar': ('calendar', 'event', 'meeting', 'appointment', 'schedule', 'busy', 'free', 'agenda'),
+    'mail': ('email', 'mail', 'inbox', 'send', 'reply', 'message'),
+    'files': ('file', 'folder', 'directory', 'document', 'open', 'delete', 'remove'),
+}
+# Phrases that chain several actions or need careful argument building (recurrence rules)
+COMPLEX_PATTERNS = re.compile(
+    r"\b(then|after that|afterwards|and also|as well as|every|each|weekly|monthly|daily|recurring|"
+    r"unless|except|if)\b")
+_WORD_PATTERN = re.compile(r"[a-z']+")
+
+
+@lru_cache(maxsize=1024)
+def classify_turn(user_input, max_simple_words=30):
+    """Returns ('simple' or 'complex', reason) for a user message.
+
+    Greetings, thanks and single-domain requests are simple. Chained or conditional
+    requests, recurring events, requests touching several domains and long messages
+    are complex.
+    """
+    text = user_input.lower()
+    words = _WORD_PATTERN.findall(text)
+    if len(words) > max_simple_words:
+        return 'complex', 'long message'
+    match = COMPLEX_PATTERNS.search(text)
+    if match:
+        return 'complex', f"'{match.group(0)}'"
+    domains = [domain for domain, keywords in DOMAIN_KEYWORDS.items()
+               if any(word.startswith(keyword) for keyword in keywords for word in words)]
+    if len(domains) > 1:
+        return 'complex', f"several domains ({', '.join(domains)})"
+    return 'simple', domains[0] if domains else 'chit-chat'
+
+
+class ModelRouter:
+    """Routes each model call of the agent to a tier of models, small to large.
+
+    Args:
+        tiers: List of (name, chat model) pairs, from the smallest to the largest model.
+            Simple turns start at the first tier, complex ones at the last.
+        classify: Callable returning ('simple' | 'complex', reason) for the user's message.
+    """
+
+    def __init__(self, tiers, classify=classify_turn):
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one tier")
+        self.tiers = list(tiers)
+        self.classify = classify
+        self._lock = threading.Lock()
+        self._latencies = {name: [] for name, _ in self.tiers}
+        self._stats = {'calls': 0, 'escalations': 0, 'simple': 0, 'complex': 0}
+
+    @property
+    def default_model(self):
+        """The largest model, used by the agent when no routing applies."""
+        return self.tiers[-1][1]
+
+    def start_tier(self, messages):
+        """Returns the index of the first tier to try for a model call."""
+        last_human = next((message for message in reversed(messages) if isinstance(message, HumanMessage)), None)
+        if last_human is None:
+            return len(self.tiers) - 1
+        # A failed tool call needs the large model to recover
+        if messages and isinstance(messages[-1], ToolMessage) and \
+                str(messages[-1].content).startswith("An error occurred"):
+            return len(self.tiers) - 1
+        kind, _ = self.classify(str(last_human.content))
+        # Turns are counted on their first model call, the one answering the user's message
+        if messages[-1] is last_human:
+            with self._lock:
+                self._stats[kind] += 1
+        return 0 if kind == 'simple' else len(self.tiers) - 1
+
+    def needs_escalation(self, message, tool_names):
+        """Returns True when a reply looks unreliable and should be redone by a larger model."""
+        if not isinstance(message, AIMessage):
+            return False
+        if message.invalid_tool_calls:
+            return True
+        if any(call['name'] not in tool_names for call in message.tool_calls):
+            return True
+        return not message.tool_calls and not str(message.content).strip()
+
+    def _timed_call(self, tier, request, handler):
+        name, model = self.tiers[tier]
+        start = time.perf_counter()
+        response = handler(request.override(model=model))
+        with self._lock:
+            self._latencies[name].append(time.perf_counter() - start)
+            self._stats['calls'] += 1
+        return response
+
+    def middleware(self):
+        """Returns the agent middleware that picks the model of every call."""
+        @wrap_model_call
+        def route_model(request, handler):
+            tier = self.start_tier(request.messages)
+            tool_names = {tool.name if hasattr(tool, 'name') else tool.get('name') for tool in request.tools}
+            response = self._timed_call(tier, request, handler)
+            while tier < len(self.tiers) - 1 and \
+                    any(self.needs_escalation(message, tool_names) for message in response.result):
+                tier += 1
+                with self._lock:
+                    self._stats['escalations'] += 1
+                response = self._timed_call(tier, request, handler)
+            return response
+        return route_model
+
+    def stats(self):
+        """Returns the counts of model calls, escalations and simple and complex turns, the escalation
+        rate (escalations per call to a tier below the last) and per-tier latency (mean and p95, in seconds)."""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = {name: sorted(values) for name, values in self._latencies.items()}
+        escalable_calls = sum(len(latencies[name]) for name, _ in self.tiers[:-1])
+        stats['escalation_rate'] = stats['escalations'] / escalable_calls if escalable_calls else 0.0
+        stats['tiers'] = {
+            name: {'calls': len(values),
+                   'mean': sum(values) / len(values) if values else 0.0,
+                   'p95': values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0}
+            for name, values in latencies.items()
+        }
+        return stats
@@ -0,0 +1,98 @@
+"""Busy-interval index used to find free time slots and scheduling conflicts."""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time as dt_time, timedelta
+
+
+class IntervalIndex:
+    """Busy intervals kept sorted by start time.
+
+    Overlap queries bisect on the sorted starts and on a running maximum of the
+    ends, so they only touch the intervals near the query window instead of
+    scanning the whole calendar.
+
+    Intervals are (start_ts, end_ts, label) tuples with POSIX timestamps.
+    """
+
+    def __init__(self, intervals=()):
+        self._intervals = sorted((start, end, label) for start, end, label in intervals if end > start)
+        self._rebuild()
+
+    def _rebuild(self):
+        self._starts = [interval[0] for interval in self._intervals]
+        # _max_ends[i] is the latest end among the first i + 1 intervals (non-decreasing)
+        self._max_ends = []
+        latest = float('-inf')
+        for interval in self._intervals:
+            latest = max(latest, interval[1])
+            self._max_ends.append(latest)
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, start, end, label=None):
+        """Adds a busy interval."""
+        if end <= start:
+            return
+        index = bisect_right(self._intervals, (start, end, label))
+        self._intervals.insert(index, (start, end, label))
+        self._starts.insert(index, start)
+        self._max_ends.insert(index, max(end, self._max_ends[index - 1]) if index else end)
+        # The running maximum only changes from here up to the first later interval already ending after `end`
+        for later in range(index + 1, len(self._max_ends)):
+            if self._max_ends[later] >= end:
+                break
+            self._max_ends[later] = end
+
+    def overlapping(self, start, end):
+        """Returns the intervals overlapping [start, end), ordered by start."""
+        # Nothing before `first` ends after `start`; nothing from `last` on starts before `end`
+        first = bisect_right(self._max_ends, start)
+        last = bisect_left(self._starts, end)
+        return [interval for interval in self._intervals[first:last] if interval[1] > start]
+
+    def busy(self, start, end):
+        """Returns the merged busy periods within [start, end) as (start, end) pairs."""
+        merged = []
+        for interval_start, interval_end, _ in self.overlapping(start, end):
+            interval_start, interval_end = max(interval_start, start), min(interval_end, end)
+            if merged and interval_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], interval_end)
+            else:
+                merged.append([interval_start, interval_end])
+        return [(busy_start, busy_end) for busy_start, busy_end in merged]
+
+    def free(self, start, end, min_duration=0):
+        """Returns the gaps of at least `min_duration` seconds between busy periods within [start, end)."""
+        slots = []
+        cursor = start
+        for busy_start, busy_end in self.busy(start, end):
+            if busy_start - cursor >= min_duration and busy_start > cursor:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if end - cursor >= min_duration and end > cursor:
+            slots.append((cursor, end))
+        return slots
+
+
+def daily_windows(range_start, range_end, day_start, day_end):
+    """Splits [range_start, range_end) into per-day working windows.
+
+    Args:
+        range_start, range_end: Timezone-aware datetimes bounding the search.
+        day_start, day_end: datetime.time bounds of the working day in the same timezone.
+
+    Yields (window_start, window_end) timezone-aware datetimes, clipped to the range.
+    """
+    zone = range_start.tzinfo
+    day = range_start.date()
+    while day <= range_end.date():
+        window_start = max(range_start, datetime.combine(day, day_start, tzinfo=zone))
+        if day_end == dt_time(0, 0):
+            window_end = datetime.combine(day + timedelta(days=1), day_end, tzinfo=zone)
+        else:
+            window_end = datetime.combine(day, day_end, tzinfo=zone)
+        window_end = min(range_end, window_end)
+        if window_end > window_start:
+            yield window_start, window_end
+        day += timedelta(days=1)
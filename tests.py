@@ -5,7 +5,34 @@ import unittest
 from tools import MailTools, CalendarTools, FileSystemTools, build_file_part
 from langchain.messages import AIMessageChunk, AIMessage, HumanMessage, ToolMessage
 from agent import Agent
+from outbox import Outbox
+from calendar_mirror import CalendarMirror
+from scheduling import IntervalIndex
+from recurrence import RecurrenceEngine
+from prefetch import Prefetcher
+from planner import PlanError, PlanExecutor, parse_plan
+from fakes import ScriptedChatModel, tool_call
+from routing import ModelRouter, classify_turn
+from llm_backends import close_http_clients, make_chat_model
+from mock_llm_server import MockLLMServer
+from tools import TimeTools
+from batch_runner import run_batch
+from file_index import FileIndex
+from retrieval import DocumentIndex, chunk_text
+from disk_usage import DiskUsage
+import json
+import re
+import time
+from langchain.tools import tool
+from utils import get_zone, local_day_window, resolve_relative_date
+from datetime import datetime, timedelta
+from dateutil import tz
 import os
+import tempfile
+import shutil
+import sqlite3
+import sys
+import threading
 
 
 class TestEmailTools(TestCase):
@@ -156,6 +183,99 @@ class TestEmailTools(TestCase):
         self.assertEqual(file_part.get_filename(), test_filename.split(os.sep)[-1])
         self.assertEqual(file_part.get_content_type(), "text/plain")
 
+    def test_queue_message_impl(self):
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch.object(MailTools, 'get_mail_service', return_value=MagicMock()):
+                tool = MailTools(outbox_path=os.path.join(tmp_dir, "outbox.db"))
+            tool.mail_service.users().messages().send().execute.return_value = {'id': 'gmail123'}
+            
+            result = tool.queue_message_impl(os.environ["EMAIL_ADDRESS"], "Queued Subject", "Queued body.")
+            self.assertIn("Email queued for delivery to " + os.environ["EMAIL_ADDRESS"], result)
+            queue_id = int(result.split("QUEUE_ID:")[1])
+            
+            self.assertTrue(tool.outbox.wait_until_idle(timeout=5))
+            self.assertIn("Status: sent", tool.get_outbox_status_impl(queue_id))
+            self.assertIn("No queued email", tool.get_outbox_status_impl(queue_id + 1))
+            
+            result = tool.queue_message_impl("invalid_email_address", "Subject", "Body")
+            self.assertIn("Error: Invalid email address format", result)
+            tool.close()
+
+
+    def test_outbox_worker_sends_with_its_own_service(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch.object(MailTools, 'get_mail_service', return_value=MagicMock()):
+                tool = MailTools(outbox_path=os.path.join(tmp_dir, "outbox.db"))
+            tool.mail_credentials = MagicMock()
+            worker_service = MagicMock()
+            worker_service.users().messages().send().execute.return_value = {'id': 'gmail123'}
+            threads = []
+            with patch('tools.build', side_effect=lambda *args, **kwargs: threads.append(
+                    threading.current_thread()) or worker_service):
+                for subject in ("First", "Second"):
+                    tool.queue_message_impl(os.environ["EMAIL_ADDRESS"], subject, "Body.")
+                self.assertTrue(tool.outbox.wait_until_idle(timeout=5))
+            tool.close()
+
+            # Built once, on the worker thread, and the main thread's client never sends
+            self.assertEqual(len(threads), 1)
+            self.assertIsNot(threads[0], threading.current_thread())
+            self.assertEqual(worker_service.users().messages().send.call_count, 3)
+            tool.mail_service.users().messages().send.assert_not_called()
+
+
+class TestOutbox(TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "outbox.db")
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+    
+    def test_retries_transient_failures(self):
+        send = MagicMock(side_effect=[Exception("temporary failure"), "gmail123"])
+        outbox = Outbox(self.db_path, send, base_delay=0.01)
+        outbox.start()
+        
+        queue_id = outbox.enqueue("to@example.com", "Subject", "cmF3")
+        self.assertTrue(outbox.wait_until_idle(timeout=5))
+        
+        status = outbox.status(queue_id)
+        self.assertEqual(status['status'], "sent")
+        self.assertEqual(status['attempts'], 2)
+        self.assertEqual(status['message_id'], "gmail123")
+        outbox.close()
+        
+    def test_gives_up_after_max_attempts(self):
+        outbox = Outbox(self.db_path, MagicMock(side_effect=Exception("down")), max_attempts=2, base_delay=0.01)
+        outbox.start()
+        
+        queue_id = outbox.enqueue("to@example.com", "Subject", "cmF3")
+        self.assertTrue(outbox.wait_until_idle(timeout=5))
+        
+        status = outbox.status(queue_id)
+        self.assertEqual(status['status'], "failed")
+        self.assertEqual(status['last_error'], "down")
+        outbox.close()
+    
+    def test_survives_restart(self):
+        # Queue a message without a running worker, as if the process died before delivery
+        outbox = Outbox(self.db_path, MagicMock())
+        queue_id = outbox.enqueue("to@example.com", "Subject", "cmF3")
+        outbox.close()
+        
+        send = MagicMock(return_value="gmail123")
+        outbox = Outbox(self.db_path, send)
+        outbox.start()
+        self.assertTrue(outbox.wait_until_idle(timeout=5))
+        
+        send.assert_called_once_with("cmF3")
+        self.assertEqual(outbox.status(queue_id)['status'], "sent")
+        outbox.close()
+
+
 class TestCalendarTools(TestCase):
     
     @classmethod
@@ -163,6 +283,10 @@ class TestCalendarTools(TestCase):
         with patch.object(CalendarTools, 'get_calendar_service', return_value=MagicMock()):
             cls.tool = CalendarTools()
     
+    def setUp(self):
+        # Pin the calendar timezone so day windows don't depend on the machine running the tests
+        self.tool._calendar_zone = tz.tzutc()
+    
     def test_add_event_impl(self):
         with patch.object(self.tool, 'calendar_service') as mock_service:
             # Set up the mock chain: calendar_service.events().insert().execute()
@@ -252,49 +376,545 @@ class TestCalendarTools(TestCase):
             self.assertIsInstance(events, list)
             self.assertLessEqual(len(events), 3)
         
+    def test_events_on_date_follows_pages(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.events().list().execute.side_effect = [
+                {'items': [{'id': '1', 'summary': 'Event 1', 'start': {'dateTime': '2026-12-01T10:00:00Z'}}],
+                 'nextPageToken': 'page2'},
+                {'items': [{'id': '2', 'summary': 'Event 2', 'start': {'dateTime': '2026-12-01T12:00:00Z'}}]}
+            ]
+            
+            events = self.tool._get_events_on_date_impl("2026-12-01").splitlines()
+            self.assertEqual(len(events), 2)
+            self.assertIn("ID: 2", events[1])
+            self.assertEqual(mock_service.events().list.call_args.kwargs['pageToken'], 'page2')
+            self.assertIn("items(id,etag,summary,start,end)", mock_service.events().list.call_args.kwargs['fields'])
+    
+    def test_events_on_date_uses_calendar_timezone(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.settings().get().execute.return_value = {'value': 'Europe/Rome'}
+            mock_service.events().list().execute.return_value = {'items': []}
+            self.tool._calendar_zone = None
+            
+            # The DST change on 2026-03-29 makes that day 23 hours long in Rome
+            self.tool._get_events_on_date_impl("2026-03-29")
+            self.assertEqual(mock_service.events().list.call_args.kwargs['timeMin'], "2026-03-29T00:00:00+01:00")
+            self.assertEqual(mock_service.events().list.call_args.kwargs['timeMax'], "2026-03-30T00:00:00+02:00")
+            
+            self.tool._get_events_on_date_impl("2026-03-30")
+            self.assertEqual(mock_service.settings().get().execute.call_count, 1)
+    
+    def test_events_in_range_impl(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.events().list().execute.return_value = {
+                'items': [
+                    {'id': '1', 'summary': 'Standup', 'start': {'dateTime': '2026-12-01T10:00:00Z'}, 'end': {'dateTime': '2026-12-01T10:15:00Z'}},
+                    {'id': '2', 'summary': 'Holiday', 'start': {'date': '2026-12-02'}, 'end': {'date': '2026-12-03'}},
+                    {'id': '3', 'summary': 'Offsite', 'start': {'dateTime': '2026-12-03T09:00:00Z'}, 'end': {'dateTime': '2026-12-04T17:00:00Z'}}
+                ]
+            }
+            
+            events = self.tool._get_events_in_range_impl("2026-12-01", "2026-12-04").splitlines()
+            self.assertEqual(events[0], "2026-12-01 10:00-10:15 Standup | ID: 1")
+            self.assertEqual(events[1], "2026-12-02 all day Holiday | ID: 2")
+            self.assertEqual(events[2], "2026-12-03 09:00-2026-12-04 17:00 Offsite | ID: 3")
+            self.assertEqual(mock_service.events().list.call_args.kwargs['timeMax'], "2026-12-05T00:00:00+00:00")
+            
+            events = self.tool._get_events_in_range_impl("2026-12-01", "2026-12-04", max_results=2).splitlines()
+            self.assertEqual(len(events), 3)
+            self.assertIn("more events", events[2])
+    
+    def test_find_free_slots_impl(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.freebusy().query().execute.return_value = {
+                'calendars': {
+                    'primary': {'busy': [{'start': '2026-12-01T10:00:00Z', 'end': '2026-12-01T11:00:00Z'}]},
+                    'team@example.com': {'busy': [{'start': '2026-12-01T10:30:00Z', 'end': '2026-12-01T12:00:00Z'},
+                                                  {'start': '2026-12-02T09:00:00Z', 'end': '2026-12-02T17:45:00Z'}]}
+                }
+            }
+            
+            slots = self.tool._find_free_slots_impl("2026-12-01", "2026-12-02", 30, "09:00", "18:00",
+                                                    ["primary", "team@example.com"]).splitlines()
+            self.assertEqual(slots, [
+                "2026-12-01 09:00-10:00 (60 min)",
+                "2026-12-01 12:00-18:00 (360 min)",
+            ])
+            # One query covers both calendars and both days
+            body = mock_service.freebusy().query.call_args.kwargs['body']
+            self.assertEqual(len(body['items']), 2)
+            
+            mock_service.freebusy().query().execute.return_value = {
+                'calendars': {'shared@example.com': {'errors': [{'reason': 'notFound'}]}}
+            }
+            result = self.tool._find_free_slots_impl("2026-12-01", "2026-12-01", calendar_ids=["shared@example.com"])
+            self.assertIn("notFound", result)
+    
+    def test_find_free_slots_uses_calendar_timezone(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.settings().get().execute.return_value = {'value': 'Europe/Rome'}
+            mock_service.freebusy().query().execute.return_value = {
+                'calendars': {'primary': {'busy': [{'start': '2026-12-03T13:00:00Z', 'end': '2026-12-03T14:00:00Z'}]}}
+            }
+            self.tool._calendar_zone = None
+            
+            # "Thursday afternoon" in Rome (UTC+1): the meeting at 13:00 UTC is at 14:00 local
+            slots = self.tool._find_free_slots_impl("2026-12-03", "2026-12-03", 30, "12:00", "18:00").splitlines()
+            self.assertEqual(slots, ["2026-12-03 12:00-14:00 (120 min)", "2026-12-03 15:00-18:00 (180 min)"])
+            body = mock_service.freebusy().query.call_args.kwargs['body']
+            self.assertEqual((body['timeMin'], body['timeMax']), ("2026-12-03T00:00:00+01:00", "2026-12-04T00:00:00+01:00"))
+            
+            # An explicit zone still wins
+            slots = self.tool._find_free_slots_impl("2026-12-03", "2026-12-03", 30, "12:00", "18:00",
+                                                    time_zone="UTC").splitlines()
+            self.assertEqual(slots, ["2026-12-03 12:00-13:00 (60 min)", "2026-12-03 14:00-18:00 (240 min)"])
+        self.tool._calendar_zone = tz.tzutc()
+    
+    def test_find_conflicts_impl(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.events().list().execute.return_value = {
+                'items': [
+                    {'id': '1', 'summary': 'Dentist', 'start': {'dateTime': '2026-12-01T10:00:00Z'}, 'end': {'dateTime': '2026-12-01T11:00:00Z'}},
+                    {'id': '2', 'summary': 'Focus time', 'transparency': 'transparent',
+                     'start': {'dateTime': '2026-12-01T10:00:00Z'}, 'end': {'dateTime': '2026-12-01T12:00:00Z'}}
+                ]
+            }
+            
+            conflicts = self.tool._find_conflicts_impl("2026-12-01T10:30:00", "2026-12-01T11:30:00", "UTC")
+            self.assertEqual(conflicts, "2026-12-01 10:00-11:00 Dentist")
+    
+    def _fake_batches(self, mock_service):
+        """Makes new_batch_http_request run each added request and report it through the callback."""
+        def new_batch(callback):
+            batch = MagicMock()
+            added = []
+            batch.add.side_effect = lambda request, request_id: added.append((request_id, request))
+            
+            def execute():
+                for request_id, request in added:
+                    try:
+                        callback(request_id, request.execute(), None)
+                    except Exception as error:
+                        callback(request_id, None, error)
+            batch.execute.side_effect = execute
+            return batch
+        mock_service.new_batch_http_request.side_effect = new_batch
+    
+    def test_bulk_add_events_impl(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            self._fake_batches(mock_service)
+            # The first event already exists, the second one is new
+            mock_service.events().list().execute.side_effect = [{'items': [{'id': 'old'}]}, {'items': []}]
+            mock_service.events().import_().execute.return_value = {'id': 'new1'}
+            
+            result = self.tool._bulk_add_events_impl([
+                {'event_name': 'Lecture', 'event_start_date': '2026-02-02T09:00:00', 'event_end_date': '2026-02-02T11:00:00'},
+                {'event_name': 'Lab', 'event_start_date': '2026-02-03T14:00:00', 'event_end_date': '2026-02-03T16:00:00',
+                 'recurrence_rule': 'FREQ=WEEKLY;BYDAY=TU;COUNT=12'},
+                {'event_name': 'Lab', 'event_start_date': '2026-02-03T14:00:00', 'event_end_date': '2026-02-03T16:00:00',
+                 'recurrence_rule': 'FREQ=WEEKLY;BYDAY=TU;COUNT=12'},
+                {'event_name': 'Broken', 'event_start_date': '2026-02-04', 'event_end_date': '2026-02-04'},
+                {'event_name': 'Bad rule', 'event_start_date': '2026-02-05T09:00:00', 'event_end_date': '2026-02-05T10:00:00',
+                 'recurrence_rule': 'FREQ=SOMETIMES'},
+            ])
+            
+            self.assertIn("Created 1 events, skipped 2 already in the calendar, 2 failed.", result)
+            self.assertIn("Created: Lab (2026-02-03T14:00:00)|EVENT_ID:new1", result)
+            self.assertIn("Failed: Bad rule", result)
+            imported = mock_service.events().import_.call_args.kwargs['body']
+            self.assertEqual(imported['recurrence'], ['RRULE:FREQ=WEEKLY;BYDAY=TU;COUNT=12'])
+            self.assertTrue(imported['iCalUID'].endswith("@ai-assistant"))
+    
+    def test_import_ics_impl(self):
+        ics_content = (
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:talk-1@conference\r\n"
+            "DTSTART;TZID=Europe/Rome:20260520T100000\r\n"
+            "DURATION:PT45M\r\n"
+            "SUMMARY:Keynote\\, day 1\r\n"
+            "DESCRIPTION:Opening talk\\nRoom A\r\n"
+            "  and overflow\r\n"
+            "BEGIN:VALARM\r\n"
+            "TRIGGER:-PT15M\r\n"
+            "END:VALARM\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:break@conference\r\n"
+            "DTSTART;VALUE=DATE:20260521\r\n"
+            "SUMMARY:Free day\r\n"
+            "RRULE:FREQ=DAILY;COUNT=2\r\n"
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "schedule.ics")
+            with open(path, "w", newline='') as f:
+                f.write(ics_content)
+            
+            with patch.object(self.tool, 'calendar_service') as mock_service:
+                self._fake_batches(mock_service)
+                mock_service.events().list().execute.return_value = {'items': []}
+                mock_service.events().import_().execute.return_value = {'id': 'imported'}
+                
+                result = self.tool._import_ics_impl(path)
+                bodies = [c.kwargs['body'] for c in mock_service.events().import_.call_args_list if 'body' in c.kwargs]
+            
+        self.assertIn("Created 2 events", result)
+        self.assertEqual(bodies[0]['summary'], "Keynote, day 1")
+        self.assertEqual(bodies[0]['description'], "Opening talk\nRoom A and overflow")
+        self.assertEqual(bodies[0]['start'], {'dateTime': '2026-05-20T10:00:00', 'timeZone': 'Europe/Rome'})
+        self.assertEqual(bodies[0]['end'], {'dateTime': '2026-05-20T10:45:00', 'timeZone': 'Europe/Rome'})
+        self.assertEqual(bodies[1]['end'], {'date': '2026-05-22'})
+        self.assertEqual(bodies[1]['recurrence'], ['RRULE:FREQ=DAILY;COUNT=2'])
+        self.assertIn("does not exist", self.tool._import_ics_impl("non_existent.ics"))
+    
+    def test_import_ics_skips_malformed_lines(self):
+        ics_content = (
+            "BEGIN:VCALENDAR\r\n"
+            "garbage before any event\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:good@conference\r\n"
+            "DTSTART:20260520T100000Z\r\n"
+            "SUMMARY:Keynote\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:bad@conference\r\n"
+            "DTSTART:20260521T100000Z\r\n"
+            "SUMMARY:Broken talk\r\n"
+            "LOCATION Room B\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:late@conference\r\n"
+            "DTSTART:20260522T100000Z\r\n"
+            "SUMMARY:Closing\r\n"
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "schedule.ics")
+            with open(path, "w", newline='') as f:
+                f.write(ics_content)
+            
+            with patch.object(self.tool, 'calendar_service') as mock_service:
+                self._fake_batches(mock_service)
+                mock_service.events().list().execute.return_value = {'items': []}
+                mock_service.events().import_().execute.return_value = {'id': 'imported'}
+                
+                result = self.tool._import_ics_impl(path)
+                bodies = [c.kwargs['body'] for c in mock_service.events().import_.call_args_list if 'body' in c.kwargs]
+        
+        self.assertIn("Created 2 events, skipped 0 already in the calendar, 1 failed.", result)
+        self.assertIn("Failed: Broken talk (20260521T100000Z): Malformed iCalendar line: LOCATION Room B", result)
+        self.assertEqual([body['summary'] for body in bodies], ["Keynote", "Closing"])
+    
+    def test_preview_recurrence_impl(self):
+        preview = self.tool._preview_recurrence_impl("2026-01-30T18:00:00", "FREQ=MONTHLY;BYDAY=-1FR", count=3).splitlines()
+        self.assertEqual(preview, ["Fri 2026-01-30 18:00", "Fri 2026-02-27 18:00", "Fri 2026-03-27 18:00",
+                                   "... more occurrences follow."])
+        self.assertIn("Error in recurrence_rule", self.tool._preview_recurrence_impl("2026-01-30T18:00:00", "FREQ=DAILY;COUNT=-1"))
+    
+    def test_find_conflicts_impl_recurring(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            mock_service.events().list().execute.return_value = {
+                'items': [
+                    {'id': '1', 'summary': 'Dentist', 'start': {'dateTime': '2026-12-15T18:30:00Z'}, 'end': {'dateTime': '2026-12-15T19:30:00Z'}},
+                    {'id': '2', 'summary': 'Gym', 'start': {'dateTime': '2026-12-16T19:00:00Z'}, 'end': {'dateTime': '2026-12-16T20:00:00Z'}}
+                ]
+            }
+            
+            conflicts = self.tool._find_conflicts_impl("2026-12-01T19:00:00", "2026-12-01T20:00:00", "UTC",
+                                                       "FREQ=WEEKLY;BYDAY=TU;COUNT=4")
+            self.assertEqual(conflicts, "2026-12-15 18:30-19:30 Dentist")
+            # The whole series is checked against a single listing
+            self.assertEqual(mock_service.events().list.call_args.kwargs['timeMax'], "2026-12-22T20:00:00+00:00")
+    
     def test_modify_event_impl(self):
         
         with patch.object(self.tool, 'calendar_service') as mock_service:
-            # Set up the mock chain: calendar_service.events().get().execute()
-            mock_service.events().get().execute.return_value = {
-                'summary': 'Event to Modify',
-                'location': 'New York',
-                'description': 'This event will be modified.',
-                'start': {'dateTime': '2026-12-31T12:00:00', 'timeZone': 'UTC'},
-                'end': {'dateTime': '2026-12-31T13:00:00', 'timeZone': 'UTC'}
+            # Set up the mock chain: calendar_service.events().insert().execute()
+            mock_service.events().insert().execute.return_value = {
+                'htmlLink': 'http://example.com/event',
+                'id': 'event_to_modify',
+                'etag': '"v1"',
+                'start': {'dateTime': '2026-12-31T12:00:00', 'timeZone': 'Europe/Rome'},
+                'end': {'dateTime': '2026-12-31T13:00:00', 'timeZone': 'Europe/Rome'}
             }
-            # Set up the mock chain: calendar_service.events().update().execute()
-            mock_service.events().update().execute.return_value = {
+            # Set up the mock chain: calendar_service.events().patch().execute()
+            mock_service.events().patch().execute.return_value = {
                 'htmlLink': 'http://example.com/modified_event',
-                'id': 'modified_event123'
+                'id': 'event_to_modify',
+                'etag': '"v2"'
             }
         
-            # First, get an upcoming event to modify
+            # First, create an event to modify
             creation_result = self.tool._add_event_to_calendar_impl(
                 "Event to Modify",
                 "New York",
                 "This event will be modified.",
                 "2026-12-31T12:00:00",
                 "2026-12-31T13:00:00",
-                "UTC",
+                "Europe/Rome",
                 30,
                 30
             )
-            print(creation_result)
             
             # Extract event ID from the response (format: "Event created: <link>|EVENT_ID:<id>")
             event_id = creation_result.split("EVENT_ID:")[1]
+            mock_service.events().get.reset_mock()
             
             # Now, modify the event
             modify_result = self.tool._modify_event_impl(
                 event_id,
                 summary="Modified Event",
-                description="This event has been modified."
+                start_date="2026-12-31T14:00:00"
             )
             
             self.assertIn("Event updated:", modify_result)
+            # A single conditional PATCH carrying only the changed fields
+            mock_service.events().get.assert_not_called()
+            self.assertEqual(mock_service.events().patch.call_args.kwargs['body'], {
+                'summary': 'Modified Event',
+                'start': {'dateTime': '2026-12-31T14:00:00', 'timeZone': 'Europe/Rome'}
+            })
+            mock_service.events().patch().headers.__setitem__.assert_called_with('If-Match', '"v1"')
+    
+    def test_modify_event_impl_etag_mismatch(self):
+        from googleapiclient.errors import HttpError
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            self.tool._remember_event({'id': 'stale', 'etag': '"old"'})
+            mock_service.events().patch().execute.side_effect = HttpError(MagicMock(status=412), b'Precondition Failed')
+            
+            result = self.tool._modify_event_impl('stale', location="Room 2")
+            self.assertIn("changed elsewhere", result)
+            self.assertIsNone(self.tool._known_event('stale'))
+    
+    def test_modify_events_impl(self):
+        
+        with patch.object(self.tool, 'calendar_service') as mock_service:
+            self._fake_batches(mock_service)
+            self.tool._remember_event({'id': 'known', 'etag': '"k"',
+                                       'start': {'dateTime': '2026-12-01T10:00:00+01:00', 'timeZone': 'Europe/Rome'},
+                                       'end': {'dateTime': '2026-12-01T11:00:00+01:00', 'timeZone': 'Europe/Rome'}})
+            # 'unknown' is fetched in a batch, 'allday' can't be shifted by 30 minutes
+            mock_service.events().get().execute.side_effect = [
+                {'id': 'unknown', 'etag': '"u"', 'start': {'dateTime': '2026-12-02T09:00:00Z'}, 'end': {'dateTime': '2026-12-02T09:30:00Z'}},
+                {'id': 'allday', 'etag': '"a"', 'start': {'date': '2026-12-03'}, 'end': {'date': '2026-12-04'}},
+            ]
+            patched = []
+            
+            def patch_event(**kwargs):
+                request = MagicMock()
+                request.execute.return_value = {'id': kwargs['eventId'], 'etag': '"new"'}
+                patched.append(kwargs)
+                return request
+            mock_service.events().patch.side_effect = patch_event
+            
+            result = self.tool._modify_events_impl(['known', 'unknown', 'allday'], shift_minutes=30)
+            
+            self.assertIn("Updated 2 of 3 events.", result)
+            self.assertIn("Failed: allday: all-day events", result)
+            self.assertEqual(patched[0]['body']['start'], {'dateTime': '2026-12-01T10:30:00+01:00', 'timeZone': 'Europe/Rome'})
+            self.assertEqual(patched[1]['body']['end'], {'dateTime': '2026-12-02T10:00:00+00:00'})
+            
+            self.assertIn("Error", self.tool._modify_events_impl(['known']))
     
 
+class TestCalendarMirror(TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mirror = CalendarMirror(os.path.join(self.tmp_dir.name, "mirror.db"), max_staleness=60)
+        
+    def tearDown(self):
+        self.mirror.close()
+        self.tmp_dir.cleanup()
+    
+    def _event(self, event_id, start, end, summary="Event"):
+        return {'id': event_id, 'summary': summary, 'start': {'dateTime': start}, 'end': {'dateTime': end}}
+    
+    def test_full_then_incremental_sync(self):
+        service = MagicMock()
+        service.events().list().execute.side_effect = [
+            # Full sync over two pages
+            {'items': [self._event('a', '2026-12-01T10:00:00Z', '2026-12-01T11:00:00Z')], 'nextPageToken': 'p2'},
+            {'items': [self._event('b', '2026-12-02T10:00:00Z', '2026-12-02T11:00:00Z')], 'nextSyncToken': 's1'},
+            # Incremental sync: 'a' was deleted, 'c' was added
+            {'items': [{'id': 'a', 'status': 'cancelled'},
+                       self._event('c', '2026-12-03T10:00:00Z', '2026-12-03T11:00:00Z')], 'nextSyncToken': 's2'},
+        ]
+        
+        self.assertEqual(self.mirror.sync(service), 2)
+        self.assertEqual(self.mirror.count(), 2)
+        self.assertFalse(self.mirror.is_stale())
+        
+        self.mirror.sync(service)
+        self.assertEqual(service.events().list.call_args.kwargs['syncToken'], 's1')
+        rows = self.mirror.upcoming(0, 10)
+        self.assertEqual([row['id'] for row in rows], ['b', 'c'])
+    
+    def test_between_returns_overlapping_events(self):
+        self.mirror.upsert(self._event('a', '2026-12-01T23:30:00Z', '2026-12-02T00:30:00Z'))
+        self.mirror.upsert(self._event('b', '2026-12-02T10:00:00Z', '2026-12-02T11:00:00Z'))
+        self.mirror.upsert(self._event('c', '2026-12-03T10:00:00Z', '2026-12-03T11:00:00Z'))
+        
+        day_start = 1796169600  # 2026-12-02T00:00:00Z
+        rows = self.mirror.between(day_start, day_start + 86400)
+        self.assertEqual([row['id'] for row in rows], ['a', 'b'])
+    
+    def test_calendar_tools_reads_from_mirror(self):
+        with patch.object(CalendarTools, 'get_calendar_service', return_value=MagicMock()):
+            tool = CalendarTools(mirror_path=os.path.join(self.tmp_dir.name, "tools_mirror.db"))
+        tool.calendar_service.events().list().execute.return_value = {'items': [], 'nextSyncToken': 's1'}
+        tool.calendar_service.events().insert().execute.return_value = self._event(
+            'new1', '2099-12-31T10:00:00Z', '2099-12-31T11:00:00Z', "Written through")
+        
+        list_calls = tool.calendar_service.events().list.call_count
+        self.assertEqual(tool._get_upcoming_events_impl(5), 'No upcoming events found.')
+        
+        tool._add_event_to_calendar_impl("Written through", "", "", "2099-12-31T10:00:00",
+                                         "2099-12-31T11:00:00", "UTC", 0, 0)
+        
+        self.assertIn("Written through", tool._get_upcoming_events_impl(5))
+        self.assertIn("ID: new1", tool._get_events_on_date_impl("2099-12-31"))
+        # One sync on the first read, then reads are served locally
+        self.assertEqual(tool.calendar_service.events().list.call_count, list_calls + 1)
+        tool.mirror.close()
+
+    def test_conflicts_from_mirror_skip_transparent_events(self):
+        with patch.object(CalendarTools, 'get_calendar_service', return_value=MagicMock()):
+            tool = CalendarTools(mirror_path=os.path.join(self.tmp_dir.name, "tools_mirror.db"))
+        holiday = {'id': 'h', 'summary': 'Holiday', 'transparency': 'transparent',
+                   'start': {'date': '2026-12-01'}, 'end': {'date': '2026-12-02'}}
+        tool.calendar_service.events().list().execute.return_value = {
+            'items': [holiday, self._event('d', '2026-12-01T10:00:00Z', '2026-12-01T11:00:00Z', "Dentist")],
+            'nextSyncToken': 's1'}
+
+        conflicts = tool._find_conflicts_impl("2026-12-01T10:30:00", "2026-12-01T11:30:00", "UTC")
+        self.assertEqual(conflicts, "2026-12-01 10:00-11:00 Dentist")
+        self.assertIn("transparency", tool.calendar_service.events().list.call_args.kwargs['fields'])
+        # Listings still show them
+        self.assertIn("Holiday", tool._get_events_on_date_impl("2026-12-01"))
+        tool.mirror.close()
+
+    def test_mirror_without_transparency_is_synced_again(self):
+        self.mirror.upsert(self._event('a', '2026-12-01T10:00:00Z', '2026-12-01T11:00:00Z'))
+        self.mirror.close()
+        path = os.path.join(self.tmp_dir.name, "mirror.db")
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("ALTER TABLE events DROP COLUMN transparent")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_sync', ?)", (str(time.time()),))
+        conn.close()
+
+        self.mirror = CalendarMirror(path, max_staleness=60)
+        self.assertEqual(self.mirror.count(), 0)
+        self.assertTrue(self.mirror.is_stale())
+
+
+class TestRecurrenceEngine(TestCase):
+    
+    def setUp(self):
+        self.engine = RecurrenceEngine()
+        self.start = datetime(2026, 3, 24, 19, 0, tzinfo=tz.gettz("Europe/Rome"))
+    
+    def test_validate(self):
+        self.assertEqual(self.engine.validate("FREQ=WEEKLY;BYDAY=TU;WKST=SU;"), (True, "FREQ=WEEKLY;BYDAY=TU"))
+        self.assertEqual(self.engine.validate("RRULE:FREQ=MONTHLY;BYDAY=-1FR"), (True, "RRULE:FREQ=MONTHLY;BYDAY=-1FR"))
+        
+        invalid_rules = {
+            "FREQ=WEEKLY;BYDAY=TUESDAY": "BYDAY",
+            "FREQ=WEEKLY;BYDAY=2TU": "ordinal",
+            "FREQ=DAILY;COUNT=0": "COUNT",
+            "FREQ=DAILY;COUNT=3;UNTIL=20260101": "both COUNT and UNTIL",
+            "FREQ=DAILY;UNTIL=2026-01-01": "UNTIL",
+            "FREQ=MONTHLY;BYMONTHDAY=32": "BYMONTHDAY",
+            "FREQ=DAILY;FREQ=WEEKLY": "more than once",
+            "FREQ=DAILY;COLOR=RED": "Unsupported",
+            "FREQ=MONTHLY;BYSETPOS=1": "BYSETPOS",
+        }
+        for rule, message in invalid_rules.items():
+            is_valid, error = self.engine.validate(rule)
+            self.assertFalse(is_valid, rule)
+            self.assertIn(message, error)
+    
+    def test_occurrences(self):
+        occurrences = list(self.engine.occurrences("FREQ=WEEKLY;BYDAY=TU;UNTIL=20260414", self.start))
+        self.assertEqual([o.day for o in occurrences], [24, 31, 7, 14])
+        # Wall-clock time is kept across the DST change on March 29th
+        self.assertTrue(all(o.hour == 19 for o in occurrences))
+        
+        window = list(self.engine.occurrences("FREQ=DAILY", self.start,
+                                              window_start=datetime(2026, 5, 1, tzinfo=self.start.tzinfo),
+                                              window_end=datetime(2026, 5, 3, tzinfo=self.start.tzinfo)))
+        self.assertEqual([o.day for o in window], [1, 2])
+        
+        self.assertEqual(len(list(self.engine.occurrences("FREQ=DAILY", self.start, limit=5))), 5)
+        self.assertEqual(self.engine.cache_info().currsize, 2)
+        
+        with self.assertRaises(ValueError):
+            list(self.engine.occurrences("FREQ=HOURLY", self.start))
+
+
+class TestTimezones(TestCase):
+    
+    def test_local_day_window(self):
+        rome = get_zone("Europe/Rome")
+        self.assertIs(get_zone("Europe/Rome"), rome)
+        
+        start, end = local_day_window("2026-10-25", rome)
+        self.assertEqual(end.timestamp() - start.timestamp(), timedelta(hours=25).total_seconds())
+        self.assertEqual(start.isoformat(), "2026-10-25T00:00:00+02:00")
+        
+        # Santiago moves its clocks forward at midnight, so the day starts at 01:00
+        start, end = local_day_window("2026-09-06", get_zone("America/Santiago"))
+        self.assertEqual(start.isoformat(), "2026-09-06T01:00:00-03:00")
+        self.assertEqual(end.timestamp() - start.timestamp(), timedelta(hours=23).total_seconds())
+
+
+class TestIntervalIndex(TestCase):
+    
+    def test_overlapping(self):
+        index = IntervalIndex([(0, 100, 'long'), (10, 20, 'a'), (30, 40, 'b'), (50, 60, 'c')])
+        
+        self.assertEqual([label for _, _, label in index.overlapping(35, 55)], ['long', 'b', 'c'])
+        self.assertEqual([label for _, _, label in index.overlapping(100, 200)], [])
+        
+        index.add(150, 160, 'd')
+        self.assertEqual([label for _, _, label in index.overlapping(100, 200)], ['d'])
+    
+    def test_free(self):
+        index = IntervalIndex([(10, 20, None), (15, 30, None), (50, 60, None)])
+        
+        self.assertEqual(index.busy(0, 100), [(10, 30), (50, 60)])
+        self.assertEqual(index.free(0, 100), [(0, 10), (30, 50), (60, 100)])
+        self.assertEqual(index.free(0, 100, min_duration=15), [(30, 50), (60, 100)])
+
+    def test_add_keeps_the_index_equal_to_a_rebuilt_one(self):
+        import random
+        rng = random.Random(7)
+        index = IntervalIndex()
+        intervals = []
+        for count in range(300):
+            start = rng.randrange(0, 1000)
+            interval = (start, start + rng.randrange(1, 200), f"e{count}")
+            index.add(*interval)
+            intervals.append(interval)
+        rebuilt = IntervalIndex(intervals)
+        self.assertEqual(index._max_ends, rebuilt._max_ends)
+        for start in range(0, 1200, 50):
+            self.assertEqual(index.overlapping(start, start + 75), rebuilt.overlapping(start, start + 75))
+
+
 class TestFileSystemTools(TestCase):
     
     tool = FileSystemTools()
@@ -320,8 +940,230 @@ class TestFileSystemTools(TestCase):
         # Test non-existent directory
         result = tool.show_folder_contents_impl("non_existent_dir")
         self.assertIn("does not exist", result)   
+    
+    def make_folder(self, count):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for index in range(count):
+            path = os.path.join(directory.name, f"file{index:04d}.{'txt' if index % 2 else 'pdf'}")
+            with open(path, "w") as f:
+                f.write("x" * index)
+            os.utime(path, (1_700_000_000 + index, 1_700_000_000 + index))
+        os.mkdir(os.path.join(directory.name, "subfolder"))
+        return directory.name
+    
+    def test_show_folder_contents_pages(self):
+        folder = self.make_folder(120)
+        
+        first = self.tool.show_folder_contents_impl(folder, limit=10).splitlines()
+        self.assertEqual(first[0], "Entries 1-10 of 121, sorted by name. Use offset=10 for the next ones:")
+        self.assertEqual(first[1:3], ["file0000.pdf", "file0001.txt"])
         
+        last = self.tool.show_folder_contents_impl(folder, offset=115, limit=10).splitlines()
+        self.assertEqual(last[0], "Entries 116-121 of 121, sorted by name:")
+        self.assertEqual(last[-1], "subfolder/")
+    
+    def test_show_folder_contents_filters_and_sorts(self):
+        folder = self.make_folder(120)
+        
+        largest = self.tool.show_folder_contents_impl(folder, extensions=["PDF"], sort_by="size",
+                                                      descending=True, limit=2, details=True).splitlines()
+        self.assertTrue(largest[0].startswith("Entries 1-2 of 60"))
+        self.assertTrue(largest[1].startswith("file0118.pdf  118 B  "))
+        
+        newest = self.tool.show_folder_contents_impl(folder, pattern="file00*.txt", sort_by="mtime", descending=True)
+        self.assertEqual(newest.splitlines()[1], "file0099.txt")
+        self.assertEqual(self.tool.show_folder_contents_impl(folder, pattern="*.docx"), "No entries match the filters.")
+    
+    def test_show_folder_contents_output_is_capped(self):
+        folder = self.make_folder(600)
         
+        result = self.tool.show_folder_contents_impl(folder, limit=1000, details=True)
+        self.assertLessEqual(len(result), 8200)
+        shown = len(result.splitlines()) - 1
+        self.assertIn(f"Use offset={shown} for the next ones", result.splitlines()[0])
+
+    def write_file(self, name, content, mode="w", **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, mode, **kwargs) as f:
+            f.write(content)
+        return path
+
+    def test_read_file_content_pages_through_lines(self):
+        tool = FileSystemTools()
+        path = self.write_file("log.txt", "".join(f"line {index} {'x' * 50}\n" for index in range(1, 2001)))
+
+        first = tool.read_file_content_impl(path, max_tokens=100).splitlines()
+        self.assertEqual(first[0], "Lines 1-6 (118.1 KB, utf-8). Use start_line=7 for more:")
+        self.assertTrue(first[6].startswith("line 6 "))
+        following = tool.read_file_content_impl(path, start_line=7, max_tokens=100).splitlines()
+        self.assertTrue(following[1].startswith("line 7 "))
+        # The second window started where the first one ended, without re-sniffing the file
+        self.assertEqual(tool.file_reader.stats, {'hits': 1, 'misses': 1})
+
+        last = tool.read_file_content_impl(path, start_line=1999).splitlines()
+        self.assertEqual(last[0], "Lines 1999-2000 of 2000 (118.1 KB, utf-8):")
+        self.assertEqual(len(tool.read_file_content_impl(path, start_line=10, end_line=12).splitlines()), 4)
+        self.assertEqual(tool.read_file_content_impl(path, start_line=3000),
+                         "No lines from line 3000: the file has 2000 lines.")
+
+    def test_read_file_content_encodings_and_binaries(self):
+        tool = FileSystemTools()
+        latin = self.write_file("latin.txt", "café € résumé\n", encoding="cp1252")
+        self.assertEqual(tool.read_file_content_impl(latin).splitlines()[1:], ["café € résumé"])
+        wide = self.write_file("wide.txt", "héllo\nwörld\n", encoding="utf-16")
+        self.assertEqual(tool.read_file_content_impl(wide).splitlines()[1:], ["héllo", "wörld"])
+
+        binary = self.write_file("data.bin", bytes(range(256)) * 4, mode="wb")
+        self.assertIn("can't be shown as text", tool.read_file_content_impl(binary))
+        dump = tool.read_file_content_impl(binary, byte_offset=16, byte_count=4).splitlines()
+        self.assertEqual(dump, ["Bytes 16-19 of 1024. Use byte_offset=20 for the next ones:", "10 11 12 13"])
+
+        long_line = self.write_file("minified.js", "x" * 100_000)
+        self.assertIn("[line truncated]", tool.read_file_content_impl(long_line, max_tokens=50))
+        self.assertIn("does not exist", tool.read_file_content_impl("missing.txt"))
+
+    def make_tree(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = directory.name
+        os.makedirs(os.path.join(root, "reports", "2026"))
+        os.makedirs(os.path.join(root, "node_modules"))
+        files = {
+            "reports/summary.txt": "Intro\nThe Q3 budget is tight.\nOutro\nq3 BUDGET review next week\n",
+            "reports/2026/plan.md": "Goals\nMention of the Q3 Budget here\n",
+            "reports/2026/data.bin": "\0\0Q3 budget\0",
+            "node_modules/readme.txt": "Q3 budget",
+        }
+        for name, content in files.items():
+            with open(os.path.join(root, name), "w") as f:
+                f.write(content)
+        with open(os.path.join(root, "legacy.txt"), "w", encoding="cp1252") as f:
+            f.write("Café menu\nQ3 budget for the café\n")
+        return root
+
+    def test_search_file_contents(self):
+        tool = FileSystemTools()
+        tool.content_searcher.workers = 1
+        root = self.make_tree()
+
+        result = tool.search_file_contents_impl(root, "q3 budget").splitlines()
+        self.assertEqual(result[0], "4 matches in 3 files:")
+        summary = result.index(os.path.join(root, "reports", "summary.txt"))
+        # Adjacent matches share their context lines
+        self.assertEqual(result[summary + 1:summary + 5], ["  1- Intro", "  2: The Q3 budget is tight.", "  3- Outro",
+                                                           "  4: q3 BUDGET review next week"])
+        self.assertIn("  2: Q3 budget for the café", result)
+
+        result = tool.search_file_contents_impl(root, r"^q3 \w+", regex=True, case_sensitive=True,
+                                                context_lines=0).splitlines()
+        self.assertEqual(result[1:], [os.path.join(root, "reports", "summary.txt"), "  4: q3 BUDGET review next week"])
+        self.assertEqual(tool.search_file_contents_impl(root, "budget", extensions=["md"]).splitlines()[0],
+                         "1 matches in 1 files:")
+        self.assertIn("result cap", tool.search_file_contents_impl(root, "budget", max_results=2))
+        self.assertIn("Invalid regular expression", tool.search_file_contents_impl(root, "(", regex=True))
+        self.assertEqual(tool.search_file_contents_impl(root, "missing words"), f"No matches for 'missing words' in {root}.")
+
+    def test_search_file_contents_in_worker_processes(self):
+        tool = FileSystemTools()
+        tool.content_searcher.workers = 2
+        self.addCleanup(tool.close)
+        root = self.make_tree()
+
+        self.assertEqual(tool.search_file_contents_impl(root, "q3 budget").splitlines()[0], "4 matches in 3 files:")
+
+    def make_build_tree(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        build = os.path.join(directory.name, "build")
+        for index in range(40):
+            folder = os.path.join(build, f"module{index % 4}", f"part{index % 2}")
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"file{index}.{'o' if index % 2 else 'c'}"), "w") as f:
+                f.write("x" * 100)
+        return build
+
+    def confirm_token(self, preview):
+        return re.search(r"confirm_token='(\w+)'", preview).group(1)
+
+    def test_remove_matching_previews_then_deletes(self):
+        tool = FileSystemTools()
+        build = self.make_build_tree()
+
+        preview = tool.remove_matching_impl(build, "*.O")
+        self.assertTrue(preview.startswith(f"Dry run: remove_matching would permanently delete 20 files (2.0 KB) under {build}."))
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(build)), 40)
+        self.assertIn("Unknown or expired", tool.remove_matching_impl(build, "*.O", confirm_token="0000"))
+        # A token only confirms the operation it was issued for
+        self.assertIn("Unknown or expired", tool.remove_tree_impl(build, confirm_token=self.confirm_token(preview)))
+
+        preview = tool.remove_matching_impl(build, "*.o")
+        token = self.confirm_token(preview)
+        self.assertEqual(tool.remove_matching_impl(build, "*.o", confirm_token=token).split(" in ")[0],
+                         f"Removed 20 files (2.0 KB) under {build}")
+        remaining = [name for _, _, files in os.walk(build) for name in files]
+        self.assertEqual(len(remaining), 20)
+        self.assertTrue(all(name.endswith(".c") for name in remaining))
+        self.assertIn("Unknown or expired", tool.remove_matching_impl(build, "*.o", confirm_token=token))
+        self.assertIn("must select some files", tool.remove_matching_impl(build, "*"))
+
+    def test_remove_tree_previews_then_deletes(self):
+        tool = FileSystemTools()
+        build = self.make_build_tree()
+
+        preview = tool.remove_tree_impl(build)
+        self.assertIn("40 files (3.9 KB) and 9 folders", preview)
+        result = tool.remove_tree_impl(build, confirm_token=self.confirm_token(preview))
+        self.assertTrue(result.startswith(f"Removed 40 files (3.9 KB) and 9 folders under {build}"))
+        self.assertFalse(os.path.exists(build))
+        self.assertIn("home or root folder", tool.remove_tree_impl(os.path.expanduser("~")))
+
+    def test_removal_skips_folders_replaced_by_links(self):
+        tool = FileSystemTools()
+        build = self.make_build_tree()
+        outside = os.path.join(os.path.dirname(build), "outside")
+        shutil.copytree(os.path.join(build, "module1"), outside)
+
+        preview = tool.remove_matching_impl(build, "*.o")
+        # Between the preview and the confirmation a folder of the tree becomes a link to another one
+        shutil.rmtree(os.path.join(build, "module1"))
+        os.symlink(outside, os.path.join(build, "module1"))
+        result = tool.remove_matching_impl(build, "*.o", confirm_token=self.confirm_token(preview))
+
+        self.assertTrue(result.startswith("Removed 10 files"))
+        self.assertIn("no longer under", result)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(outside)), 10)
+
+    def test_remove_tree_is_capped(self):
+        tool = FileSystemTools()
+        build = self.make_build_tree()
+        with patch('tools.MAX_REMOVE_FILES', 15):
+            preview = tool.remove_tree_impl(build)
+            self.assertIn("the first 15 of 40 files", preview)
+            result = tool.remove_tree_impl(build, confirm_token=self.confirm_token(preview))
+        self.assertTrue(result.startswith("Removed 15 files"))
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(build)), 25)
+
+    def test_disk_usage_impl(self):
+        tool = FileSystemTools()
+        build = self.make_build_tree()
+        with open(os.path.join(build, "archive.zip"), "wb") as f:
+            f.write(b"x" * 2000)
+        with open(os.path.join(build, "module2", "part0", "extra.o"), "wb") as f:
+            f.write(b"x" * 500)
+
+        result = tool.disk_usage_impl(build, max_results=2)
+        self.assertEqual(result.split("\n"), [
+            f"{build}: 6.3 KB in 42 files and 8 folders.",
+            "Largest items:",
+            "  archive.zip  2.0 KB (31%)",
+            "  module2/  1.5 KB (23%, 11 files)",
+            "  ...and 3 more items: 2.9 KB",
+        ])
+        self.assertIn("does not exist", tool.disk_usage_impl(os.path.join(build, "missing")))
+
     def test_open_file_impl(self):
         tool = FileSystemTools()
         test_file = os.path.join(os.getcwd(), "test_file.txt")
@@ -369,6 +1211,891 @@ class TestFileSystemTools(TestCase):
         result = tool.remove_folder_impl("non_existent_dir")
         self.assertIn("does not exist", result)
     
+class TestPrefetcher(TestCase):
+    
+    def setUp(self):
+        self.calls = []
+        
+        @tool
+        def get_latest_emails(count: int) -> str:
+            """Retrieves the latest emails from the inbox."""
+            self.calls.append(('get_latest_emails', count))
+            return "\n".join(f"Message ID: {i}" for i in range(count))
+        
+        @tool
+        def get_events_on_date(date: str) -> str:
+            """Retrieves events on a specific date from the calendar."""
+            self.calls.append(('get_events_on_date', date))
+            return f"10:00 - Meeting on {date}"
+        
+        @tool
+        def add_event_to_calendar(event_name: str) -> str:
+            """Adds an event."""
+            return "created"
+        
+        self.prefetcher = Prefetcher([get_latest_emails, get_events_on_date, add_event_to_calendar])
+        self.tomorrow = resolve_relative_date('tomorrow')
+    
+    def tearDown(self):
+        self.prefetcher.close()
+    
+    def test_prefetched_result_is_served(self):
+        self.prefetcher.start("Any new emails? And what meetings do I have tomorrow?")
+        
+        self.assertEqual(self.prefetcher.take('get_events_on_date', {'date': self.tomorrow}),
+                         f"10:00 - Meeting on {self.tomorrow}")
+        # A prefetch with a larger count answers a smaller request
+        self.assertEqual(self.prefetcher.take('get_latest_emails', {'count': 3}),
+                         "Message ID: 0\nMessage ID: 1\nMessage ID: 2")
+        self.assertIsNone(self.prefetcher.take('get_latest_emails', {'count': 3}))
+        self.prefetcher.finish()
+        
+        self.assertEqual(sorted(self.calls), [('get_events_on_date', self.tomorrow), ('get_latest_emails', 10)])
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats['issued'], stats['hits'], stats['wasted'], stats['misses']), (2, 2, 0, 1))
+        self.assertEqual(stats['hit_rate'], 1.0)
+    
+    def test_write_discards_pending(self):
+        self.prefetcher.start("Add a meeting tomorrow at 10")
+        self.assertIsNone(self.prefetcher.take('add_event_to_calendar', {'event_name': 'Meeting'}))
+        self.assertIsNone(self.prefetcher.take('get_events_on_date', {'date': self.tomorrow}))
+        self.assertEqual(self.prefetcher.stats()['wasted'], 1)
+    
+    def test_wasted_prefetches_are_capped(self):
+        for _ in range(20):
+            self.prefetcher.start("check my inbox")
+        self.prefetcher.finish()
+        
+        stats = self.prefetcher.stats()
+        # After 8 unused prefetches the rule is suspended and only probes once every 5 turns
+        self.assertEqual(stats['issued'], 10)
+        self.assertEqual(stats['wasted'], 10)
+        self.assertEqual(stats['suspended'], 10)
+    
+    def test_middleware(self):
+        self.prefetcher.start("what's on tomorrow?")
+        request = MagicMock(tool_call={'name': 'get_events_on_date', 'args': {'date': self.tomorrow}, 'id': 'call1'})
+        handler = MagicMock()
+        
+        message = self.prefetcher.middleware().wrap_tool_call(request, handler)
+        self.assertEqual(message.content, f"10:00 - Meeting on {self.tomorrow}")
+        self.assertEqual(message.tool_call_id, 'call1')
+        handler.assert_not_called()
+        
+        agent = Agent("qwen3:8b", list(self.prefetcher.tools.values()), "prompt", prefetcher=self.prefetcher)
+        self.assertIs(agent.prefetcher, self.prefetcher)
+
+
+class TestPlanner(TestCase):
+    
+    def setUp(self):
+        @tool
+        def slow_lookup(name: str) -> str:
+            """Looks something up."""
+            time.sleep(0.2)
+            return f"found {name}"
+        
+        @tool
+        def combine(first: str, second: str) -> str:
+            """Combines two results."""
+            return f"{first} + {second}"
+        
+        @tool
+        def broken(name: str) -> str:
+            """Always fails."""
+            raise ValueError("service down")
+        
+        self.tools = [slow_lookup, combine, broken]
+        self.names = {tool.name for tool in self.tools}
+    
+    def test_parse_plan(self):
+        steps, answer = parse_plan('<think>plan</think>```json\n{"steps": [{"id": "a", "tool": "slow_lookup", "args": {"name": "x"}},'
+                                   '{"id": "b", "tool": "combine", "args": {"first": "$a", "second": "y"}, "after": []}]}\n```',
+                                   self.names)
+        self.assertIsNone(answer)
+        self.assertEqual([step["deps"] for step in steps], [set(), {"a"}])
+        self.assertEqual(parse_plan('{"steps": [], "answer": "Hello!"}', self.names), ([], "Hello!"))
+        
+        invalid_plans = {
+            "I will check your calendar.": "not a JSON object",
+            '{"steps": [{"id": "a", "tool": "delete_everything", "args": {}}]}': "unknown tool",
+            '{"steps": [{"id": "a", "tool": "combine", "args": {"first": "x", "second": ""}, "after": ["z"]}]}':
+                "unknown steps",
+            '{"steps": [{"id": "a", "tool": "combine", "args": {"first": "$b", "second": ""}},'
+            '{"id": "b", "tool": "combine", "args": {"first": "$a", "second": ""}}]}': "cycle",
+        }
+        for text, message in invalid_plans.items():
+            with self.assertRaises(PlanError) as context:
+                parse_plan(text, self.names)
+            self.assertIn(message, str(context.exception))
+    
+    def test_only_declared_step_ids_are_references(self):
+        steps, _ = parse_plan(json.dumps({"steps": [
+            {"id": "a", "tool": "slow_lookup", "args": {"name": "budget"}},
+            {"id": "b", "tool": "combine", "args": {"first": "The budget is $100, see $a", "second": "$USD"}},
+        ]}), self.names)
+        self.assertEqual(steps[1]["deps"], {"a"})
+        
+        outcomes = PlanExecutor(self.tools).run(steps)
+        self.assertEqual(outcomes[1]["result"], "The budget is $100, see found budget + $USD")
+    
+    def test_executor_runs_independent_steps_in_parallel(self):
+        steps, _ = parse_plan(json.dumps({"steps": [
+            {"id": "a", "tool": "slow_lookup", "args": {"name": "x"}},
+            {"id": "b", "tool": "slow_lookup", "args": {"name": "y"}},
+            {"id": "c", "tool": "combine", "args": {"first": "$a", "second": "$b"}},
+            {"id": "d", "tool": "broken", "args": {"name": "z"}},
+            {"id": "e", "tool": "combine", "args": {"first": "$d", "second": "$c"}},
+        ]}), self.names)
+        
+        started = time.perf_counter()
+        outcomes = PlanExecutor(self.tools).run(steps)
+        self.assertLess(time.perf_counter() - started, 0.35)
+        
+        self.assertEqual([outcome["status"] for outcome in outcomes], ["ok", "ok", "ok", "error", "skipped"])
+        self.assertEqual(outcomes[2]["result"], "found x + found y")
+        self.assertIn("service down", outcomes[3]["result"])
+        self.assertIn("step d failed", outcomes[4]["result"])
+    
+    def test_plan_mode_uses_two_llm_calls(self):
+        plan = json.dumps({"steps": [{"id": "s1", "tool": "slow_lookup", "args": {"name": "tomorrow"}},
+                                     {"id": "s2", "tool": "combine", "args": {"first": "$s1", "second": "alice"}}]})
+        model = ScriptedChatModel(responses=[plan, "Done: found tomorrow + alice"])
+        agent = Agent(model, self.tools, "You are a helpful assistant.", mode="plan")
+        
+        tokens = [agent.get_ai_message_token(token) for token in agent.stream_invoke("look up tomorrow and send it to alice")]
+        self.assertEqual("".join(tokens), "Done: found tomorrow + alice")
+        self.assertEqual(len(model.calls), 2)
+        # The results reach the final generation, and the turn is kept in the conversation
+        self.assertIn("found tomorrow + alice", agent._answer_messages("", [], [
+            {"id": "s2", "tool": "combine", "args": {}, "status": "ok", "result": "found tomorrow + alice"}])[-1].content)
+        self.assertEqual([type(message) for message in agent._history()], [HumanMessage, AIMessage])
+        
+        # An invalid plan falls back to the tool loop
+        model.responses += ["Sure, let me do that.", tool_call("slow_lookup", {"name": "x"}), "Found x."]
+        response = agent.invoke("look up x")
+        self.assertEqual(response['messages'][-1].content, "Found x.")
+        self.assertEqual(agent.plan_stats, {'plans': 1, 'fallbacks': 1})
+    
+    def test_plan_steps_use_the_error_middleware_and_never_send(self):
+        @tool
+        def send_message(to: str, subject: str, body: str) -> str:
+            """Sends an email."""
+            return "sent"
+        
+        prompts = []
+        
+        def reply(text):
+            def respond(messages):
+                prompts.append(messages)
+                return text
+            return respond
+        
+        plan = json.dumps({"steps": [{"id": "s1", "tool": "broken", "args": {"name": "x"}},
+                                     {"id": "s2", "tool": "combine", "args": {"first": "$s1", "second": "y"}}]})
+        model = ScriptedChatModel(responses=[reply(plan), reply("The lookup failed.")])
+        agent = Agent(model, self.tools + [send_message], "You are a helpful assistant.", mode="plan", warm_up=False)
+        
+        agent.invoke("look up x")
+        self.assertNotIn("send_message", prompts[0][0].content)
+        results = prompts[1][-1].content
+        self.assertIn("error:\nAn error occurred while executing the tool: service down", results)
+        self.assertIn("Not run because step s1 failed.", results)
+        
+        # A plan sending an email is rejected: the tool loop asks for confirmation first
+        model.responses += [json.dumps({"steps": [{"id": "s1", "tool": "send_message",
+                                                   "args": {"to": "a@example.com", "subject": "Hi", "body": "$5"}}]}),
+                            "Here is the draft; shall I send it?"]
+        response = agent.invoke("email alice")
+        self.assertEqual(response['messages'][-1].content, "Here is the draft; shall I send it?")
+        self.assertEqual(agent.plan_stats, {'plans': 1, 'fallbacks': 1})
+
+
+class TestModelRouter(TestCase):
+    
+    def test_classify_turn(self):
+        self.assertEqual(classify_turn("Hi! How are you?"), ('simple', 'chit-chat'))
+        self.assertEqual(classify_turn("What meetings do I have tomorrow?")[0], 'simple')
+        self.assertEqual(classify_turn("Check tomorrow's events, then email Alice the list")[0], 'complex')
+        self.assertEqual(classify_turn("Add a gym session every Tuesday at 7pm")[0], 'complex')
+        self.assertEqual(classify_turn("Email Bob my calendar for Friday")[0], 'complex')
+    
+    def test_routing_and_escalation(self):
+        @tool
+        def get_upcoming_events(max_results: int) -> str:
+            """Retrieves upcoming events from the calendar."""
+            return "10:00 - Standup"
+        
+        small = ScriptedChatModel(responses=[
+            "Hello! How can I help?",
+            tool_call("get_upcoming_event", {"max_results": 5}),  # misspelled tool: escalated
+            "You have a standup at 10:00.",
+        ])
+        large = ScriptedChatModel(responses=[
+            tool_call("get_upcoming_events", {"max_results": 5}),
+            tool_call("get_upcoming_events", {"max_results": 5}),
+            "Standup at 10:00, then I emailed Alice.",
+        ])
+        router = ModelRouter([("small", small), ("large", large)])
+        agent = Agent(large, [get_upcoming_events], "You are a helpful assistant.", router=router)
+        
+        self.assertEqual(agent.get_ai_message(agent.invoke("hi")), "Hello! How can I help?")
+        self.assertIn("standup", agent.invoke("what's coming up?")['messages'][-1].content)
+        self.assertIn("Alice", agent.invoke("check my meetings then email Alice")['messages'][-1].content)
+        
+        stats = router.stats()
+        # The tool result of a simple turn is summarized by the small model again
+        self.assertEqual(len(small.calls), 3)
+        self.assertEqual(len(large.calls), 3)
+        self.assertEqual(stats['escalations'], 1)
+        self.assertAlmostEqual(stats['escalation_rate'], 1 / 3)
+        self.assertEqual(stats['tiers']['large']['calls'], 3)
+        # Counted per turn, not per model call
+        self.assertEqual((stats['simple'], stats['complex']), (2, 1))
+    
+    def test_escalation_rate_with_three_tiers(self):
+        @tool
+        def get_upcoming_events(max_results: int) -> str:
+            """Retrieves upcoming events from the calendar."""
+            return "10:00 - Standup"
+        
+        small = ScriptedChatModel(responses=[tool_call("get_upcoming_event", {"max_results": 5}), "Nothing today."])
+        medium = ScriptedChatModel(responses=[""])
+        large = ScriptedChatModel(responses=["Hello!"])
+        router = ModelRouter([("small", small), ("medium", medium), ("large", large)])
+        agent = Agent(large, [get_upcoming_events], "You are a helpful assistant.", router=router, warm_up=False)
+        
+        agent.invoke("what's coming up?")
+        agent.invoke("thanks")
+        stats = router.stats()
+        # Two escalations out of the three calls that could escalate (small twice, medium once)
+        self.assertEqual(stats['escalations'], 2)
+        self.assertAlmostEqual(stats['escalation_rate'], 2 / 3)
+        self.assertEqual((stats['simple'], stats['complex']), (2, 0))
+
+
+class TestReasoningModes(TestCase):
+    
+    def thinking_answer(self, thinking, answer):
+        return AIMessage(content=answer, additional_kwargs={'reasoning_content': thinking})
+    
+    def test_fast_mode(self):
+        model = ScriptedChatModel(responses=[self.thinking_answer("Greeting.", "Hello!"),
+                                             self.thinking_answer("Two steps.", "Done.")])
+        agent = Agent(model, [], "You are a helpful assistant.", reasoning="fast")
+        
+        self.assertEqual(agent.get_ai_message(agent.invoke("hi there")), "Hello!")
+        agent.invoke("check my calendar then email Bob")
+        self.assertEqual([call['reasoning'] for call in model.calls], [False, True])
+    
+    def test_separate_mode_streams_reasoning_apart(self):
+        model = ScriptedChatModel(responses=[self.thinking_answer("The user greets me, so greet back.", "Hello there!")])
+        agent = Agent(model, [], "You are a helpful assistant.", reasoning="separate")
+        
+        tokens = list(agent.stream_invoke("hi"))
+        answer = "".join(agent.get_ai_message_token(token) or "" for token in tokens)
+        thinking = "".join(agent.get_reasoning_token(token) or "" for token in tokens)
+        self.assertEqual(answer, "Hello there!")
+        self.assertEqual(thinking.strip(), "The user greets me, so greet back.")
+        
+        metrics = agent.reasoning.turn_metrics()
+        self.assertEqual(metrics['reasoning_tokens'], 7)
+        self.assertEqual(metrics['answer_tokens'], 2)
+    
+    def test_default_mode_keeps_inline_thinking(self):
+        model = ScriptedChatModel(responses=[self.thinking_answer("Hmm.", "Hello!")])
+        agent = Agent(model, [], "You are a helpful assistant.")
+        self.assertEqual(agent.get_ai_message(agent.invoke("hi")), "<think>Hmm.</think>Hello!")
+    
+    def test_default_mode_meters_inline_thinking(self):
+        model = ScriptedChatModel(responses=[self.thinking_answer("Let me greet them back.", "Hello there!")])
+        agent = Agent(model, [], "You are a helpful assistant.", warm_up=False)
+        
+        agent.invoke("hi")
+        # Streamed as "<think>Let", "me", "greet", "them", "back.</think>Hello", "there!"
+        metrics = agent.reasoning.turn_metrics()
+        self.assertEqual(metrics['reasoning_tokens'], 5)
+        self.assertEqual(metrics['answer_tokens'], 1)
+    
+    def test_budget_cuts_long_thinking(self):
+        model = ScriptedChatModel(responses=[self.thinking_answer("word " * 50, "Slow answer."),
+                                             "Quick answer."])
+        agent = Agent(model, [], "You are a helpful assistant.", reasoning="separate", reasoning_budget=10)
+        
+        with self.assertNoLogs('langchain_core.callbacks.manager', level='WARNING'):
+            self.assertEqual(agent.get_ai_message(agent.invoke("hi")), "Quick answer.")
+        self.assertEqual([call['reasoning'] for call in model.calls], [True, False])
+        metrics = agent.reasoning.turn_metrics()
+        self.assertEqual(metrics['budget_exceeded'], 1)
+        self.assertEqual(metrics['reasoning_tokens'], 11)
+
+
+class TestLLMBackends(TestCase):
+    
+    def setUp(self):
+        self.server = MockLLMServer().start()
+    
+    def tearDown(self):
+        self.server.stop()
+        close_http_clients()
+    
+    def run_conversation(self, backend, base_url):
+        model = make_chat_model("qwen3:8b", backend=backend, base_url=base_url)
+        agent = Agent(model, TimeTools().get_tools(), "You are a helpful assistant.", reasoning="fast",
+                      warm_up=False)
+        response = agent.invoke("What time is it?")
+        self.assertIn(agent.get_tool_message(response), agent.get_ai_message(response))
+        answer = "".join(agent.get_ai_message_token(token) or "" for token in agent.stream_invoke("Hi!"))
+        self.assertEqual(answer, "Hello! How can I help you today?")
+    
+    def test_ollama_backend(self):
+        self.run_conversation("ollama", self.server.url)
+        self.assertFalse(self.server.last_request['think'])
+    
+    def test_openai_backend(self):
+        self.run_conversation("openai", self.server.url + "/v1")
+        self.assertEqual(self.server.last_request['chat_template_kwargs'], {'enable_thinking': False})
+    
+    def test_connections_are_reused(self):
+        # A tool call turn and a streamed turn: three requests over one kept-alive connection
+        self.run_conversation("ollama", self.server.url)
+        self.assertEqual(self.server.stats['requests'], 3)
+        self.assertEqual(self.server.stats['connections'], 1)
+    
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            make_chat_model("qwen3:8b", backend="tgi")
+
+
+class TestModelWarmer(TestCase):
+    
+    def setUp(self):
+        self.server = MockLLMServer(load_latency=0.2).start()
+        self.model = make_chat_model("qwen3:8b", base_url=self.server.url)
+    
+    def tearDown(self):
+        self.server.stop()
+        close_http_clients()
+    
+    def test_first_turn_is_warm(self):
+        agent = Agent(self.model, TimeTools().get_tools(), "You are a helpful assistant.")
+        self.assertTrue(agent.warmer.wait(timeout=5))
+        agent.invoke("Hi!")
+        agent.close()
+        
+        stats = agent.warmer.stats()
+        self.assertEqual((stats['warmups'], stats['cold_calls'], stats['warm_calls']), (1, 0, 1))
+        self.assertEqual(self.server.stats['loads'], 1)
+        self.assertEqual(self.server.last_request['keep_alive'], 1800)
+        # The warm-up sent the same prompt prefix: system prompt and tool schemas
+        self.assertEqual(self.server.last_request['messages'][0]['content'], "You are a helpful assistant.")
+        self.assertEqual(len(self.server.last_request['tools']), len(TimeTools().get_tools()))
+    
+    def test_cold_first_turn_without_warm_up(self):
+        agent = Agent(self.model, [], "You are a helpful assistant.", warm_up=False)
+        agent.invoke("Hi!")
+        agent.invoke("Hi again!")
+        
+        stats = agent.warmer.stats()
+        self.assertEqual((stats['cold_calls'], stats['warm_calls']), (1, 1))
+        self.assertGreater(stats['cold_first_token'], 0.2)
+        self.assertLess(stats['warm_first_token'], 0.2)
+    
+    def test_heartbeat_keeps_model_loaded(self):
+        agent = Agent(self.model, [], "You are a helpful assistant.", keep_alive=0.4)
+        agent.warmer.wait(timeout=5)
+        time.sleep(1.0)
+        agent.invoke("Hi!")
+        agent.close()
+        
+        self.assertGreaterEqual(agent.warmer.stats()['heartbeats'], 1)
+        self.assertEqual(self.server.stats['loads'], 1)
+    
+    def test_fake_models_are_not_warmed(self):
+        model = ScriptedChatModel(responses=["Hello!"])
+        agent = Agent(model, [], "You are a helpful assistant.")
+        agent.invoke("Hi!")
+        self.assertEqual(len(model.calls), 1)
+
+
+class TestBatchRunner(TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.directory.name, "prompts.jsonl")
+        self.output_path = os.path.join(self.directory.name, "results.jsonl")
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def write_input(self, requests):
+        with open(self.input_path, "w") as f:
+            f.writelines(json.dumps(request) + "\n" for request in requests)
+    
+    def read_output(self):
+        with open(self.output_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
+    def echo_agent(self, count, latency=0.0):
+        def echo(messages):
+            turns = [str(message.content) for message in messages if isinstance(message, HumanMessage)]
+            return " | ".join(turns)
+        return Agent(ScriptedChatModel(responses=[echo] * count, latency=latency), [], "You are a helpful assistant.")
+    
+    def test_requests_run_concurrently_in_separate_sessions(self):
+        self.write_input([{"id": f"r{index}", "prompt": f"question {index}"} for index in range(8)] +
+                         [{"id": "multi", "turns": ["first", "second"]}])
+        summary = run_batch(self.echo_agent(10, latency=0.1), self.input_path, self.output_path, workers=5)
+        
+        self.assertEqual((summary['ok'], summary['error']), (9, 0))
+        self.assertLess(summary['wall_seconds'], 0.5)
+        results = {result['id']: result for result in self.read_output()}
+        self.assertEqual(results['r3']['answer'], "question 3")
+        # Each request only sees its own conversation
+        self.assertEqual(results['multi']['answers'], ["first", "first | second"])
+        self.assertGreaterEqual(summary['p99'], summary['p50'])
+    
+    def test_resume_skips_answered_requests(self):
+        self.write_input([{"id": "r1", "prompt": "one"}, {"id": "r2", "prompt": "two"}, {"id": "r3", "prompt": "three"}])
+        with open(self.output_path, "w") as f:
+            f.write(json.dumps({"id": "r1", "status": "ok", "answer": "one"}) + "\n")
+            f.write(json.dumps({"id": "r2", "status": "error", "error": "timeout"}) + "\n")
+            f.write('{"id": "r3", "sta')  # cut short by the interruption
+        summary = run_batch(self.echo_agent(2), self.input_path, self.output_path)
+        
+        self.assertEqual((summary['ok'], summary['skipped']), (2, 1))
+        with open(self.output_path) as f:
+            lines = f.read().splitlines()
+        answered = [json.loads(line)['id'] for line in lines[3:]]
+        self.assertEqual(sorted(answered), ["r2", "r3"])
+    
+    def test_tool_calls_are_reported(self):
+        agent = Agent(ScriptedChatModel(responses=[tool_call("get_current_time", {}), "It's noon."]),
+                      TimeTools().get_tools(), "You are a helpful assistant.")
+        self.write_input([{"request_id": "t1", "body": "What time is it?"}])
+        run_batch(agent, self.input_path, self.output_path, prompt_field="body")
+        
+        result = self.read_output()[0]
+        self.assertEqual((result['id'], result['answer'], result['tools']), ("t1", "It's noon.", ["get_current_time"]))
+    
+    def test_build_agent_shares_the_chatbot_setup(self):
+        import ai_chatbot
+        from batch_runner import build_agent
+        roots = os.path.join(self.directory.name, "files")
+        os.mkdir(roots)
+        settings = {"CALENDAR_MIRROR": "0", "FILE_INDEX_ROOTS": roots, "DOCUMENT_ROOTS": ""}
+        with patch.dict(os.environ, settings), \
+             patch.object(ai_chatbot, 'get_file_path', lambda name: os.path.join(self.directory.name, name)), \
+             patch.object(CalendarTools, 'get_calendar_service', return_value=MagicMock()), \
+             patch.object(MailTools, 'get_mail_service', return_value=MagicMock()), \
+             patch.object(ai_chatbot, 'load_chat_model', return_value=ScriptedChatModel(responses=[])):
+            agent, toolkits = build_agent()
+        
+        names = {tool.name for tool in agent.tools}
+        self.assertTrue({"add_event_to_calendar", "get_current_time", "find_files"} <= names)
+        self.assertIs(toolkits['file_system'].file_index, toolkits['file_index'])
+        self.assertIsNone(toolkits['document_index'])
+        agent.close()
+        ai_chatbot.close_tools(toolkits)
+        self.assertIsNone(toolkits['mail'].outbox)
+        self.assertFalse(toolkits['file_index']._thread.is_alive())
+
+
+class TestFileIndex(TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = os.path.join(self.directory.name, "home")
+        self.db_path = os.path.join(self.directory.name, "index.db")
+        self.make_file("work/meetings/Meeting Notes 2026-01.md", age_days=40)
+        self.make_file("work/meetings/meeting notes 2026-03.md", age_days=2)
+        self.make_file("work/budget_2026.xlsx", age_days=5)
+        self.make_file("photos/notes.jpg", age_days=1)
+        self.make_file("node_modules/notes.js")
+    
+    def make_file(self, relative_path, age_days=0):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("x")
+        mtime = time.time() - age_days * 86400
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def names(self, rows):
+        return [os.path.basename(path) for path, *_ in rows]
+    
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+    
+    def test_search_filters(self):
+        index = FileIndex(self.db_path, [self.root])
+        index.build()
+        
+        self.assertEqual(self.names(index.search("NOTES")),
+                         ["notes.jpg", "meeting notes 2026-03.md", "Meeting Notes 2026-01.md"])
+        self.assertEqual(self.names(index.search("meeting notes", modified_within_days=7)), ["meeting notes 2026-03.md"])
+        self.assertEqual(self.names(index.search(pattern="*notes*.MD")),
+                         ["meeting notes 2026-03.md", "Meeting Notes 2026-01.md"])
+        self.assertEqual(self.names(index.search(extensions=["xlsx", ".jpg"])), ["notes.jpg", "budget_2026.xlsx"])
+        # _ and % are literal characters, not wildcards
+        self.assertEqual(self.names(index.search("t_2")), ["budget_2026.xlsx"])
+        self.assertEqual(self.names(index.search("meet", folders_only=True)), ["meetings"])
+        self.assertEqual(index.search("node_modules"), [])
+    
+    def test_rebuild_and_restart_catch_up_with_changes(self):
+        index = FileIndex(self.db_path, [self.root], use_inotify=False)
+        index.build()
+        os.remove(os.path.join(self.root, "photos", "notes.jpg"))
+        self.make_file("work/new/deep/notes.txt")
+        index.poll()
+        self.assertEqual(self.names(index.search("notes", extensions=["txt", "jpg"])), ["notes.txt"])
+        
+        self.make_file("late notes.txt")
+        index = FileIndex(self.db_path, [self.root], use_inotify=False)
+        index.start()
+        self.addCleanup(index.close)
+        self.assertTrue(self.wait_for(lambda: "late notes.txt" in self.names(index.search("late"))))
+    
+    def test_inotify_keeps_the_index_current(self):
+        index = FileIndex(self.db_path, [self.root])
+        index.start()
+        self.addCleanup(index.close)
+        self.assertTrue(self.wait_for(lambda: index.count() == 7 and not index.building))
+        if index.mode != 'inotify':
+            self.skipTest("inotify is not available")
+        
+        self.make_file("new/deep/quarterly notes.txt")
+        os.rename(os.path.join(self.root, "work"), os.path.join(self.root, "archive"))
+        os.remove(os.path.join(self.root, "photos", "notes.jpg"))
+        
+        def updated():
+            return sorted(path[len(self.root):] for path, *_ in index.search("notes")) == [
+                "/archive/meetings/Meeting Notes 2026-01.md", "/archive/meetings/meeting notes 2026-03.md",
+                "/new/deep/quarterly notes.txt"]
+        self.assertTrue(self.wait_for(updated))
+    
+    def test_overflow_catches_up_with_deep_changes(self):
+        from file_index import _IN_Q_OVERFLOW
+        index = FileIndex(self.db_path, [self.root], use_inotify=False)
+        index.build()
+        self.make_file("work/meetings/b/newnote.txt")
+        self.make_file("work/meetings/othernote.txt")
+        os.remove(os.path.join(self.root, "photos", "notes.jpg"))
+        
+        # The kernel dropped the events of these changes and only reports that it did
+        index._handle_events([(-1, _IN_Q_OVERFLOW, "")])
+        self.assertEqual(self.names(index.search("newnote")), ["newnote.txt"])
+        self.assertEqual(self.names(index.search("othernote")), ["othernote.txt"])
+        self.assertEqual(index.search("notes", extensions=["jpg"]), [])
+    
+    def test_find_files_tool(self):
+        self.assertEqual(FileSystemTools().find_files_impl("notes"), "Error: No file index is configured.")
+        index = FileIndex(self.db_path, [self.root])
+        index.build()
+        file_system_tools = FileSystemTools(file_index=index)
+        self.assertIn("find_files", [tool_callable.name for tool_callable in file_system_tools.get_tools()])
+        
+        result = file_system_tools.find_files_impl("budget").splitlines()
+        self.assertEqual(result[0], "1 most recently modified matches:")
+        self.assertTrue(result[1].startswith(os.path.join(self.root, "work", "budget_2026.xlsx") + "  1 B  "))
+        self.assertEqual(file_system_tools.find_files_impl("quarterly"), "No files found.")
+
+
+class TestDocumentIndex(TestCase):
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "documents")
+        self.index_dir = os.path.join(directory.name, "index")
+        os.makedirs(os.path.join(self.root, "travel"))
+        self.write("budget.md", "# Finance\n\nThe Q3 budget for marketing was cut by 10 percent after the board review.\n")
+        self.write("travel/lisbon.txt", "Packing list for the Lisbon trip: passport, charger, sunscreen.\n"
+                                        "The flight leaves on Tuesday at 7am.\n")
+        self.write("recipes.txt", " ".join(f"filler{index}" for index in range(2000)) +
+                   "\nGrandma's secret lemon cake: butter, sugar, three lemons.\n")
+        self.write("photo.jpg", "\0\0\0 lemon")
+    
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(content)
+    
+    def test_chunks_overlap_and_keep_line_numbers(self):
+        text = "".join(f"line {index} " + "word " * 30 + "\n" for index in range(1, 101))
+        chunks = chunk_text(text, chunk_chars=1000, overlap_chars=200)
+        self.assertGreater(len(chunks), 15)
+        self.assertTrue(all(len(chunk) <= 1000 for _, chunk in chunks))
+        lines = text.splitlines()
+        for line, chunk in chunks:
+            # Each chunk starts within the line it reports
+            self.assertIn(chunk.splitlines()[0], lines[line - 1])
+        # Consecutive chunks overlap
+        self.assertIn(chunks[0][1][-50:].split()[-1], chunks[1][1])
+    
+    def test_search_finds_the_relevant_passage(self):
+        index = DocumentIndex(self.index_dir, [self.root])
+        self.assertEqual(index.refresh(), {'added': 3, 'updated': 0, 'removed': 0})
+        
+        score, path, line, text = index.search("how much was the marketing budget cut")[0]
+        self.assertEqual(os.path.basename(path), "budget.md")
+        self.assertIn("cut by 10 percent", text)
+        self.assertEqual(os.path.basename(index.search("when does the flight leave")[0][1]), "lisbon.txt")
+        # The passage of a long file, not just the file
+        passage = index.search("lemon cake", k=1)[0]
+        self.assertIn("secret lemon cake", passage[3])
+        self.assertEqual(index.search("zebra"), [])
+    
+    def test_refresh_is_incremental_and_persistent(self):
+        index = DocumentIndex(self.index_dir, [self.root])
+        index.refresh()
+        chunks = index.count()
+        os.remove(os.path.join(self.root, "travel", "lisbon.txt"))
+        self.write("budget.md", "The Q4 budget for hiring doubled.\n")
+        self.assertEqual(index.refresh(), {'added': 0, 'updated': 1, 'removed': 1})
+        self.assertEqual(index.count(), chunks - 1)
+        self.assertEqual(index.search("flight"), [])
+        index.close()
+        
+        # Freed rows are reused, and a reopened index needs no work
+        index = DocumentIndex(self.index_dir, [self.root])
+        self.assertEqual(index.refresh(), {'added': 0, 'updated': 0, 'removed': 0})
+        self.assertIn("Q4 budget", index.search("hiring budget")[0][3])
+        self.write("travel/porto.txt", "Porto trip: the train leaves at noon.\n")
+        index.refresh()
+        self.assertEqual(index._rows, chunks)
+    
+    def test_search_documents_tool(self):
+        self.assertEqual(FileSystemTools().search_documents_impl("budget"), "Error: No document index is configured.")
+        index = DocumentIndex(self.index_dir, [self.root])
+        index.refresh()
+        tools = FileSystemTools(document_index=index)
+        self.assertIn("search_documents", [tool_callable.name for tool_callable in tools.get_tools()])
+        
+        result = tools.search_documents_impl("marketing budget", max_results=1).splitlines()
+        self.assertEqual(result[0], "1 most relevant passages:")
+        self.assertTrue(result[2].startswith(f"[{os.path.join(self.root, 'budget.md')}, line 1, score "))
+        self.assertEqual(tools.search_documents_impl("zebra"), "No passages found for 'zebra'.")
+
+
+class TestDiskUsage(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for project in range(3):
+            for part in range(4):
+                folder = os.path.join(self.root, f"project{project}", f"part{part}")
+                os.makedirs(folder)
+                for index in range(5):
+                    with open(os.path.join(folder, f"file{index}.bin"), "wb") as f:
+                        f.write(b"x" * (1000 * (project + 1)))
+
+    def test_totals_and_largest_children(self):
+        usage = DiskUsage(workers=4).usage(self.root, top=2)
+        self.assertEqual((usage['size'], usage['files'], usage['folders']), (120_000, 60, 15))
+        self.assertEqual(usage['children'], [("project2", True, 60_000, 20), ("project1", True, 40_000, 20)])
+        self.assertEqual(usage['rest'], (1, 20_000))
+        self.assertEqual(usage['listed'], 16)
+
+    def test_only_changed_directories_are_listed_again(self):
+        disk_usage = DiskUsage()
+        disk_usage.usage(self.root)
+        self.assertEqual(disk_usage.usage(self.root)['listed'], 0)
+
+        with open(os.path.join(self.root, "project0", "part3", "new.bin"), "wb") as f:
+            f.write(b"x" * 50_000)
+        usage = disk_usage.usage(self.root)
+        self.assertEqual(usage['listed'], 1)
+        self.assertEqual(usage['size'], 170_000)
+        self.assertEqual(usage['children'][0], ("project0", True, 70_000, 21))
+
+        disk_usage.max_age = 0
+        self.assertEqual(disk_usage.usage(os.path.join(self.root, "project1"))['listed'], 5)
+
+
+class TestBenchAgent(TestCase):
+    def test_find_regressions(self):
+        from bench_agent import find_regressions
+        baseline = {'turn_ms.chat': 4.0, 'dispatch_ms.tool_wrapper': 0.2, 'memory_kb.per_turn': 100.0}
+        results = {'turn_ms.chat': 7.0, 'dispatch_ms.tool_wrapper': 0.6, 'memory_kb.per_turn': 120.0,
+                   'turn_ms.new_metric': 50.0}
+        regressions = find_regressions(results, baseline, tolerance=0.5)
+        # The wrapper tripled, but by less than the noise floor; memory grew within tolerance
+        self.assertEqual(regressions, ["turn_ms.chat: 7.00 ms, baseline 4.00 ms (+75%)"])
+        self.assertEqual(find_regressions(results, baseline, tolerance=1.0), [])
+
+    def test_session_runs_tools_on_fake_services(self):
+        from bench_agent import SCENARIOS, Session
+        with tempfile.TemporaryDirectory() as directory:
+            session = Session(directory)
+            try:
+                for _, user_input, replies in SCENARIOS:
+                    session.turn(user_input, replies, thread_id="test")
+                history = session.agent._history("test")
+            finally:
+                session.close()
+        results = [message.content for message in history if isinstance(message, ToolMessage)]
+        self.assertIn("2026-01-21T15:00:00Z - Design review - ID: e21", results[0])
+        self.assertIn("Subject: Project update 0", results[1])
+        self.assertTrue(results[3].startswith("Event created: https://calendar.example.com/event"))
+        self.assertIn("QUEUE_ID", results[5])
+        self.assertEqual(history[-1].content, "I emailed Alice your schedule for January 21.")
+        self.assertIn("Lunch with Alice", [event['summary'] for event in session.calendar.events_by_id.values()])
+
+
+class TestLoadTest(TestCase):
+    def test_levels_report_latency_and_throughput(self):
+        from load_test import run_load_test
+        results = run_load_test([1, 3], turns=2, token_rate=2000, think_time=0.0, pause=0.0, answer_tokens=10,
+                                report=lambda result: None)
+        self.assertEqual([result['sessions'] for result in results], [1, 3])
+        for result in results:
+            self.assertEqual((result['turns'], result['errors']), (2 * result['sessions'], 0))
+            self.assertLessEqual(result['ttft'][0], result['latency'][0])
+            self.assertGreater(result['tokens_per_second'], 0)
+            self.assertGreater(result['rss'], 0)
+
+    def test_rss_without_proc_or_resource(self):
+        from load_test import current_rss
+        # As on Windows: no /proc and no resource module
+        with patch('builtins.open', side_effect=OSError), patch.dict(sys.modules, {'resource': None}):
+            self.assertEqual(current_rss(), 0)
+        with patch('builtins.open', side_effect=OSError):
+            self.assertGreater(current_rss(), 0)
+
+
+class TestGoogleReplay(TestCase):
+    def setUp(self):
+        from fakes import FakeCalendarService, FakeGmailService
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.events = [{'id': f"e{index}", 'summary': f"Meeting {index}", 'description': "Agenda " * 20,
+                        'organizer': {'email': 'alice.smith@example.com'},
+                        'start': {'dateTime': f"2026-01-{10 + index % 20}T10:00:00Z", 'timeZone': 'UTC'},
+                        'end': {'dateTime': f"2026-01-{10 + index % 20}T11:00:00Z", 'timeZone': 'UTC'}}
+                       for index in range(120)]
+        self.calendar = FakeCalendarService(self.events)
+        self.gmail = FakeGmailService([("bob@example.com", "Quarterly report")])
+
+    def record(self, name, service_name, version, work, **fakes):
+        from googleapiclient.discovery import build
+        from fakes import FakeGoogleHttp
+        from google_replay import RecordingHttp
+        live = FakeGoogleHttp(**fakes)
+        recorder = RecordingHttp(live, os.path.join(self.directory, f"{name}.jsonl"))
+        return work(build(service_name, version, http=recorder))
+
+    def replay(self, name, service_name, version, work, **options):
+        from googleapiclient.discovery import build
+        from google_replay import ReplayHttp
+        http = ReplayHttp(os.path.join(self.directory, f"{name}.jsonl"), **options)
+        return work(build(service_name, version, http=http)), http
+
+    def list_and_batch(self, service):
+        pages, page_token = [], None
+        while True:
+            response = service.events().list(calendarId='primary', maxResults=50, pageToken=page_token).execute()
+            pages.append(response['items'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        created = []
+        batch = service.new_batch_http_request(callback=lambda request_id, event, error: created.append(event['id']))
+        for index in range(3):
+            batch.add(service.events().insert(calendarId='primary', body={
+                'summary': f"New {index}", 'start': {'dateTime': "2026-02-01T10:00:00Z"},
+                'end': {'dateTime': "2026-02-01T11:00:00Z"}}))
+        batch.execute()
+        return pages, created
+
+    def test_replay_serves_recorded_pages_and_batches_at_their_size(self):
+        recorded_pages, recorded_created = self.record("calendar", "calendar", "v3", self.list_and_batch,
+                                                       calendar=self.calendar)
+        (pages, created), http = self.replay("calendar", "calendar", "v3", self.list_and_batch)
+
+        self.assertEqual([len(page) for page in pages], [50, 50, 20])
+        self.assertEqual(created, recorded_created)
+        self.assertEqual([event['id'] for page in pages for event in page],
+                         [event['id'] for page in recorded_pages for event in page])
+        # Pseudonyms keep the size of each payload, and an address always gets the same one
+        self.assertEqual(len(json.dumps(pages)), len(json.dumps(recorded_pages)))
+        self.assertEqual(len({event['organizer']['email'] for page in pages for event in page}), 1)
+        self.assertEqual(http.stats['requests'], 4)
+        with open(os.path.join(self.directory, "calendar.jsonl")) as f:
+            self.assertNotIn("alice.smith@example.com", f.read())
+
+    def test_scrubbing_keeps_lengths_and_drops_credentials(self):
+        from google_replay import request_key, scrub
+        data = b'{"from": "Bob.Jones@mail.example.org", "raw": "SGVsbG8gQm9i", "to": "bob.jones@mail.example.org"}'
+        scrubbed = scrub(data, patterns=[re.compile(rb"Hello \w+")])
+        self.assertEqual(len(scrubbed), len(data))
+        self.assertNotIn(b"jones", scrubbed.lower())
+        self.assertIn(b'"raw": "AAAAAAAAAAAA"', scrubbed)
+        self.assertEqual(json.loads(scrubbed)['from'], json.loads(scrubbed)['to'])
+
+        # A messages.get answer: the snippet, the names and the subject go, the addresses get pseudonyms
+        message = json.dumps({'id': "m1", 'snippet': "Hi Bob, the Q3 budget is \"tight\" this year, café at 10?",
+                              'payload': {'headers': [
+                                  {'name': "From", 'value': '"Bob Jones" <bob.jones@mail.example.org>'},
+                                  {'name': "Subject", 'value': "Budget café"},
+                                  {'name': "Date", 'value': "Mon, 1 Jun 2026 10:00:00 +0000"}]}}).encode()
+        scrubbed = scrub(message)
+        self.assertEqual(len(scrubbed), len(message))
+        parsed = json.loads(scrubbed)
+        self.assertNotIn("budget", json.dumps(parsed).lower())
+        self.assertNotIn("Bob", json.dumps(parsed))
+        sender, subject, date = (header['value'] for header in parsed['payload']['headers'])
+        self.assertRegex(sender, r'^"xxx xxxxx" <[a-z]{3}\.[a-z]{5}@[a-z]{4}\.[a-z]{7}\.[a-z]{3}>$')
+        self.assertEqual(subject, "xxxxxx xxxxxxxxx")
+        self.assertEqual(date, "Mon, 1 Jun 2026 10:00:00 +0000")
+        self.assertEqual(scrub(json.dumps({'summary': "Dentist", 'location': "Via Roma 1"}).encode()),
+                         b'{"summary": "xxxxxxx", "location": "xxxxxxxxxx"}')
+
+        key = request_key("GET", "https://www.googleapis.com/calendar/v3/calendars/me%40example.com/events"
+                                 "?maxResults=5&access_token=secret&alt=json")
+        self.assertNotIn("secret", key[1])
+        self.assertNotIn("me@example.com", key[1])
+        self.assertTrue(key[1].endswith("/events?alt=json&maxResults=5"))
+        first = b'--===============123==\r\nContent-ID: <0c6e8b3c-1d2e-4f5a-8b9c-0d1e2f3a4b5c + 1>\r\n'
+        second = b'--===============987==\r\nContent-ID: <9f8e7d6c-5b4a-3928-1706-f5e4d3c2b1a0 + 1>\r\n'
+        self.assertEqual(request_key("POST", "/batch/calendar/v3", first),
+                         request_key("POST", "/batch/calendar/v3", second))
+
+    def test_replay_latency_and_unrecorded_requests(self):
+        self.calendar.latency = 0.05
+        get = lambda service: service.events().get(calendarId='primary', eventId='e1').execute()
+        self.record("calendar", "calendar", "v3", get, calendar=self.calendar)
+
+        start = time.perf_counter()
+        event, _ = self.replay("calendar", "calendar", "v3", get)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(event['summary'], "x" * len("Meeting 1"))
+        start = time.perf_counter()
+        self.replay("calendar", "calendar", "v3", get, latency=1.0)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        with self.assertRaises(LookupError):
+            self.replay("calendar", "calendar", "v3",
+                        lambda service: service.events().get(calendarId='primary', eventId='e2').execute())
+
+    def test_tools_replay_from_the_environment_without_credentials(self):
+        self.record("gmail", "gmail", "v1", lambda service: MailTools.get_latest_emails_impl(
+            type("Tools", (), {'mail_service': service})(), 1), gmail=self.gmail)
+        with patch.dict(os.environ, {'GOOGLE_API_REPLAY': self.directory}):
+            tool = MailTools(outbox_path=os.path.join(self.directory, "outbox.db"))
+        result = tool.get_latest_emails_impl(1)
+        self.assertTrue(result.startswith("Message ID: msg0, From: "))
+        self.assertRegex(result, r", Subject: [x ]{16}$")
+        self.assertNotIn("bob@example.com", result)
+
+
 class TestAgent(TestCase):
     
     def test_invoke(self):
@@ -1,9 +1,16 @@
 import base64
+import fnmatch
+import hashlib
+import heapq
 import mimetypes
 import os
 import os.path
+import re
+import secrets
 import subprocess
 import sys
+import threading
+import time
 
 from email.message import EmailMessage
 from google.auth.transport.requests import Request
@@ -20,43 +27,430 @@ from email.mime.text import MIMEText
 
 
 from langchain.tools import tool
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
 from dateutil import tz
+from dateutil.parser import isoparse
 
 from dotenv import load_dotenv
-from utils import get_file_path, resolve_relative_date, build_file_part
+from utils import get_file_path, resolve_relative_date, build_file_part, get_zone, local_day_window, format_size, \
+    walk_parallel
+from outbox import Outbox
+from google_replay import recording_http, replay_http
+from file_reader import CHARS_PER_TOKEN, FileReader
+from content_search import ContentSearcher
+from disk_usage import DiskUsage
+from calendar_mirror import CalendarMirror, event_timestamp
+from scheduling import IntervalIndex, daily_windows
+from ics import iter_vevents, vevent_to_event
+from recurrence import RecurrenceEngine
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Partial response for event listings: only the parts the calendar tools read
+EVENT_LIST_FIELDS = "nextPageToken,items(id,etag,summary,start,end)"
+
+# Limits of a folder listing returned to the model: entries per page and characters
+MAX_LISTING_ENTRIES = 500
+MAX_LISTING_CHARS = 8000
+
+# Files deleted by one confirmed remove_tree/remove_matching call, and seconds a dry-run preview stays valid
+MAX_REMOVE_FILES = 5000
+REMOVAL_PLAN_TTL = 600
+
+# Paths deleted per thread pool task by remove_tree and remove_matching
+REMOVE_CHUNK = 256
+
+# Largest token budget of one read_file_content call, and largest byte range
+MAX_READ_TOKENS = 8000
+MAX_READ_BYTES = 4096
+
+# Requests per Calendar API batch call (the API accepts up to 1000, 50 is the recommended size)
+CALENDAR_BATCH_SIZE = 50
+
 #Abstract tools class to define common behavior for all tool
 class Tools:
+    # Name of the Google API client the tools share, if any. The client isn't thread-safe,
+    # so tools tagged with the same service must not run concurrently.
+    service = None
+    
     def get_tools(self):
         pass
+    
+    def _tag_service(self, tools):
+        """Records the class's service in each tool's metadata."""
+        for tool_callable in tools:
+            tool_callable.metadata = {**(tool_callable.metadata or {}), 'service': self.service}
+        return tools
 
 class FileSystemTools(Tools):
-    def show_folder_contents_impl(self, folder_path: str) -> str:
-        """Implementation for showing folder contents."""
+    def __init__(self, file_index=None, document_index=None):
+        # Optional FileIndex of the user's folders, which enables find_files
+        self.file_index = file_index
+        # Optional DocumentIndex of the user's text documents, which enables search_documents
+        self.document_index = document_index
+        # Remembers where the last windows of recently read files ended, for "show me more"
+        self.file_reader = FileReader()
+        # Its worker processes start on the first content search
+        self.content_searcher = ContentSearcher()
+        # Caches the listings of the folders measured by disk_usage, by directory mtime
+        self.disk_usage = DiskUsage()
+        # Dry-run previews of remove_tree/remove_matching awaiting confirmation, by token
+        self._removal_plans = OrderedDict()
+        self._removal_lock = threading.Lock()
+    
+    def close(self):
+        """Stops the content search workers."""
+        self.content_searcher.close()
+    
+    def _scan_folder(self, folder_path: str, pattern: str = None, extensions: list[str] = None):
+        """Yields the entries of a folder matching the filters, reading it lazily."""
+        matches = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match if pattern else None
+        extensions = tuple('.' + extension.lower().lstrip('.') for extension in extensions) if extensions else None
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if matches and not matches(entry.name):
+                    continue
+                if extensions and (not entry.name.lower().endswith(extensions) or self._is_dir(entry)):
+                    continue
+                yield entry
+    
+    def _is_dir(self, entry) -> bool:
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+    
+    def _entry_stat(self, entry):
+        """Returns (size, mtime) of a directory entry; broken links report their own stat."""
+        try:
+            stat = entry.stat()
+        except OSError:
+            stat = entry.stat(follow_symlinks=False)
+        return stat.st_size, stat.st_mtime
+    
+    def _sort_key(self, sort_by: str):
+        if sort_by == "name":
+            return lambda entry: entry.name.lower()
+        def stat_key(entry):
+            # Directories sort as empty by size
+            if sort_by == "size" and self._is_dir(entry):
+                return 0
+            try:
+                size, mtime = self._entry_stat(entry)
+            except OSError:
+                return 0
+            return size if sort_by == "size" else mtime
+        return stat_key
+    
+    def _format_entry(self, entry, details: bool) -> str:
+        is_dir = self._is_dir(entry)
+        name = entry.name + ('/' if is_dir else '')
+        if not details:
+            return name
+        try:
+            size, mtime = self._entry_stat(entry)
+        except OSError:
+            return f"{name}  ?  ?"
+        modified = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M")
+        return f"{name}  {'-' if is_dir else format_size(size)}  {modified}"
+    
+    def show_folder_contents_impl(self, folder_path: str, pattern: str = None, extensions: list[str] = None,
+                                  sort_by: str = "name", descending: bool = False, offset: int = 0,
+                                  limit: int = 50, details: bool = False) -> str:
+        """Implementation for showing folder contents, one page at a time.
+        
+        Entries are streamed with os.scandir and only the first offset + limit in sort order are kept
+        (a heap, not a full sort), so large folders cost neither memory nor model context.
+        """
         if not os.path.exists(folder_path):
             return f"Error: The folder '{folder_path}' does not exist."
         if not os.path.isdir(folder_path):
             return f"Error: '{folder_path}' is not a directory."
+        if sort_by not in ("name", "size", "mtime"):
+            return f"Error: sort_by must be 'name', 'size' or 'mtime'. Got: {sort_by}"
+        offset = max(0, offset)
+        limit = max(1, min(limit, MAX_LISTING_ENTRIES))
         try:
-            items = os.listdir(folder_path)
-            if not items:
-                return "The folder is empty."
-            return "\n".join(items)
+            total = 0
+            def counted(entries):
+                nonlocal total
+                for item in entries:
+                    total += 1
+                    yield item
+            
+            select = heapq.nlargest if descending else heapq.nsmallest
+            entries = counted(self._scan_folder(folder_path, pattern, extensions))
+            page = select(offset + limit, entries, key=self._sort_key(sort_by))[offset:]
+            
+            if total == 0:
+                return "No entries match the filters." if pattern or extensions else "The folder is empty."
+            if not page:
+                return f"No entries after offset {offset}: the folder has {total} matching entries."
+            
+            lines = []
+            size = 0
+            for entry in page:
+                line = self._format_entry(entry, details)
+                size += len(line) + 1
+                if size > MAX_LISTING_CHARS:
+                    break
+                lines.append(line)
+            shown_end = offset + len(lines)
+            header = f"Entries {offset + 1}-{shown_end} of {total}, sorted by {sort_by}" + \
+                (" (descending)" if descending else "") + (":" if shown_end >= total else
+                                                           f". Use offset={shown_end} for the next ones:")
+            return header + "\n" + "\n".join(lines)
         except Exception as e:
             return f"An error occurred: {str(e)}"
         
     def show_folder_contents_tool(self):
             """Creates a tool wrapper for showing folder contents."""
             @tool
-            def show_folder_contents(folder_path: str) -> str:
-                """Shows the contents of the specified folder."""
-                return self.show_folder_contents_impl(folder_path)
+            def show_folder_contents(folder_path: str, pattern: str = None, extensions: list[str] = None,
+                                     sort_by: str = "name", descending: bool = False, offset: int = 0,
+                                     limit: int = 50, details: bool = False) -> str:
+                """Shows the contents of the specified folder, one page of up to limit entries (max 500).
+                pattern filters names with wildcards (e.g. '*report*'), extensions keeps files with the
+                given extensions (e.g. ['pdf', 'docx']). sort_by is 'name', 'size' or 'mtime' (modification
+                time); set descending=True for the largest or most recent first. details=True adds size and
+                modification date. Use offset to see the next page. Folders end with '/'."""
+                return self.show_folder_contents_impl(folder_path, pattern, extensions, sort_by, descending,
+                                                      offset, limit, details)
             return show_folder_contents
     
+    def find_files_impl(self, query: str = None, pattern: str = None, extensions: list[str] = None,
+                        modified_within_days: float = None, folders_only: bool = False, limit: int = 20) -> str:
+        """Implementation for finding files by name in the file index."""
+        if self.file_index is None:
+            return "Error: No file index is configured."
+        if not (query or pattern or extensions or modified_within_days is not None):
+            return "Error: Give a query, a pattern, extensions or modified_within_days."
+        limit = max(1, min(limit, MAX_LISTING_ENTRIES))
+        try:
+            rows = self.file_index.search(query, pattern, extensions, modified_within_days, folders_only, limit)
+            note = " (the index is still being built, results may be incomplete)" if self.file_index.building else ""
+            if not rows:
+                return f"No files found{note}."
+            lines = []
+            size = 0
+            for line in self.file_index.format_results(rows).split("\n"):
+                size += len(line) + 1
+                if size > MAX_LISTING_CHARS:
+                    break
+                lines.append(line)
+            return f"{len(lines)} most recently modified matches{note}:\n" + "\n".join(lines)
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def find_files_tool(self):
+            """Creates a tool wrapper for finding files in the file index."""
+            @tool
+            def find_files(query: str = None, pattern: str = None, extensions: list[str] = None,
+                           modified_within_days: float = None, folders_only: bool = False, limit: int = 20) -> str:
+                """Finds files and folders by name anywhere in the user's indexed folders, in one call,
+                without browsing folder by folder. query holds words the name must contain (case-insensitive,
+                e.g. 'meeting notes'), pattern a wildcard the whole name must match (e.g. '*invoice*.pdf'),
+                extensions the file extensions to keep (e.g. ['pdf', 'docx']). modified_within_days keeps
+                recently modified entries. Results are full paths with size and modification date, most
+                recently modified first. Folders end with '/'."""
+                return self.find_files_impl(query, pattern, extensions, modified_within_days, folders_only, limit)
+            return find_files
+    
+    def read_file_content_impl(self, file_path: str, start_line: int = 1, end_line: int = None,
+                               byte_offset: int = None, byte_count: int = 1024, max_tokens: int = 2000) -> str:
+        """Implementation for reading part of a file: a range of lines, or of bytes when byte_offset is given."""
+        if not os.path.exists(file_path):
+            return f"Error: The file '{file_path}' does not exist."
+        if os.path.isdir(file_path):
+            return f"Error: '{file_path}' is a folder. Use show_folder_contents to list it."
+        max_tokens = max(1, min(max_tokens, MAX_READ_TOKENS))
+        try:
+            if byte_offset is not None:
+                byte_count = max(1, min(byte_count, MAX_READ_BYTES))
+                data, size = self.file_reader.read_bytes(file_path, max(0, byte_offset), byte_count)
+                if not data:
+                    return f"No bytes after offset {byte_offset}: the file has {format_size(size)} ({size} bytes)."
+                end = byte_offset + len(data)
+                header = f"Bytes {byte_offset}-{end - 1} of {size}" + \
+                    (":" if end >= size else f". Use byte_offset={end} for the next ones:")
+                encoding = self.file_reader.encoding(file_path)
+                if encoding is None:
+                    body = "\n".join(data[index:index + 32].hex(" ") for index in range(0, len(data), 32))
+                else:
+                    body = data.decode(encoding, errors="replace")
+                return header + "\n" + body
+            
+            window = self.file_reader.read_lines(file_path, start_line, end_line, max_tokens * CHARS_PER_TOKEN)
+            if not window['last_line']:
+                if window['size'] == 0:
+                    return "The file is empty."
+                return f"No lines from line {start_line}: the file has {window['total_lines']} lines."
+            total = f" of {window['total_lines']}" if window['total_lines'] is not None else ""
+            header = f"Lines {window['first_line']}-{window['last_line']}{total} " \
+                f"({format_size(window['size'])}, {window['encoding']})" + \
+                (":" if window['next_line'] is None else f". Use start_line={window['next_line']} for more:")
+            return header + "\n" + window['text']
+        except ValueError as e:
+            return (f"Error: '{file_path}' can't be shown as text ({str(e)}). "
+                    "Use byte_offset to see its raw bytes, or open_file to open it.")
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def read_file_content_tool(self):
+            """Creates a tool wrapper for reading file contents."""
+            @tool
+            def read_file_content(file_path: str, start_line: int = 1, end_line: int = None,
+                                  byte_offset: int = None, byte_count: int = 1024, max_tokens: int = 2000) -> str:
+                """Reads the text of a file, from start_line to end_line (1-based; the whole file if end_line
+                is not set), within max_tokens (max 8000). The first line says which lines were read and which
+                start_line continues. Works on files of any size. Binary files are refused unless byte_offset
+                is given, which shows byte_count raw bytes (max 4096) from that offset instead."""
+                return self.read_file_content_impl(file_path, start_line, end_line, byte_offset, byte_count,
+                                                   max_tokens)
+            return read_file_content
+    
+    def search_file_contents_impl(self, folder_path: str, query: str, regex: bool = False,
+                                  case_sensitive: bool = False, extensions: list[str] = None,
+                                  context_lines: int = 1, max_results: int = 50) -> str:
+        """Implementation for searching text inside the files of a folder tree."""
+        if not os.path.exists(folder_path):
+            return f"Error: The folder '{folder_path}' does not exist."
+        if not os.path.isdir(folder_path):
+            return f"Error: '{folder_path}' is not a directory."
+        if not query:
+            return "Error: The query is empty."
+        context_lines = max(0, min(context_lines, 5))
+        max_results = max(1, min(max_results, MAX_LISTING_ENTRIES))
+        try:
+            lines, files, found, size = [], 0, 0, 0
+            current, shown_until = None, 0  # file of the previous match, and its last line shown
+            truncated = False
+            for path, line_number, line, before, after in self.content_searcher.search(
+                    folder_path, query, regex, not case_sensitive, extensions, context_lines, max_results):
+                if path != current:
+                    block, shown_until = [path], 0
+                else:
+                    block = []
+                    # A match within the previous match's trailing context replaces those context lines
+                    while shown_until >= line_number:
+                        size -= len(lines.pop()) + 1
+                        shown_until -= 1
+                first = line_number - len(before)
+                block += [f"  {first + index}- {text}" for index, text in enumerate(before)
+                          if first + index > shown_until]
+                block.append(f"  {line_number}: {line}")
+                block += [f"  {line_number + 1 + index}- {text}" for index, text in enumerate(after)]
+                size += sum(len(text) + 1 for text in block)
+                if size > MAX_LISTING_CHARS:
+                    truncated = True
+                    break
+                if path != current:
+                    files += 1
+                    current = path
+                lines += block
+                shown_until = line_number + len(after)
+                found += 1
+            
+            if not found:
+                return f"No matches for '{query}' in {folder_path}."
+            capped = truncated or found >= max_results
+            header = f"{found} matches in {files} files" + \
+                (" (search stopped at the result cap; narrow it with extensions or a more specific query)"
+                 if capped else "") + ":"
+            return header + "\n" + "\n".join(lines)
+        except re.error as e:
+            return f"Error: Invalid regular expression: {str(e)}"
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def search_file_contents_tool(self):
+            """Creates a tool wrapper for searching file contents."""
+            @tool
+            def search_file_contents(folder_path: str, query: str, regex: bool = False,
+                                     case_sensitive: bool = False, extensions: list[str] = None,
+                                     context_lines: int = 1, max_results: int = 50) -> str:
+                """Searches the text inside every file under folder_path (and its subfolders), like grep.
+                query is plain text unless regex=True. extensions limits the search to some file types (e.g.
+                ['txt', 'md']). Returns each file with matches, followed by the matching lines ('12: ...')
+                and context_lines lines around them ('11- ...'). Binary files are skipped. At most
+                max_results matches (max 500) are returned."""
+                return self.search_file_contents_impl(folder_path, query, regex, case_sensitive, extensions,
+                                                      context_lines, max_results)
+            return search_file_contents
+    
+    def disk_usage_impl(self, folder_path: str, max_results: int = 10) -> str:
+        """Implementation for showing what takes the space in a folder tree."""
+        if not os.path.exists(folder_path):
+            return f"Error: The folder '{folder_path}' does not exist."
+        if not os.path.isdir(folder_path):
+            return f"Error: '{folder_path}' is not a directory."
+        try:
+            usage = self.disk_usage.usage(folder_path, max_results)
+            lines = [f"{folder_path}: {format_size(usage['size'])} in {usage['files']} files and "
+                     f"{usage['folders']} folders."]
+            if not usage['children']:
+                return lines[0] + " The folder is empty."
+            lines.append("Largest items:")
+            for name, is_dir, size, files in usage['children']:
+                share = f"{100 * size / usage['size']:.0f}%" if usage['size'] else "0%"
+                lines.append(f"  {name}/  {format_size(size)} ({share}, {files} files)" if is_dir else
+                             f"  {name}  {format_size(size)} ({share})")
+            rest_count, rest_size = usage['rest']
+            if rest_count:
+                lines.append(f"  ...and {rest_count} more items: {format_size(rest_size)}")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def disk_usage_tool(self):
+            """Creates a tool wrapper for showing disk usage."""
+            @tool
+            def disk_usage(folder_path: str, max_results: int = 10) -> str:
+                """Shows how much space a folder takes, with everything in it, and its max_results (max 50)
+                largest files and subfolders, largest first, with their share of the total. Use this when
+                the user asks what takes space on their disk or in a folder. Folders end with '/'."""
+                return self.disk_usage_impl(folder_path, max_results)
+            return disk_usage
+    
+    def search_documents_impl(self, query: str, max_results: int = 5) -> str:
+        """Implementation for finding the passages of the user's documents that answer a question."""
+        if self.document_index is None:
+            return "Error: No document index is configured."
+        if not query or not query.strip():
+            return "Error: The query is empty."
+        max_results = max(1, min(max_results, 20))
+        try:
+            results = self.document_index.search(query, k=max_results)
+            note = " (the index is still being built, results may be incomplete)" if self.document_index.building else ""
+            if not results:
+                return f"No passages found for '{query}'{note}."
+            blocks = []
+            size = 0
+            for score, path, line, text in results:
+                block = f"[{path}, line {line}, score {score:.2f}]\n{text}"
+                size += len(block) + 2
+                if size > MAX_LISTING_CHARS:
+                    break
+                blocks.append(block)
+            return f"{len(blocks)} most relevant passages{note}:\n\n" + "\n\n".join(blocks)
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def search_documents_tool(self):
+            """Creates a tool wrapper for searching the user's documents."""
+            @tool
+            def search_documents(query: str, max_results: int = 5) -> str:
+                """Finds the passages of the user's indexed text documents (notes, reports, exports...) most
+                relevant to a question or topic, e.g. 'how much was the Q3 marketing budget cut'. Returns each
+                passage with its file, line and relevance score, best first. Answer from these passages and
+                cite the files; use read_file_content to read more around a passage."""
+                return self.search_documents_impl(query, max_results)
+            return search_documents
+    
     def open_file_impl(self, file_path: str) -> str:
         """Implementation for opening a file with the default application."""
         # Check if file exists first
@@ -115,16 +509,209 @@ class FileSystemTools(Tools):
                 """Removes the specified folder."""
                 return self.remove_folder_impl(folder_path)
             return remove_folder
+    
+    def _check_removable(self, folder_path: str):
+        """Returns an error message if a folder can't be bulk-removed, else None."""
+        if not os.path.exists(folder_path):
+            return f"Error: The folder '{folder_path}' does not exist."
+        if not os.path.isdir(folder_path) or os.path.islink(folder_path):
+            return f"Error: '{folder_path}' is not a directory."
+        path = os.path.realpath(folder_path)
+        protected = {os.path.realpath(os.path.expanduser("~")), os.path.realpath(os.sep)}
+        if path in protected or os.path.dirname(path) == path:
+            return f"Error: Refusing to bulk-remove '{folder_path}': it is a home or root folder."
+        return None
+    
+    def _plan_removal(self, kind: str, folder_path: str, files: list, folders: list) -> str:
+        """Stores a removal plan and returns its dry-run preview with the token confirming it."""
+        total = len(files)
+        files = files[:MAX_REMOVE_FILES]
+        size = sum(file_size for _, file_size in files)
+        token = secrets.token_hex(4)
+        with self._removal_lock:
+            now = time.monotonic()
+            for old_token in [key for key, plan in self._removal_plans.items() if plan['expires'] < now]:
+                del self._removal_plans[old_token]
+            self._removal_plans[token] = {'kind': kind, 'folder': folder_path,
+                                          'root': os.path.realpath(folder_path), 'files': files,
+                                          'folders': folders if total <= MAX_REMOVE_FILES else [],
+                                          'expires': now + REMOVAL_PLAN_TTL}
+            while len(self._removal_plans) > 16:
+                self._removal_plans.popitem(last=False)
+        
+        what = f"{len(files)} files ({format_size(size)})"
+        if total > MAX_REMOVE_FILES:
+            what = f"the first {len(files)} of {total} files ({format_size(size)}; at most {MAX_REMOVE_FILES} per call)"
+        elif folders:
+            what += f" and {len(folders)} folders"
+        examples = "\n".join(f"  {path}" for path, _ in files[:5])
+        return (f"Dry run: {kind} would permanently delete {what} under {folder_path}.\n"
+                + (f"For example:\n{examples}\n" if examples else "")
+                + f"After the user confirms, call {kind} again with confirm_token='{token}' "
+                  f"(valid for {REMOVAL_PLAN_TTL // 60} minutes).")
+    
+    def _execute_removal(self, kind: str, folder_path: str, confirm_token: str) -> str:
+        """Deletes the files of a confirmed plan in parallel, then its folders bottom-up."""
+        with self._removal_lock:
+            plan = self._removal_plans.get(confirm_token)
+            if plan is None or plan['expires'] < time.monotonic() or \
+                    (plan['kind'], plan['folder']) != (kind, folder_path):
+                return (f"Error: Unknown or expired confirm_token for {kind} on '{folder_path}'. "
+                        f"Call {kind} without confirm_token for a new preview.")
+            del self._removal_plans[confirm_token]
+        root = plan['root']
+        if os.path.realpath(folder_path) != root:
+            return f"Error: '{folder_path}' was moved or replaced since the preview; nothing was removed."
+        
+        start = time.perf_counter()
+        errors = []
+        def outside(path, parents):
+            # A folder of the tree swapped for a link since the preview would take the delete elsewhere
+            if path == folder_path:
+                return False
+            parent = os.path.dirname(path)
+            if parent not in parents:
+                real = os.path.realpath(parent)
+                parents[parent] = real != root and not real.startswith(root.rstrip(os.sep) + os.sep)
+            if parents[parent]:
+                errors.append(f"{path}: no longer under {folder_path}, skipped")
+            return parents[parent]
+        def remove_files(chunk):
+            count, freed = 0, 0
+            parents = {}
+            for path, file_size in chunk:
+                if outside(path, parents):
+                    continue
+                try:
+                    os.remove(path)
+                    count, freed = count + 1, freed + file_size
+                except FileNotFoundError:
+                    pass
+                except OSError as error:
+                    errors.append(f"{path}: {error.strerror or error}")
+            return count, freed
+        def remove_folders(chunk):
+            count = 0
+            parents = {}
+            for path in chunk:
+                if outside(path, parents):
+                    continue
+                try:
+                    os.rmdir(path)
+                    count += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as error:
+                    errors.append(f"{path}: {error.strerror or error}")
+            return count
+        
+        # Unlinking releases the GIL, so a thread pool overlaps the filesystem round trips;
+        # paths go to the threads in chunks, a future per file would cost more than the unlink
+        chunks = lambda items: [items[i:i + REMOVE_CHUNK] for i in range(0, len(items), REMOVE_CHUNK)]
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="remove") as executor:
+            results = list(executor.map(remove_files, chunks(plan['files'])))
+            files_removed, freed = sum(count for count, _ in results), sum(size for _, size in results)
+            # Deepest folders first; folders of the same depth are independent
+            folders_removed = 0
+            by_depth = {}
+            for path in plan['folders']:
+                by_depth.setdefault(path.count(os.sep), []).append(path)
+            for depth in sorted(by_depth, reverse=True):
+                folders_removed += sum(executor.map(remove_folders, chunks(by_depth[depth])))
+        
+        summary = f"Removed {files_removed} files ({format_size(freed)})" + \
+            (f" and {folders_removed} folders" if plan['folders'] else "") + \
+            f" under {folder_path} in {time.perf_counter() - start:.1f}s."
+        if errors:
+            summary += f" {len(errors)} could not be removed:\n" + "\n".join(f"  {error}" for error in errors[:10])
+        return summary
+    
+    def remove_tree_impl(self, folder_path: str, confirm_token: str = None) -> str:
+        """Implementation for removing a folder and everything in it, after a dry run."""
+        error = self._check_removable(folder_path)
+        if error:
+            return error
+        try:
+            if confirm_token:
+                return self._execute_removal("remove_tree", folder_path, confirm_token)
+            files, folders = [], [folder_path]
+            for _, entries in walk_parallel([folder_path], skip=()):
+                for path, _, is_dir, size, _ in entries:
+                    if is_dir:
+                        folders.append(path)
+                    else:
+                        files.append((path, size))
+            return self._plan_removal("remove_tree", folder_path, files, folders)
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def remove_tree_tool(self):
+            """Creates a tool wrapper for removing a folder tree."""
+            @tool
+            def remove_tree(folder_path: str, confirm_token: str = None) -> str:
+                """Permanently deletes a folder with all its files and subfolders. Without confirm_token it only
+                previews what would be deleted (a dry run) and returns a confirm_token; only after the user
+                confirms, call it again with that token to delete. At most 5000 files per call."""
+                return self.remove_tree_impl(folder_path, confirm_token)
+            return remove_tree
+    
+    def remove_matching_impl(self, folder_path: str, pattern: str, recursive: bool = True,
+                             confirm_token: str = None) -> str:
+        """Implementation for removing the files whose name matches a wildcard pattern, after a dry run."""
+        error = self._check_removable(folder_path)
+        if error:
+            return error
+        if not pattern or pattern.strip("*") == "":
+            return "Error: The pattern must select some files (use remove_tree to delete everything)."
+        try:
+            if confirm_token:
+                return self._execute_removal("remove_matching", folder_path, confirm_token)
+            matches = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match
+            if recursive:
+                listing = (entry for _, entries in walk_parallel([folder_path], skip=()) for entry in entries)
+            else:
+                with os.scandir(folder_path) as iterator:
+                    listing = [(entry.path, entry.name, entry.is_dir(follow_symlinks=False),
+                                entry.stat(follow_symlinks=False).st_size, None) for entry in iterator]
+            files = [(path, size) for path, name, is_dir, size, _ in listing if not is_dir and matches(name)]
+            if not files:
+                return f"No files match '{pattern}' under {folder_path}."
+            return self._plan_removal("remove_matching", folder_path, files, [])
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+    
+    def remove_matching_tool(self):
+            """Creates a tool wrapper for removing files matching a pattern."""
+            @tool
+            def remove_matching(folder_path: str, pattern: str, recursive: bool = True,
+                                confirm_token: str = None) -> str:
+                """Permanently deletes the files under folder_path whose name matches a wildcard pattern (e.g.
+                '*.tmp', 'backup_2023*'), in subfolders too unless recursive=False. Folders are kept. Without
+                confirm_token it only previews what would be deleted (a dry run) and returns a confirm_token;
+                only after the user confirms, call it again with that token. At most 5000 files per call."""
+                return self.remove_matching_impl(folder_path, pattern, recursive, confirm_token)
+            return remove_matching
+    
     def get_tools(self):
         """
         Returns a list of tool callables as standalone functions (not methods).
         """
-        return [
+        tools = [
             self.show_folder_contents_tool(),
+            self.read_file_content_tool(),
+            self.search_file_contents_tool(),
+            self.disk_usage_tool(),
             self.open_file_tool(),
             self.remove_file_tool(),
-            self.remove_folder_tool()
+            self.remove_folder_tool(),
+            self.remove_tree_tool(),
+            self.remove_matching_tool()
         ]
+        if self.file_index is not None:
+            tools.append(self.find_files_tool())
+        if self.document_index is not None:
+            tools.append(self.search_documents_tool())
+        return tools
 
 
 class TimeTools(Tools):
@@ -161,10 +748,66 @@ class TimeTools(Tools):
 
 class CalendarTools(Tools):
     
-    def __init__(self):
+    service = 'calendar'
+    
+    def __init__(self, mirror_path: str = None, mirror_max_staleness: float = 300.0):
         self.calendar_service = self.get_calendar_service()
+        # Optional local copy of the calendar used to answer listing questions without an API call
+        self.mirror = CalendarMirror(mirror_path, max_staleness=mirror_max_staleness) if mirror_path else None
+        # ETag, start and end of recently seen events, so modifications don't need to fetch the event first
+        self._known_events = OrderedDict()
+        self.recurrence = RecurrenceEngine()
+        # Timezone of the user's calendar, resolved on first use
+        self._calendar_zone = None
+    
+    def _remember_event(self, event: dict):
+        """Records the version and times of an event returned by the API (keeps the 5000 most recent)."""
+        if not isinstance(event, dict) or 'id' not in event:
+            return
+        self._known_events[event['id']] = {key: event[key] for key in ('etag', 'start', 'end') if key in event}
+        self._known_events.move_to_end(event['id'])
+        if len(self._known_events) > 5000:
+            self._known_events.popitem(last=False)
+    
+    def _known_event(self, event_id: str) -> dict:
+        """Returns the last known etag/start/end of an event from memory or the mirror, or None."""
+        if event_id in self._known_events:
+            return self._known_events[event_id]
+        if self.mirror is not None:
+            return self.mirror.get(event_id)
+        return None
+    
+    def _get_calendar_zone(self):
+        """Returns the tzinfo of the user's calendar, read once from the Calendar settings.
+        Falls back to the local timezone if the setting can't be read."""
+        if self._calendar_zone is None:
+            zone = None
+            try:
+                name = self.calendar_service.settings().get(setting='timezone').execute().get('value')
+                if isinstance(name, str):
+                    zone = get_zone(name)
+            except Exception as error:
+                print(f"Could not read the calendar timezone: {error}")
+            self._calendar_zone = zone or get_zone()
+        return self._calendar_zone
+    
+    def _mirror_ready(self) -> bool:
+        """Returns True if reads can be served from the local mirror, syncing it first when stale.
+        If the sync fails the caller falls back to querying the API directly."""
+        if self.mirror is None:
+            return False
+        try:
+            self.mirror.ensure_fresh(self.calendar_service)
+            return True
+        except Exception as error:
+            print(f"Calendar mirror sync failed: {error}")
+            return False
     
     def get_calendar_service(self):
+        # Recorded traffic replayed offline needs no credentials (see google_replay.py)
+        http = replay_http('calendar')
+        if http is not None:
+            return build('calendar', 'v3', http=http)
         SCOPES = ['https://www.googleapis.com/auth/calendar']
         creds = None
         calendar_token_path = get_file_path('calendar_token.json')
@@ -180,7 +823,9 @@ class CalendarTools(Tools):
             with open(calendar_token_path, 'w') as token:
                 token.write(creds.to_json())
         try:
-            service = build('calendar', 'v3', credentials=creds)
+            http = recording_http('calendar', creds)
+            service = build('calendar', 'v3', http=http) if http is not None else \
+                build('calendar', 'v3', credentials=creds)
             return service
         except HttpError as error:
             print(f'An error occurred: {error}')
@@ -190,23 +835,25 @@ class CalendarTools(Tools):
         """
         Returns a list of tool callables as standalone functions (not methods).
         """
-        return [
+        return self._tag_service([
             self._add_event_to_calendar_tool(),
             self._add_recurrent_event_to_calendar_tool(),
             self._get_upcoming_events_tool(),
             self._modify_event_tool(),
-            self._get_events_on_date_tool()
-        ]
+            self._get_events_on_date_tool(),
+            self._get_events_in_range_tool(),
+            self._find_free_slots_tool(),
+            self._bulk_add_events_tool(),
+            self._import_ics_tool(),
+            self._modify_events_tool(),
+            self._preview_recurrence_tool()
+        ])
 
-    def _add_event_to_calendar_impl(self, event_name: str, 
-                            event_location:str, 
-                            event_desc:str, 
-                            event_start_date: str, 
-                            event_end_date:str,
-                            time_zone:str,
-                            email_remainder:int,
-                            popup_remainder:int) -> str:
-        """Implementation for adding an event to the calendar."""
+    def _build_event_body(self, event_name: str, event_location: str, event_desc: str,
+                          event_start_date: str, event_end_date: str, time_zone: str,
+                          email_remainder: int = 0, popup_remainder: int = 0,
+                          recurrence_rule: str = None) -> dict:
+        """Builds an event resource for the Calendar API."""
         event = {
             'summary': event_name,
             'location': event_location,
@@ -220,6 +867,11 @@ class CalendarTools(Tools):
                 'timeZone': time_zone,
             }
         }
+        if recurrence_rule:
+            # The API expects an RFC 5545 content line
+            if not recurrence_rule.upper().startswith('RRULE:'):
+                recurrence_rule = f"RRULE:{recurrence_rule}"
+            event['recurrence'] = [recurrence_rule]
         
         # Only add reminders if at least one is set
         reminders_overrides = []
@@ -235,8 +887,24 @@ class CalendarTools(Tools):
             }
         else:
             event['reminders'] = {'useDefault': True}
+        return event
+
+    def _add_event_to_calendar_impl(self, event_name: str, 
+                            event_location:str, 
+                            event_desc:str, 
+                            event_start_date: str, 
+                            event_end_date:str,
+                            time_zone:str,
+                            email_remainder:int,
+                            popup_remainder:int) -> str:
+        """Implementation for adding an event to the calendar."""
+        event = self._build_event_body(event_name, event_location, event_desc, event_start_date, event_end_date,
+                                       time_zone, email_remainder, popup_remainder)
         
         event = self.calendar_service.events().insert(calendarId='primary', body=event).execute()
+        self._remember_event(event)
+        if self.mirror is not None:
+            self.mirror.upsert(event)
         event_id = event.get('id')
         return f"Event created: {event.get('htmlLink')}|EVENT_ID:{event_id}"
     
@@ -251,17 +919,26 @@ class CalendarTools(Tools):
                                 time_zone:str = "UTC",
                                 email_remainder:int = 0,
                                 popup_remainder:int = 0,
-                                current_date: str = None) -> str:
+                                current_date: str = None,
+                                allow_conflicts: bool = False) -> str:
             """Adds an event to the calendar. 
             IMPORTANT: If the user mentions relative dates like 'tomorrow', 'today', 'next week', 'next month', etc.,
             you MUST first call get_current_time tool to get the current date and time, then pass that result to 
             the current_date parameter of this function.
             current_date should be in format 'YYYY-MM-DD HH:MM:SS' (e.g., from get_current_time output).
-            event_start_date and event_end_date should be in ISO format (e.g., '2024-01-15T10:00:00')."""
+            event_start_date and event_end_date should be in ISO format (e.g., '2024-01-15T10:00:00').
+            The event is not created if it overlaps existing events, unless allow_conflicts is True."""
             # Resolve relative dates using the provided current_date
             resolved_start = resolve_relative_date(event_start_date, current_date)
             resolved_end = resolve_relative_date(event_end_date, current_date)
             
+            if not allow_conflicts:
+                conflicts = self._find_conflicts_impl(resolved_start, resolved_end, time_zone)
+                if conflicts:
+                    return (f"Conflict: the event was NOT created because it overlaps with:\n{conflicts}\n"
+                            "Ask the user whether to schedule it anyway; if so, call add_event_to_calendar "
+                            "again with allow_conflicts=True.")
+            
             return self._add_event_to_calendar_impl(event_name, event_location, event_desc, 
                                                    resolved_start, resolved_end, time_zone,
                                                    email_remainder, popup_remainder)
@@ -278,39 +955,13 @@ class CalendarTools(Tools):
                                         email_remainder:int,
                                         popup_remainder:int) -> str:
         """Implementation for adding a recurrent event to the calendar."""
-        event = {
-            'summary': event_name,
-            'location': event_location,
-            'description': event_desc,
-            'start': {
-                'dateTime': event_start_date,
-                'timeZone': time_zone,
-            },
-            'end': {
-                'dateTime': event_end_date,
-                'timeZone': time_zone,
-            },
-            'recurrence': [
-                recurrence_rule
-            ]
-        }
-        
-        # Only add reminders if at least one is set
-        reminders_overrides = []
-        if email_remainder > 0:
-            reminders_overrides.append({'method': 'email', 'minutes': email_remainder})
-        if popup_remainder > 0:
-            reminders_overrides.append({'method': 'popup', 'minutes': popup_remainder})
-        
-        if reminders_overrides:
-            event['reminders'] = {
-                'useDefault': False,
-                'overrides': reminders_overrides,
-            }
-        else:
-            event['reminders'] = {'useDefault': True}
+        event = self._build_event_body(event_name, event_location, event_desc, event_start_date, event_end_date,
+                                       time_zone, email_remainder, popup_remainder, recurrence_rule)
         
         event = self.calendar_service.events().insert(calendarId='primary', body=event).execute()
+        if self.mirror is not None:
+            # The mirror stores expanded instances, which only the API can compute: pick them up on the next read
+            self.mirror.invalidate()
         event_id = event.get('id')
         return f"Recurrent Event created: {event.get('htmlLink')}|EVENT_ID:{event_id}"
     
@@ -323,35 +974,7 @@ class CalendarTools(Tools):
         Returns:
             Tuple of (is_valid, normalized_rrule_or_error_message)
         """
-        
-        if not rrule:
-            return False, "RRULE cannot be empty"
-        
-        rrule = rrule.strip()
-        
-        # Check for FREQ parameter
-        if 'FREQ=' not in rrule:
-            return False, f"RRULE must contain FREQ parameter. Got: {rrule}"
-        
-        # Valid FREQ values
-        valid_freq = ['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY']
-        freq_found = False
-        for freq in valid_freq:
-            if f'FREQ={freq}' in rrule:
-                freq_found = True
-                break
-        
-        if not freq_found:
-            return False, f"RRULE FREQ must be one of: {', '.join(valid_freq)}"
-        
-        # Remove problematic parameters for Google Calendar
-        # WKST is often not needed and can cause issues
-        normalized = rrule.replace(';WKST=MO', '').replace('WKST=MO;', '')
-        
-        # Ensure no trailing semicolons
-        normalized = normalized.rstrip(';')
-        
-        return True, normalized
+        return self.recurrence.validate(rrule)
     
     def _build_recurrence_rule(self, frequency: str, day_of_week: str = None, 
                                interval: int = 1, count: int = None, until: str = None) -> str:
@@ -394,7 +1017,8 @@ class CalendarTools(Tools):
                                             time_zone: str = "UTC",
                                             email_remainder: int = 0,
                                             popup_remainder: int = 0,
-                                            current_date: str = None) -> str:
+                                            current_date: str = None,
+                                            allow_conflicts: bool = False) -> str:
             """Adds a recurring event to the calendar with recurrence_rule parameter.
             
             *** PARAMETER NAMES ARE CRITICAL - USE EXACTLY AS SHOWN ***
@@ -411,6 +1035,7 @@ class CalendarTools(Tools):
             - time_zone (string): Default is "UTC"
             - email_remainder (int): Minutes for email reminder (1440=1 day)
             - popup_remainder (int): Minutes for popup reminder (1440=1 day)
+            - allow_conflicts (bool): Create it even if occurrences overlap existing events
             
             RRULE EXAMPLES:
             - "FREQ=WEEKLY;BYDAY=TU" → Every Tuesday
@@ -440,28 +1065,239 @@ class CalendarTools(Tools):
             if not resolved_end or 'T' not in resolved_end:
                 return "Error: event_end_date must be in ISO format with time (e.g., '2026-01-20T20:00:00')"
             
+            if not allow_conflicts:
+                conflicts = self._find_conflicts_impl(resolved_start, resolved_end, time_zone, normalized_rrule)
+                if conflicts:
+                    return (f"Conflict: the event was NOT created because some occurrences overlap with:\n{conflicts}\n"
+                            "Ask the user whether to schedule it anyway; if so, call add_recurrent_event_to_calendar "
+                            "again with allow_conflicts=True.")
+            
             return self._add_recurrent_event_to_calendar_impl(event_name, event_location, event_desc,
                                                             resolved_start, resolved_end, time_zone,
                                                             normalized_rrule, email_remainder, popup_remainder)
         return add_recurrent_event_to_calendar
 
+    def _execute_batch(self, requests: list) -> dict:
+        """Runs (key, HttpRequest) pairs through the batch endpoint, CALENDAR_BATCH_SIZE per round trip.
+        
+        Returns {key: (response, exception)}; a failing request doesn't affect the others.
+        """
+        results = {}
+        
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+        
+        for offset in range(0, len(requests), CALENDAR_BATCH_SIZE):
+            batch = self.calendar_service.new_batch_http_request(callback=callback)
+            for key, request in requests[offset:offset + CALENDAR_BATCH_SIZE]:
+                batch.add(request, request_id=key)
+            batch.execute()
+        return results
+
+    def _import_events_batched(self, events) -> dict:
+        """Imports (label, event) pairs whose events carry an iCalUID, skipping events already in the calendar.
+        
+        `events` is consumed one chunk at a time, so it can be a generator over a large file. Each chunk
+        costs two batched round trips: one looking up the iCalUIDs and one importing the new events.
+        An Exception in place of an event is reported as a failure for that label.
+        """
+        report = {'created': [], 'skipped': [], 'failed': []}
+        seen_uids = set()
+        
+        def flush(chunk):
+            lookups = [(str(position), self.calendar_service.events().list(
+                            calendarId='primary', iCalUID=event['iCalUID'], fields='items(id)'))
+                       for position, (_, event) in enumerate(chunk)]
+            existing = self._execute_batch(lookups)
+            
+            new_events = []
+            for position, (label, event) in enumerate(chunk):
+                response, _ = existing.get(str(position), (None, None))
+                if response and response.get('items'):
+                    report['skipped'].append(label)
+                else:
+                    new_events.append((str(position), label, event))
+            
+            imports = [(key, self.calendar_service.events().import_(calendarId='primary', body=event))
+                       for key, _, event in new_events]
+            results = self._execute_batch(imports)
+            
+            invalidate = False
+            for key, label, event in new_events:
+                response, error = results.get(key, (None, "no response from the batch endpoint"))
+                if error is not None or response is None:
+                    report['failed'].append((label, str(error)))
+                    continue
+                report['created'].append((label, response.get('id')))
+                if self.mirror is not None:
+                    if event.get('recurrence'):
+                        invalidate = True
+                    else:
+                        self.mirror.upsert(response)
+            if invalidate:
+                self.mirror.invalidate()
+        
+        chunk = []
+        for label, event in events:
+            if isinstance(event, Exception):
+                report['failed'].append((label, str(event)))
+                continue
+            if event['iCalUID'] in seen_uids:
+                report['skipped'].append(label)
+                continue
+            seen_uids.add(event['iCalUID'])
+            chunk.append((label, event))
+            if len(chunk) == CALENDAR_BATCH_SIZE:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+        return report
+
+    def _format_import_report(self, report: dict, max_lines: int = 20) -> str:
+        """Summarizes the outcome of a bulk import for the model."""
+        lines = [f"Created {len(report['created'])} events, skipped {len(report['skipped'])} already in the calendar, "
+                 f"{len(report['failed'])} failed."]
+        for label, event_id in report['created'][:max_lines]:
+            lines.append(f"Created: {label}|EVENT_ID:{event_id}")
+        for label in report['skipped'][:max_lines]:
+            lines.append(f"Skipped duplicate: {label}")
+        for label, error in report['failed'][:max_lines]:
+            lines.append(f"Failed: {label}: {error}")
+        hidden = sum(max(0, len(entries) - max_lines) for entries in report.values())
+        if hidden:
+            lines.append(f"... {hidden} more lines not shown.")
+        return "\n".join(lines)
+
+    def _bulk_add_events_impl(self, events: list[dict], current_date: str = None) -> str:
+        """Implementation for creating many events with batched requests."""
+        def prepared():
+            for number, spec in enumerate(events, start=1):
+                name = spec.get('event_name') or f"Event {number}"
+                start = resolve_relative_date(spec.get('event_start_date') or '', current_date)
+                end = resolve_relative_date(spec.get('event_end_date') or '', current_date)
+                label = f"{name} ({start})"
+                if 'T' not in start or 'T' not in end:
+                    yield label, ValueError("event_start_date and event_end_date must be ISO datetimes "
+                                            "like '2026-01-20T19:00:00'")
+                    continue
+                
+                rrule = spec.get('recurrence_rule')
+                if rrule:
+                    is_valid, result = self._validate_and_normalize_rrule(rrule)
+                    if not is_valid:
+                        yield label, ValueError(f"invalid recurrence_rule: {result}")
+                        continue
+                    rrule = result
+                
+                event = self._build_event_body(name, spec.get('event_location', ''), spec.get('event_desc', ''),
+                                               start, end, spec.get('time_zone', 'UTC'),
+                                               int(spec.get('email_remainder') or 0),
+                                               int(spec.get('popup_remainder') or 0), rrule)
+                # Deterministic iCalUID: running the same request twice doesn't create duplicates
+                fingerprint = f"{name}|{start}|{end}|{rrule or ''}"
+                event['iCalUID'] = hashlib.sha1(fingerprint.encode()).hexdigest() + "@ai-assistant"
+                yield label, event
+        
+        if not events:
+            return "Error: No events provided."
+        try:
+            return self._format_import_report(self._import_events_batched(prepared()))
+        except Exception as error:
+            return f"An error occurred: {error}"
+
+    def _bulk_add_events_tool(self):
+        """Creates a tool wrapper for adding many events at once."""
+        @tool
+        def bulk_add_events(events: list[dict], current_date: str = None) -> str:
+            """Adds many events to the calendar in one call (e.g. a timetable or a conference schedule).
+            Use this instead of calling add_event_to_calendar repeatedly when there are several events.
+            Each item of events is a dict with the keys:
+            - event_name (string, required)
+            - event_start_date, event_end_date (string, required): ISO datetimes like "2026-01-20T19:00:00"
+            - event_location, event_desc (string, optional)
+            - time_zone (string, optional, default "UTC")
+            - recurrence_rule (string, optional): RRULE like "FREQ=WEEKLY;BYDAY=TU"
+            - email_remainder, popup_remainder (int, optional): minutes before the event
+            Events that were already added are skipped, so repeating the call is safe."""
+            return self._bulk_add_events_impl(events, current_date)
+        return bulk_add_events
+
+    def _import_ics_impl(self, path: str, time_zone: str = "UTC") -> str:
+        """Implementation for importing the events of an iCalendar (.ics) file."""
+        if not os.path.exists(path):
+            return f"Error: The file '{path}' does not exist."
+        
+        def prepared(stream):
+            for number, vevent in enumerate(iter_vevents(stream), start=1):
+                summary = vevent.get('SUMMARY', [({}, f"Event {number}")])[0][1]
+                start = vevent.get('DTSTART', [({}, '?')])[0][1]
+                label = f"{summary} ({start})"
+                try:
+                    event = vevent_to_event(vevent, time_zone, self._validate_and_normalize_rrule)
+                except ValueError as error:
+                    yield label, error
+                    continue
+                if 'iCalUID' not in event:
+                    event['iCalUID'] = hashlib.sha1(repr(sorted(vevent.items())).encode()).hexdigest() + "@ai-assistant"
+                yield label, event
+        
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as stream:
+                report = self._import_events_batched(prepared(stream))
+            return self._format_import_report(report)
+        except Exception as error:
+            return f"An error occurred: {error}"
+
+    def _import_ics_tool(self):
+        """Creates a tool wrapper for importing an iCalendar file."""
+        @tool
+        def import_ics(path: str, time_zone: str = "UTC") -> str:
+            """Imports all events from an iCalendar (.ics) file into the calendar.
+            time_zone is used for times in the file that don't specify one.
+            Events already in the calendar (same UID) are skipped."""
+            return self._import_ics_impl(path, time_zone)
+        return import_ics
+
+    def _iter_events(self, calendar_id: str = 'primary', fields: str = EVENT_LIST_FIELDS,
+                     page_size: int = 250, **params):
+        """Yields events from events().list across all result pages.
+        
+        Pages are fetched lazily, so callers that stop early don't pay for the rest, and
+        `fields` requests a partial response with only the parts of each event that are used.
+        """
+        page_token = None
+        while True:
+            response = self.calendar_service.events().list(calendarId=calendar_id, fields=fields,
+                                                           maxResults=page_size, pageToken=page_token,
+                                                           **params).execute()
+            for event in response.get('items', []):
+                self._remember_event(event)
+                yield event
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+
     def _get_upcoming_events_impl(self, max_results: int) -> str:
         """Implementation for retrieving upcoming events from the calendar."""
-        now = datetime.today().isoformat() + 'Z'  # 'Z' indicates UTC time
-        events_result = self.calendar_service.events().list(calendarId='primary', timeMin=now,
-                                                    maxResults=max_results, singleEvents=True,
-                                                    orderBy='startTime').execute()
-        events = events_result.get('items', [])
+        if self._mirror_ready():
+            rows = self.mirror.upcoming(datetime.now(tz.tzutc()).timestamp(), max_results)
+            if not rows:
+                return 'No upcoming events found.'
+            return "\n".join(f"{row['start']} - {row['end']} - {row['summary']}" for row in rows)
         
-        if not events:
-            return 'No upcoming events found.'
+        now = datetime.now(tz.tzutc()).isoformat()
+        events = islice(self._iter_events(timeMin=now, singleEvents=True, orderBy='startTime',
+                                          page_size=min(max_results, 250)), max_results)
         
         event_list = []
         for event in events:
             start = event['start'].get('dateTime', event['start'].get('date'))
             end = event['end'].get('dateTime', event['end'].get('date'))
-            event_list.append(f"{start} - {end} - {event['summary']}")
+            event_list.append(f"{start} - {end} - {event.get('summary', '(no title)')}")
         
+        if not event_list:
+            return 'No upcoming events found.'
         return "\n".join(event_list)
     
     def _get_upcoming_events_tool(self):
@@ -475,25 +1311,24 @@ class CalendarTools(Tools):
     
     def _get_events_on_date_impl(self, date: str) -> str:
         """Implementation for retrieving events on a specific date from the calendar."""
-        start_of_day = f"{date}T00:00:00Z"
-        end_of_day = f"{date}T23:59:59Z"
-        
         try:
-            events_result = self.calendar_service.events().list(calendarId='primary', 
-                                                                timeMin=start_of_day,
-                                                                timeMax=end_of_day,
-                                                                singleEvents=True,
-                                                                orderBy='startTime').execute()
-            events = events_result.get('items', [])
-            
-            if not events:
-                return f'No events found on {date}.'
+            # The day as it is on the user's calendar, from local midnight to local midnight
+            start_of_day, end_of_day = local_day_window(date, self._get_calendar_zone())
+            
+            if self._mirror_ready():
+                rows = self.mirror.between(start_of_day.timestamp(), end_of_day.timestamp())
+                if not rows:
+                    return f'No events found on {date}.'
+                return "\n".join(f"{row['start']} - {row['summary']} - ID: {row['id']}" for row in rows)
             
             event_list = []
-            for event in events:
+            for event in self._iter_events(timeMin=start_of_day.isoformat(), timeMax=end_of_day.isoformat(),
+                                           singleEvents=True, orderBy='startTime'):
                 start = event['start'].get('dateTime', event['start'].get('date'))
-                event_list.append(f"{start} - {event['summary']} - ID: {event['id']}")
+                event_list.append(f"{start} - {event.get('summary', '(no title)')} - ID: {event['id']}")
             
+            if not event_list:
+                return f'No events found on {date}.'
             return "\n".join(event_list)
         except Exception as error:
             return f"An error occurred: {error}"
@@ -502,59 +1337,315 @@ class CalendarTools(Tools):
         """Creates a tool wrapper for retrieving events on a specific date from the calendar."""
         @tool
         def get_events_on_date(date: str) -> str:
-            """Retrieves events on a specific date from the calendar."""
+            """Retrieves events on a specific date (YYYY-MM-DD) from the calendar.
+            The whole day is covered in the calendar's own timezone, so there is no need to check adjacent days."""
             return self._get_events_on_date_impl(date)
         return get_events_on_date
+
+    def _format_event_compact(self, event_id: str, start: str, end: str, summary: str) -> str:
+        """Formats an event as one short line, e.g. '2026-01-20 19:00-20:00 Meeting | ID: abc'."""
+        if 'T' not in start:
+            return f"{start} all day {summary} | ID: {event_id}"
+        start_day, start_time = start.split('T')
+        end_day, end_time = end.split('T') if 'T' in end else (end, '00:00')
+        end_label = end_time[:5] if end_day == start_day else f"{end_day} {end_time[:5]}"
+        return f"{start_day} {start_time[:5]}-{end_label} {summary} | ID: {event_id}"
+
+    def _get_events_in_range_impl(self, start: str, end: str, max_results: int = 50) -> str:
+        """Implementation for retrieving all events between two dates or datetimes."""
+        try:
+            # Dates cover whole local days and naive datetimes are in the calendar's timezone
+            zone = self._get_calendar_zone()
+            range_start = local_day_window(start, zone)[0] if 'T' not in start else isoparse(start)
+            range_end = local_day_window(end, zone)[1] if 'T' not in end else isoparse(end)
+            range_start, range_end = (moment if moment.tzinfo else moment.replace(tzinfo=zone)
+                                      for moment in (range_start, range_end))
+            time_min, time_max = range_start.isoformat(), range_end.isoformat()
+            
+            if self._mirror_ready():
+                rows = self.mirror.between(range_start.timestamp(), range_end.timestamp())
+                events = ((row['id'], row['start'], row['end'], row['summary']) for row in rows)
+            else:
+                events = ((event['id'],
+                           event['start'].get('dateTime', event['start'].get('date')),
+                           event['end'].get('dateTime', event['end'].get('date')),
+                           event.get('summary', '(no title)'))
+                          for event in self._iter_events(timeMin=time_min, timeMax=time_max,
+                                                         singleEvents=True, orderBy='startTime'))
+            
+            # Take one extra event to know whether the list was cut short
+            selected = list(islice(events, max_results + 1))
+            if not selected:
+                return f'No events found between {start} and {end}.'
+            
+            lines = [self._format_event_compact(*event) for event in selected[:max_results]]
+            if len(selected) > max_results:
+                lines.append(f"... more events in this range; narrow the range or raise max_results (showing {max_results}).")
+            return "\n".join(lines)
+        except Exception as error:
+            return f"An error occurred: {error}"
+
+    def _get_events_in_range_tool(self):
+        """Creates a tool wrapper for retrieving events in a date range from the calendar."""
+        @tool
+        def get_events_in_range(start: str, end: str, max_results: int = 50) -> str:
+            """Retrieves all events between start and end (both included), one compact line per event.
+            start and end are dates ('2026-01-20') or ISO datetimes ('2026-01-20T09:00:00'), both in the
+            calendar's timezone unless an offset is given.
+            Prefer this over calling get_events_on_date once per day for multi-day questions."""
+            return self._get_events_in_range_impl(start, end, max_results)
+        return get_events_in_range
+
+    def _to_datetime(self, value: str, time_zone: str, end_of_day: bool = False) -> datetime:
+        """Parses a date or ISO datetime into an aware datetime; naive values are in time_zone."""
+        moment = isoparse(value)
+        if 'T' not in value and end_of_day:
+            moment += timedelta(days=1)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=get_zone(time_zone) or tz.tzutc())
+        return moment
+
+    def _load_busy_index(self, time_min: datetime, time_max: datetime, calendar_ids: list[str] = None) -> IntervalIndex:
+        """Builds an interval index of busy periods between time_min and time_max.
+        
+        A single freebusy query covers every calendar at once, with recurring events already
+        expanded by the API. Intervals are labelled with their calendar id.
+        """
+        calendar_ids = calendar_ids or ['primary']
+        response = self.calendar_service.freebusy().query(body={
+            'timeMin': time_min.isoformat(),
+            'timeMax': time_max.isoformat(),
+            'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+        }).execute()
+        
+        intervals = []
+        for calendar_id, calendar in response.get('calendars', {}).items():
+            if calendar.get('errors'):
+                reason = calendar['errors'][0].get('reason', 'unknown error')
+                raise ValueError(f"Cannot read calendar '{calendar_id}': {reason}")
+            for busy in calendar.get('busy', []):
+                intervals.append((isoparse(busy['start']).timestamp(), isoparse(busy['end']).timestamp(), calendar_id))
+        return IntervalIndex(intervals)
+
+    def _load_event_index(self, time_min: datetime, time_max: datetime) -> IntervalIndex:
+        """Builds an interval index of the primary calendar's events, labelled with their summary.
+        Served from the mirror when available; transparent ("show as available") events are skipped."""
+        if self._mirror_ready():
+            rows = self.mirror.between(time_min.timestamp(), time_max.timestamp(), busy_only=True)
+            return IntervalIndex((row['start_ts'], row['end_ts'], row['summary']) for row in rows)
+        
+        events = self._iter_events(timeMin=time_min.isoformat(), timeMax=time_max.isoformat(), singleEvents=True,
+                                   fields="nextPageToken,items(id,summary,start,end,transparency)")
+        return IntervalIndex((event_timestamp(event['start']), event_timestamp(event['end']),
+                              event.get('summary', '(no title)'))
+                             for event in events if event.get('transparency') != 'transparent')
+
+    def _find_conflicts_impl(self, start_date: str, end_date: str, time_zone: str = "UTC",
+                             recurrence_rule: str = None, horizon_days: int = 90, max_lines: int = 10) -> str:
+        """Returns the existing events overlapping a new event, one per line ('' if none).
+        
+        For a recurring event, its occurrences within `horizon_days` are expanded locally and all of them
+        are checked against a single listing of that period. Failures to check are ignored so they
+        never block event creation.
+        """
+        try:
+            zone = get_zone(time_zone) or tz.tzutc()
+            start = self._to_datetime(start_date, time_zone)
+            end = self._to_datetime(end_date, time_zone)
+            duration = end - start
+            if recurrence_rule:
+                occurrences = list(self.recurrence.occurrences(recurrence_rule, start,
+                                                               window_end=start + timedelta(days=horizon_days)))
+            else:
+                occurrences = [start]
+            if not occurrences:
+                return ""
+            
+            index = self._load_event_index(occurrences[0], occurrences[-1] + duration)
+            lines = []
+            for occurrence in occurrences:
+                for busy_start, busy_end, summary in index.overlapping(occurrence.timestamp(),
+                                                                       (occurrence + duration).timestamp()):
+                    line = (f"{datetime.fromtimestamp(busy_start, zone):%Y-%m-%d %H:%M}-"
+                            f"{datetime.fromtimestamp(busy_end, zone):%H:%M} {summary}")
+                    if line not in lines:
+                        lines.append(line)
+            if len(lines) > max_lines:
+                lines = lines[:max_lines] + [f"... and {len(lines) - max_lines} more"]
+            return "\n".join(lines)
+        except Exception as error:
+            print(f"Conflict check failed: {error}")
+            return ""
+
+    def _preview_recurrence_impl(self, event_start_date: str, recurrence_rule: str, count: int = 10,
+                                 time_zone: str = "UTC", window_end: str = None) -> str:
+        """Implementation for listing the dates a recurring event would occur on."""
+        try:
+            start = self._to_datetime(event_start_date, time_zone)
+            end = self._to_datetime(window_end, time_zone, end_of_day=True) if window_end else None
+            # One extra occurrence tells whether the list goes on
+            occurrences = list(self.recurrence.occurrences(recurrence_rule, start, window_end=end, limit=count + 1))
+        except ValueError as error:
+            return f"Error in recurrence_rule: {error}"
+        
+        if not occurrences:
+            return "The rule produces no occurrences."
+        lines = [f"{occurrence:%a %Y-%m-%d %H:%M}" for occurrence in occurrences[:count]]
+        if len(occurrences) > count:
+            lines.append("... more occurrences follow.")
+        return "\n".join(lines)
+
+    def _preview_recurrence_tool(self):
+        """Creates a tool wrapper for previewing the occurrences of a recurrence rule."""
+        @tool
+        def preview_recurrence(event_start_date: str, recurrence_rule: str, count: int = 10,
+                               time_zone: str = "UTC", window_end: str = None) -> str:
+            """Lists the dates a recurring event would occur on, without creating it.
+            event_start_date is the first occurrence as an ISO datetime (e.g. '2026-01-20T19:00:00'),
+            recurrence_rule an RRULE like 'FREQ=MONTHLY;BYDAY=-1FR'. Returns up to count occurrences,
+            optionally only those until window_end (a date). Use it to check a rule before creating
+            the event or to answer 'when does this repeat?'."""
+            return self._preview_recurrence_impl(event_start_date, recurrence_rule, count, time_zone, window_end)
+        return preview_recurrence
+
+    def _find_free_slots_impl(self, start_date: str, end_date: str, min_duration_minutes: int = 30,
+                              day_start: str = "09:00", day_end: str = "18:00",
+                              calendar_ids: list[str] = None, time_zone: str = None,
+                              max_slots: int = 50) -> str:
+        """Implementation for finding free time slots across one or more calendars.
+        Working hours, dates and the slots shown are in time_zone, by default the calendar's timezone."""
+        try:
+            zone = (get_zone(time_zone) or tz.tzutc()) if time_zone else self._get_calendar_zone()
+            # Dates cover whole local days and naive datetimes are in that zone, as in get_events_in_range
+            range_start = local_day_window(start_date, zone)[0] if 'T' not in start_date else isoparse(start_date)
+            range_end = local_day_window(end_date, zone)[1] if 'T' not in end_date else isoparse(end_date)
+            range_start, range_end = (moment if moment.tzinfo else moment.replace(tzinfo=zone)
+                                      for moment in (range_start, range_end))
+            if range_end <= range_start:
+                return "Error: end_date must be after start_date."
+            work_start = datetime.strptime(day_start, "%H:%M").time()
+            work_end = datetime.strptime(day_end, "%H:%M").time()
+            
+            index = self._load_busy_index(range_start, range_end, calendar_ids)
+            
+            slots = []
+            for window_start, window_end in daily_windows(range_start, range_end, work_start, work_end):
+                slots.extend(index.free(window_start.timestamp(), window_end.timestamp(), min_duration_minutes * 60))
+            
+            if not slots:
+                return f"No free slots of at least {min_duration_minutes} minutes between {start_date} and {end_date}."
+            
+            lines = []
+            for slot_start, slot_end in slots[:max_slots]:
+                begin = datetime.fromtimestamp(slot_start, zone)
+                finish = datetime.fromtimestamp(slot_end, zone)
+                lines.append(f"{begin:%Y-%m-%d %H:%M}-{finish:%H:%M} ({int((slot_end - slot_start) // 60)} min)")
+            if len(slots) > max_slots:
+                lines.append(f"... {len(slots) - max_slots} more free slots; narrow the range to see them.")
+            return "\n".join(lines)
+        except Exception as error:
+            return f"An error occurred: {error}"
+
+    def _find_free_slots_tool(self):
+        """Creates a tool wrapper for finding free time slots in the calendar."""
+        @tool
+        def find_free_slots(start_date: str, end_date: str, min_duration_minutes: int = 30,
+                            day_start: str = "09:00", day_end: str = "18:00",
+                            calendar_ids: list[str] = None, time_zone: str = None) -> str:
+            """Finds free time slots between start_date and end_date (dates like '2026-01-20' or ISO datetimes,
+            end date included). Only slots within working hours day_start-day_end (HH:MM) that last at least
+            min_duration_minutes are returned. calendar_ids lists the calendars to check (default: primary).
+            Dates, working hours and the slots returned are in the user's calendar timezone; pass time_zone
+            (e.g. 'Europe/Rome') only to use another one.
+            Use this instead of get_events_on_date when the user asks when they are free or available."""
+            return self._find_free_slots_impl(start_date, end_date, min_duration_minutes,
+                                              day_start, day_end, calendar_ids, time_zone)
+        return find_free_slots
+    
+    def _build_event_patch(self, event_id: str, summary: str = None, description: str = None, location: str = None,
+                           start_date: str = None, end_date: str = None, time_zone: str = None,
+                           email_reminder: int = None, popup_reminder: int = None) -> dict:
+        """Builds a PATCH body holding only the fields that change."""
+        patch = {}
+        # Update text fields
+        if summary:
+            patch['summary'] = summary
+        if description:
+            patch['description'] = description
+        if location:
+            patch['location'] = location
+        
+        # Update date/time fields, keeping the event's time zone unless a new one is given
+        if start_date or end_date:
+            zone = time_zone
+            if not zone:
+                known = self._known_event(event_id) or {}
+                zone = known.get('start', {}).get('timeZone')
+            if not zone:
+                # Only needed for events never seen before: one extra round trip
+                event = self.calendar_service.events().get(calendarId='primary', eventId=event_id,
+                                                           fields='etag,start,end').execute()
+                self._remember_event({'id': event_id, **event})
+                zone = event.get('start', {}).get('timeZone', 'UTC')
+            if start_date:
+                patch['start'] = {'dateTime': start_date, 'timeZone': zone}
+            if end_date:
+                patch['end'] = {'dateTime': end_date, 'timeZone': zone}
+        
+        # Update reminders
+        if email_reminder is not None or popup_reminder is not None:
+            overrides = []
+            if email_reminder is not None:
+                overrides.append({'method': 'email', 'minutes': email_reminder})
+            if popup_reminder is not None:
+                overrides.append({'method': 'popup', 'minutes': popup_reminder})
+            patch['reminders'] = {'useDefault': False, 'overrides': overrides}
+        return patch
+    
+    def _patch_request(self, event_id: str, patch: dict):
+        """Creates an events().patch request, conditional on the last known ETag so concurrent edits aren't overwritten."""
+        request = self.calendar_service.events().patch(calendarId='primary', eventId=event_id, body=patch)
+        known = self._known_event(event_id)
+        if known and known.get('etag'):
+            request.headers['If-Match'] = known['etag']
+        return request
+    
+    def _apply_updated_event(self, updated_event: dict):
+        """Records a patched event and writes it through to the mirror."""
+        self._remember_event(updated_event)
+        if self.mirror is not None:
+            if updated_event.get('recurrence'):
+                self.mirror.invalidate()
+            else:
+                self.mirror.upsert(updated_event)
+    
+    def _describe_patch_error(self, event_id: str, error) -> str:
+        """Turns a failed PATCH into a message for the model. On an ETag mismatch (412) the stale
+        version is forgotten, so the next attempt is made against the current event."""
+        if isinstance(error, HttpError) and getattr(error.resp, 'status', None) == 412:
+            self._known_events.pop(event_id, None)
+            if self.mirror is not None:
+                self.mirror.invalidate()
+            return ("the event was changed elsewhere since it was last read; "
+                    "list the events again and retry with the updated details")
+        return str(error)
     
     def _modify_event_impl(self, event_id: str, summary: str = None, description: str = None, location: str = None, 
                            start_date: str = None, end_date: str = None, time_zone: str = None,
                            email_reminder: int = None, popup_reminder: int = None) -> str:
-        """Implementation for modifying an event in the calendar."""
+        """Implementation for modifying an event in the calendar.
+        Sends a single PATCH with the changed fields, guarded by the event's ETag when known."""
         if not any([summary, description, location, start_date, end_date, email_reminder, popup_reminder]):
             return "Error: At least one field must be provided to update."
         
         try:
-            event = self.calendar_service.events().get(calendarId='primary', eventId=event_id).execute()
-            
-            # Update text fields
-            if summary:
-                event['summary'] = summary
-            if description:
-                event['description'] = description
-            if location:
-                event['location'] = location
-            
-            # Update date/time fields
-            if start_date or end_date or time_zone:
-                tz = time_zone or event.get('start', {}).get('timeZone', 'UTC')
-                if start_date:
-                    event['start'] = {
-                        'dateTime': start_date,
-                        'timeZone': tz,
-                    }
-                if end_date:
-                    event['end'] = {
-                        'dateTime': end_date,
-                        'timeZone': tz,
-                    }
-            
-            # Update reminders
-            if email_reminder is not None or popup_reminder is not None:
-                overrides = []
-                if email_reminder is not None:
-                    overrides.append({'method': 'email', 'minutes': email_reminder})
-                if popup_reminder is not None:
-                    overrides.append({'method': 'popup', 'minutes': popup_reminder})
-                
-                event['reminders'] = {
-                    'useDefault': False,
-                    'overrides': overrides if overrides else event.get('reminders', {}).get('overrides', [])
-                }
-            
-            updated_event = self.calendar_service.events().update(calendarId='primary', eventId=event_id, body=event).execute()
+            patch = self._build_event_patch(event_id, summary, description, location, start_date, end_date,
+                                            time_zone, email_reminder, popup_reminder)
+            updated_event = self._patch_request(event_id, patch).execute()
+            self._apply_updated_event(updated_event)
             return f"Event updated: {updated_event.get('htmlLink')}"
         except Exception as error:
-            return f"An error occurred: {error}"
+            return f"An error occurred: {self._describe_patch_error(event_id, error)}"
         
     def _modify_event_tool(self):
         """Creates a tool wrapper for modifying an event in the calendar."""
@@ -576,11 +1667,134 @@ class CalendarTools(Tools):
                                             resolved_start, resolved_end, time_zone,
                                             email_reminder, popup_reminder)
         return modify_event
+
+    def _shift_time(self, when: dict, minutes: int) -> dict:
+        """Returns a copy of an event 'start'/'end' moved by `minutes`."""
+        if 'date' in when:
+            if minutes % 1440:
+                raise ValueError("all-day events can only be moved by whole days (multiples of 1440 minutes)")
+            return {'date': (isoparse(when['date']) + timedelta(minutes=minutes)).strftime('%Y-%m-%d')}
+        shifted = {'dateTime': (isoparse(when['dateTime']) + timedelta(minutes=minutes)).isoformat()}
+        if when.get('timeZone'):
+            shifted['timeZone'] = when['timeZone']
+        return shifted
+
+    def _modify_events_impl(self, event_ids: list[str], shift_minutes: int = 0, summary: str = None,
+                            description: str = None, location: str = None, time_zone: str = None,
+                            email_reminder: int = None, popup_reminder: int = None) -> str:
+        """Implementation for applying the same change to many events with batched PATCH requests."""
+        if not event_ids:
+            return "Error: No event IDs provided."
+        # Batch request ids must be unique
+        event_ids = list(dict.fromkeys(event_ids))
+        if not any([shift_minutes, summary, description, location, time_zone, email_reminder, popup_reminder]):
+            return "Error: At least one change must be provided."
+        
+        try:
+            failures = {}
+            times = {}
+            if shift_minutes or time_zone:
+                # Current start/end come from memory or the mirror; the rest is fetched in one batch
+                missing = []
+                for event_id in event_ids:
+                    known = self._known_event(event_id)
+                    if known and 'start' in known and 'end' in known:
+                        times[event_id] = known
+                    else:
+                        missing.append(event_id)
+                fetched = self._execute_batch([
+                    (event_id, self.calendar_service.events().get(calendarId='primary', eventId=event_id,
+                                                                  fields='id,etag,start,end'))
+                    for event_id in missing])
+                for event_id in missing:
+                    event, error = fetched.get(event_id, (None, "no response from the batch endpoint"))
+                    if error is not None or event is None:
+                        failures[event_id] = str(error)
+                    else:
+                        self._remember_event(event)
+                        times[event_id] = event
+            
+            base_patch = self._build_event_patch(None, summary, description, location, None, None, None,
+                                                 email_reminder, popup_reminder)
+            requests = []
+            for event_id in event_ids:
+                if event_id in failures:
+                    continue
+                patch = dict(base_patch)
+                try:
+                    if event_id in times:
+                        for key in ('start', 'end'):
+                            when = self._shift_time(times[event_id][key], shift_minutes)
+                            if time_zone and 'dateTime' in when:
+                                when['timeZone'] = time_zone
+                            patch[key] = when
+                except ValueError as error:
+                    failures[event_id] = str(error)
+                    continue
+                requests.append((event_id, self._patch_request(event_id, patch)))
+            
+            results = self._execute_batch(requests)
+            updated = 0
+            for event_id, _ in requests:
+                response, error = results.get(event_id, (None, "no response from the batch endpoint"))
+                if error is not None or response is None:
+                    failures[event_id] = self._describe_patch_error(event_id, error)
+                else:
+                    self._apply_updated_event(response)
+                    updated += 1
+            
+            lines = [f"Updated {updated} of {len(event_ids)} events."]
+            lines += [f"Failed: {event_id}: {error}" for event_id, error in failures.items()]
+            return "\n".join(lines)
+        except Exception as error:
+            return f"An error occurred: {error}"
+
+    def _modify_events_tool(self):
+        """Creates a tool wrapper for modifying many events at once."""
+        @tool
+        def modify_events(event_ids: list[str], shift_minutes: int = 0, summary: str = None,
+                          description: str = None, location: str = None, time_zone: str = None,
+                          email_reminder: int = None, popup_reminder: int = None) -> str:
+            """Applies the same change to several events in one call, e.g. moving all of tomorrow's meetings
+            30 minutes later (shift_minutes=30) or setting the same location. Use event IDs from
+            get_events_on_date or get_events_in_range. shift_minutes can be negative; all-day events can
+            only be shifted by whole days. Only the given fields are changed."""
+            return self._modify_events_impl(event_ids, shift_minutes, summary, description, location,
+                                            time_zone, email_reminder, popup_reminder)
+        return modify_events
  
 class MailTools(Tools):
-    def __init__(self):
+    
+    service = 'gmail'
+    
+    def __init__(self, outbox_path: str = None):
+        # Set by get_mail_service; the outbox worker builds its own client with them
+        self.mail_credentials = None
         self.mail_service = self.get_mail_service()
+        self.outbox_path = outbox_path or get_file_path('outbox.db')
+        self.outbox = None
+        self.outbox_service = None
+        # Resume delivery of messages queued by a previous run
+        if os.path.exists(self.outbox_path):
+            self.get_outbox()
+
+    def get_outbox(self) -> Outbox:
+        """Opens the outbox on first use and starts its delivery worker."""
+        if self.outbox is None:
+            self.outbox = Outbox(self.outbox_path, self._send_raw_message)
+            self.outbox.start()
+        return self.outbox
+
+    def close(self):
+        """Gives queued emails a few seconds to go out, then stops the outbox worker."""
+        if self.outbox is not None:
+            self.outbox.close()
+            self.outbox = None
+
     def get_mail_service(self):
+        http = replay_http('gmail')
+        if http is not None:
+            return build('gmail', 'v1', http=http)
         SCOPES = ['https://www.googleapis.com/auth/gmail.send', 'https://www.googleapis.com/auth/gmail.readonly']
         creds = None
         gmail_token_path = get_file_path('gmail_token.json')
@@ -603,13 +1817,17 @@ class MailTools(Tools):
                 creds = flow.run_local_server(port=0)
             with open(gmail_token_path, 'w') as token:
                 token.write(creds.to_json())
+        self.mail_credentials = creds
         try:
-            service = build('gmail', 'v1', credentials=creds)
-            return service
+            return self._build_mail_service(creds)
         except HttpError as error:
             print(f'An error occurred: {error}')
             return None
        
+    def _build_mail_service(self, creds):
+        http = recording_http('gmail', creds)
+        return build('gmail', 'v1', http=http) if http is not None else build('gmail', 'v1', credentials=creds)
+
     def draft_message_impl(self, to: str, subject: str, body: str) -> dict:
         """Creates a draft email message. """
         from_ = os.getenv("EMAIL_ADDRESS")
@@ -673,8 +1891,10 @@ class MailTools(Tools):
         """Creates a tool wrapper for sending an email."""
         @tool
         def send_message(to: str, subject: str, body: str) -> str:
-            """Sends an email using the Gmail API. The sender address is read from .env file."""
-            return self.send_message_impl(to, subject, body)
+            """Sends an email using the Gmail API. The sender address is read from .env file.
+            The email is queued and delivered in the background; the result contains its QUEUE_ID,
+            which can be passed to get_outbox_status to check delivery."""
+            return self.queue_message_impl(to, subject, body)
         return send_message
     
     def draft_message_with_attachment_impl(self, to: str, subject: str, body: str, file_paths: list[str]) -> dict:
@@ -766,9 +1986,82 @@ class MailTools(Tools):
         """Creates a tool wrapper for sending an email with attachments."""
         @tool
         def send_message_with_attachment(to: str, subject: str, body: str, file_paths: list[str]) -> str:
-            """Sends an email with attachments using the Gmail API."""
-            return self.send_message_with_attachment_impl(to, subject, body, file_paths)
+            """Sends an email with attachments using the Gmail API.
+            The email is queued and delivered in the background; the result contains its QUEUE_ID."""
+            return self.queue_message_with_attachment_impl(to, subject, body, file_paths)
         return send_message_with_attachment
+
+    def _send_raw_message(self, raw: str) -> str:
+        """Sends an already encoded message and returns its Gmail message id. Used by the outbox worker."""
+        if self.mail_service is None:
+            raise RuntimeError("Gmail service is not available. Please ensure credentials are properly configured.")
+        if self.outbox_service is None:
+            # The worker gets a client of its own: httplib2 connections aren't thread-safe, and the
+            # main thread, prefetch and plan steps use mail_service meanwhile
+            self.outbox_service = self.mail_service if self.mail_credentials is None else \
+                self._build_mail_service(self.mail_credentials)
+        sent = self.outbox_service.users().messages().send(userId="me", body={"raw": raw}).execute()
+        return sent.get("id")
+
+    def queue_message_impl(self, to: str, subject: str, body: str) -> str:
+        """Queues an email in the outbox and returns immediately with its queue id."""
+        # Validate email address format
+        import re
+        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        if not re.match(email_pattern, to):
+            return f"Error: Invalid email address format: {to}"
+        
+        if not os.getenv("EMAIL_ADDRESS"):
+            return "Error: Email address environment variable is not set."
+        
+        raw = self.draft_message_impl(to, subject, body)
+        queue_id = self.get_outbox().enqueue(to, subject, raw)
+        return f"Email queued for delivery to {to}|QUEUE_ID:{queue_id}"
+
+    def queue_message_with_attachment_impl(self, to: str, subject: str, body: str, file_paths: list[str]) -> str:
+        """Queues an email with attachments in the outbox and returns immediately with its queue id.
+        Attachments are read now, so later changes to the files don't affect the queued email."""
+        # Validate email address format
+        import re
+        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        if not re.match(email_pattern, to):
+            return f"Error: Invalid email address format: {to}"
+        
+        if not os.getenv("EMAIL_ADDRESS"):
+            return "Error: Email address environment variable is not set."
+        
+        raw = self.draft_message_with_attachment_impl(to, subject, body, file_paths)
+        queue_id = self.get_outbox().enqueue(to, subject, raw)
+        return f"Email with attachment queued for delivery to {to}|QUEUE_ID:{queue_id}"
+
+    def get_outbox_status_impl(self, queue_id: int = None) -> str:
+        """Implementation for reporting the delivery state of queued emails."""
+        if queue_id is not None:
+            entries = [self.get_outbox().status(queue_id)]
+            if entries[0] is None:
+                return f"Error: No queued email with QUEUE_ID {queue_id}."
+        else:
+            entries = self.get_outbox().recent(10)
+            if not entries:
+                return "The outbox is empty."
+        
+        lines = []
+        for entry in entries:
+            line = (f"QUEUE_ID: {entry['id']}, To: {entry['recipient']}, Subject: {entry['subject']}, "
+                    f"Status: {entry['status']}, Attempts: {entry['attempts']}")
+            if entry['last_error']:
+                line += f", Last error: {entry['last_error']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def get_outbox_status_tool(self):
+        """Creates a tool wrapper for checking the delivery state of queued emails."""
+        @tool
+        def get_outbox_status(queue_id: int = None) -> str:
+            """Reports whether queued emails were delivered (pending, sending, sent or failed).
+            Pass the QUEUE_ID returned by send_message, or omit it to list the most recent emails."""
+            return self.get_outbox_status_impl(queue_id)
+        return get_outbox_status
     
     def get_latest_emails_impl(self, count: int) -> str:
         """Implementation for retrieving the latest {count} emails from the inbox with."""
@@ -807,10 +2100,11 @@ class MailTools(Tools):
         """
         Returns a list of tool callables as standalone functions (not methods).
         """
-        return [
+        return self._tag_service([
             self.get_latest_emails_tool(), 
             self.send_message_tool(),
             self.draft_message_tool(),
             self.draft_message_with_attachment_tool(),
-            self.send_message_with_attachment_tool()
-        ]
\ No newline at end of file
+            self.send_message_with_attachment_tool(),
+            self.get_outbox_status_tool()
+        ])
\ No newline at end of file
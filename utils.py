@@ -4,13 +4,15 @@ import base64
 import mimetypes
 import os
 import os.path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from email.mime.audio import MIMEAudio
 from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
 from email.mime.text import MIMEText
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 from dateutil import tz
 
 # Get the directory where this script is located
@@ -22,6 +24,31 @@ def get_file_path(filename):
     return os.path.join(SCRIPT_DIR, filename)
 
 
+@lru_cache(maxsize=128)
+def get_zone(name: str = None):
+    """Returns the tzinfo for an IANA timezone name, memoized so each zone is loaded only once.
+    None gives the local timezone; unknown names give None."""
+    return tz.gettz(name) if name else tz.tzlocal()
+
+
+def local_day_window(day, zone) -> tuple[datetime, datetime]:
+    """Returns the aware [start, end) datetimes of a calendar day in `zone`.
+
+    The window runs from local midnight to the next local midnight, so it lasts
+    23 or 25 hours on DST transition days. Where midnight doesn't exist (zones
+    that switch at 00:00) the day starts at the first valid local time.
+
+    Args:
+        day: A date or a 'YYYY-MM-DD' string (a trailing time part is ignored).
+        zone: The tzinfo of the user's calendar.
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    start = tz.resolve_imaginary(datetime.combine(day, time(0, 0), tzinfo=zone))
+    end = tz.resolve_imaginary(datetime.combine(day + timedelta(days=1), time(0, 0), tzinfo=zone))
+    return start, end
+
+
 def resolve_relative_date(date_str: str, current_date_str: str = None) -> str:
     """
     Converts relative date references like 'tomorrow', 'today', 'next week' to absolute dates.
@@ -117,3 +144,71 @@ def build_file_part(file):
         return msg
     except FileNotFoundError:
         raise FileNotFoundError(f"Attachment file '{file}' not found.")
+
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of a list of numbers by nearest rank; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, -(-len(ordered) * q // 100) - 1))
+    return ordered[int(rank)]
+
+
+def format_size(size):
+    """Formats a size in bytes for people, e.g. 1536 -> '1.5 KB'."""
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# Folders never worth searching: version control, dependencies, caches
+SKIPPED_DIRS = frozenset({'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.cache', '.venv', 'venv'})
+
+
+def scan_dir(path, skip=SKIPPED_DIRS):
+    """Lists one directory without following links.
+
+    Returns:
+        Tuple of (entries, subdirectories): entries are (path, name, is_dir, size, mtime) tuples,
+        subdirectories the paths to descend into. An unreadable directory gives two empty lists.
+    """
+    entries, subdirs = [], []
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir and entry.name in skip:
+                    continue
+                entries.append((entry.path, entry.name, is_dir, stat.st_size, stat.st_mtime))
+                if is_dir:
+                    subdirs.append(entry.path)
+    except OSError:
+        pass
+    return entries, subdirs
+
+
+def walk_parallel(roots, workers=8, skip=SKIPPED_DIRS):
+    """Walks directory trees with a pool of threads, one directory per task.
+
+    Directory listing and stat calls release the GIL, so sibling directories are read in
+    parallel, which matters on network drives and cold disk caches.
+
+    Yields:
+        (directory, entries) for every directory reached, entries as returned by scan_dir.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk") as executor:
+        running = {executor.submit(scan_dir, root, skip): root for root in roots}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = running.pop(future)
+                entries, subdirs = future.result()
+                for subdir in subdirs:
+                    running[executor.submit(scan_dir, subdir, skip)] = subdir
+                yield directory, entries
@@ -0,0 +1,187 @@
+"""Model warm-up and keep-alive for local inference servers.
+
+Ollama loads a model on its first request and unloads it after `keep_alive`
+idle seconds, so the first turn of a session (and the first after a pause)
+pays the load time plus the evaluation of the whole system prompt. The
+warmer sends a one-token request with the agent's exact prompt prefix (system
+prompt and tool schemas) in the background as soon as the agent is built,
+so the model is loaded and the prefix is in the server's KV cache before the
+user's first message. During the session a heartbeat repeats it whenever the
+model sits idle long enough to be unloaded.
+
+It also times the first token of every model call, split into cold calls
+(model not loaded yet, or possibly unloaded) and warm ones.
+"""
+
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_ollama import ChatOllama
+from langchain_openai import ChatOpenAI
+from langchain.messages import HumanMessage, SystemMessage
+
+
+def _one_token_copy(model):
+    """Copy of a chat model that generates a single token, without thinking."""
+    if isinstance(model, ChatOpenAI):
+        return model.model_copy(update={'max_tokens': 1})
+    return model.model_copy(update={'num_predict': 1, 'reasoning': False})
+
+
+class _FirstTokenTimer(BaseCallbackHandler):
+    """Times the first token of every model call of the agent."""
+
+    def __init__(self, warmer):
+        self.warmer = warmer
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._calls[run_id] = (time.perf_counter(), self.warmer.is_warm())
+        self.warmer.touch()
+
+    def _record(self, run_id):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is not None:
+            started, warm = call
+            self.warmer.record_first_token(time.perf_counter() - started, warm)
+
+    def on_llm_new_token(self, token, *, run_id, chunk=None, **kwargs):
+        self._record(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        # Calls that didn't stream: the whole reply counts as the first token
+        self._record(run_id)
+        self.warmer.touch()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._calls.pop(run_id, None)
+
+
+class ModelWarmer:
+    """Keeps the agent's models loaded and their prompt prefix cached during a session.
+
+    Only models served by Ollama or an OpenAI-compatible server are warmed; other chat
+    models (e.g. the test fakes) have nothing to load.
+
+    Args:
+        models: The chat models to warm (e.g. the agent's model and the router's tiers).
+        system_prompt: The agent's system prompt.
+        tools: The agent's tools, whose schemas are part of the prompt prefix.
+        keep_alive: Seconds Ollama keeps the model loaded after a request (None for the server default).
+        heartbeat: Whether to re-warm a model that has been idle for half of `keep_alive`.
+        max_idle: Seconds without any model call after which the session counts as inactive and
+            the heartbeat stops, letting Ollama unload the model.
+    """
+
+    def __init__(self, models, system_prompt, tools=(), keep_alive=1800, heartbeat=True, max_idle=3600):
+        unique = {id(model): model for model in models}.values()
+        self.models = [model for model in unique if isinstance(model, (ChatOllama, ChatOpenAI))]
+        for model in self.models:
+            # Every call then restarts Ollama's countdown with the session's keep-alive
+            if isinstance(model, ChatOllama) and model.keep_alive is None:
+                model.keep_alive = keep_alive
+        self.system_prompt = system_prompt
+        self.tools = list(tools)
+        self.keep_alive = keep_alive
+        self.max_idle = max_idle
+        self.timer = _FirstTokenTimer(self)
+
+        self._lock = threading.Lock()
+        self._warm = threading.Event()
+        self._stop = threading.Event()
+        self._last_used = None  # Last request of any kind, which restarts Ollama's countdown
+        self._last_active = time.monotonic()  # Last model call of the agent itself
+        self._stats = {'warmups': 0, 'warmup_seconds': 0.0, 'heartbeats': 0, 'errors': 0}
+        self._first_tokens = {'cold': [], 'warm': []}
+        self._heartbeat = heartbeat and keep_alive is not None and any(isinstance(model, ChatOllama)
+                                                                       for model in self.models)
+        self._thread = None
+
+    def _warm_up(self):
+        """Sends one single-token request per model with the agent's prompt prefix."""
+        messages = [SystemMessage(content=self.system_prompt), HumanMessage(content="Hi")]
+        for model in self.models:
+            runnable = _one_token_copy(model)
+            if self.tools:
+                runnable = runnable.bind_tools(self.tools)
+            start = time.perf_counter()
+            try:
+                runnable.invoke(messages)
+            except Exception:
+                # The server may be down; the first turn will report the error
+                with self._lock:
+                    self._stats['errors'] += 1
+                continue
+            with self._lock:
+                self._stats['warmups'] += 1
+                self._stats['warmup_seconds'] += time.perf_counter() - start
+        with self._lock:
+            self._last_used = time.monotonic()
+
+    def _run(self):
+        self._warm_up()
+        self._warm.set()
+        if not self._heartbeat:
+            return
+        interval = self.keep_alive / 2
+        while not self._stop.wait(min(interval, 60.0)):
+            with self._lock:
+                now = time.monotonic()
+                idle, inactive = now - self._last_used, now - self._last_active
+            if inactive > self.max_idle:
+                return
+            if idle >= interval:
+                self._warm_up()
+                with self._lock:
+                    self._stats['heartbeats'] += 1
+
+    def start(self):
+        """Starts warming in a background thread; returns immediately."""
+        if not self.models:
+            self._warm.set()
+            return
+        self._thread = threading.Thread(target=self._run, name=f"warmup-{uuid.uuid4().hex[:6]}", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Waits for the initial warm-up to finish; returns False on timeout."""
+        return self._warm.wait(timeout)
+
+    def close(self):
+        self._stop.set()
+
+    # Session state
+
+    def touch(self):
+        """Records a model call of the agent, which also resets Ollama's keep-alive countdown."""
+        with self._lock:
+            self._last_used = self._last_active = time.monotonic()
+
+    def is_warm(self):
+        """Whether the models are loaded: warmed up or used within the last `keep_alive` seconds."""
+        with self._lock:
+            if self._last_used is None:
+                return False
+            return self.keep_alive is None or time.monotonic() - self._last_used < self.keep_alive
+
+    # Metrics
+
+    def record_first_token(self, seconds, warm):
+        with self._lock:
+            self._first_tokens['warm' if warm else 'cold'].append(seconds)
+
+    def stats(self):
+        """Returns the warm-up counters and the mean first-token latency of cold and warm calls (seconds)."""
+        with self._lock:
+            stats = dict(self._stats)
+            first_tokens = {kind: list(values) for kind, values in self._first_tokens.items()}
+        for kind, values in first_tokens.items():
+            stats[f'{kind}_calls'] = len(values)
+            stats[f'{kind}_first_token'] = sum(values) / len(values) if values else 0.0
+        return stats